@@ -4,8 +4,6 @@
 INSTALL_METHOD="local"
 OSU_VERSION="7.2"
 VERIFY="false"
-TEMP_ENV_FILE="/tmp/osu_env_${INSTALL_METHOD}.sh"
-rm "$TEMP_ENV_FILE" 2>/dev/null || true
 
 # Parse command line options
 while [[ "$#" -gt 0 ]]; do
@@ -18,14 +16,19 @@ while [[ "$#" -gt 0 ]]; do
     shift
 done
 
-VERIFY_BINARIES=("osu_get_latency" "osu_get_bw")
+# One environment file per method, so methods can be installed concurrently
+TEMP_ENV_FILE="/tmp/osu_env_${INSTALL_METHOD}.sh"
+rm "$TEMP_ENV_FILE" 2>/dev/null || true
+
+# <family>/<benchmark> under libexec/osu-micro-benchmarks/mpi
+VERIFY_BINARIES=("one-sided/osu_get_latency" "one-sided/osu_get_bw" "pt2pt/osu_latency" "pt2pt/osu_bw")
 
 print_header() {
     echo -e "\n========== $1 ==========\n"
 }
 
 verify_osu() {
-    local exe_path="${EBROOTOSUMINMICROMINBENCHMARKS}/libexec/osu-micro-benchmarks/mpi/one-sided"
+    local exe_path="${EBROOTOSUMINMICROMINBENCHMARKS}/libexec/osu-micro-benchmarks/mpi"
     echo "Verifying OSU Benchmarks at: $exe_path"
     cd "$exe_path" || { echo "❌ Failed to access $exe_path"; return 1; }
     for binary in "${VERIFY_BINARIES[@]}"; do
@@ -39,36 +42,82 @@ verify_osu() {
     cd ~/hpc-project || true
 }
 
+# Record the installed binaries in the OSU binary index (scripts/osu_index.py)
+# so tests resolve executables without searching the file system
+index_osu() {
+    local toolchain="$1"
+    python3 ~/hpc-project/scripts/osu_index.py build --source "$INSTALL_METHOD" \
+        --version "$OSU_VERSION" --toolchain "$toolchain" \
+        --root "$EBROOTOSUMINMICROMINBENCHMARKS" || echo "⚠️ Could not index OSU binaries"
+}
+
+# Local builds are cached per OSU version, compiler, MPI and configure
+# flags, so several toolchains can coexist and a rebuild only happens
+# when one of them changes
+BUILD_CACHE_DIR="${OSU_BUILD_CACHE:-$HOME/hpc-project/cache/osu-builds}"
+LOCAL_TOOLCHAIN_MODULE="toolchain/foss/2023b"
+CONFIGURE_FLAGS="CC=mpicc CFLAGS=-I../util"
+
+build_key() {
+    local compiler mpi
+    compiler=$(mpicc --version 2>/dev/null | head -1)
+    mpi=$( (ompi_info --version 2>/dev/null || mpirun --version 2>/dev/null) | head -1)
+    echo "$OSU_VERSION|$compiler|$LOCAL_TOOLCHAIN_MODULE|$mpi|$CONFIGURE_FLAGS" | sha1sum | cut -c1-16
+}
+
 install_local() {
     print_header "Local Compilation"
-    INSTALL_DIR=~/osu-micro-benchmarks-${OSU_VERSION}
-    BUILD_DIR=${INSTALL_DIR}/build
-    EBROOTOSUMINMICROMINBENCHMARKS="$BUILD_DIR"
+    module load "$LOCAL_TOOLCHAIN_MODULE"
+    # e.g. toolchain/foss/2023b -> foss-2023b, as in OSU_BUILDS (tests/config.py)
+    local toolchain
+    toolchain=$(basename "$(dirname "$LOCAL_TOOLCHAIN_MODULE")")-$(basename "$LOCAL_TOOLCHAIN_MODULE")
+    local key
+    key=$(build_key)
+    local artifact="$BUILD_CACHE_DIR/osu-${OSU_VERSION}-${toolchain}-${key}"
+    EBROOTOSUMINMICROMINBENCHMARKS="$artifact"
     export EBROOTOSUMINMICROMINBENCHMARKS
 
-    if [[ -d "$EBROOTOSUMINMICROMINBENCHMARKS/libexec/osu-micro-benchmarks/mpi/one-sided" ]]; then
-        echo "✅ OSU Benchmarks already compiled locally at $BUILD_DIR"
-        echo "export EBROOTOSUMINMICROMINBENCHMARKS=$EBROOTOSUMINMICROMINBENCHMARKS" >> "$TEMP_ENV_FILE"
-        echo "export PATH=\"\$EBROOTOSUMINMICROMINBENCHMARKS/libexec/osu-micro-benchmarks/mpi/one-sided:\$PATH\"" >> "$TEMP_ENV_FILE"
-	    [[ "$VERIFY" == "true" || "$VERIFY" == "yes" ]] && verify_osu
-        return
-    fi
-
-    echo "🛠️ Installing OSU Benchmarks locally..."
-    mkdir -p ~/project
-    cd ~/project || exit 1
-    wget https://mvapich.cse.ohio-state.edu/download/mvapich/osu-micro-benchmarks-${OSU_VERSION}.tar.gz
-    tar -zxvf osu-micro-benchmarks-${OSU_VERSION}.tar.gz
-    cd osu-micro-benchmarks-${OSU_VERSION} || exit 1
+    if [[ -f "$artifact/build-info.json" ]]; then
+        echo "✅ OSU Benchmarks already built for this toolchain at $artifact"
+    else
+        echo "🛠️ Building OSU Benchmarks ${OSU_VERSION} (build key $key)..."
+        mkdir -p "$BUILD_CACHE_DIR/src"
+        local tarball="$BUILD_CACHE_DIR/src/osu-micro-benchmarks-${OSU_VERSION}.tar.gz"
+        if [[ ! -f "$tarball" ]]; then
+            wget -O "$tarball.part" https://mvapich.cse.ohio-state.edu/download/mvapich/osu-micro-benchmarks-${OSU_VERSION}.tar.gz \
+                && mv "$tarball.part" "$tarball" || { echo "❌ Download failed"; return 1; }
+        fi
 
-    mkdir -p build && cd build
-    module load toolchain/foss/2023b
-    ../configure CC=mpicc CFLAGS=-I$(pwd)/../util --prefix=$(pwd)
-    make -j && make install
+        # Build in a private staging directory and rename it into place, so
+        # concurrent installs never see (or clobber) a half-built tree
+        local stage
+        stage=$(mktemp -d "$BUILD_CACHE_DIR/.stage-${key}-XXXXXX")
+        tar -xzf "$tarball" -C "$stage"
+        mkdir -p "$stage/osu-micro-benchmarks-${OSU_VERSION}/build"
+        (
+            cd "$stage/osu-micro-benchmarks-${OSU_VERSION}/build" || exit 1
+            cc=mpicc
+            if command -v ccache >/dev/null 2>&1 && [[ "${OSU_USE_CCACHE:-1}" != "0" ]]; then
+                cc="ccache mpicc"
+            fi
+            ../configure CC="$cc" CFLAGS=-I$(pwd)/../util --prefix="$stage" \
+                && make -j"$(nproc)" && make install
+        ) || { echo "❌ Build failed"; rm -rf "$stage"; return 1; }
+        rm -rf "$stage/osu-micro-benchmarks-${OSU_VERSION}"
+
+        echo "{\"osu_version\": \"$OSU_VERSION\", \"toolchain_module\": \"$LOCAL_TOOLCHAIN_MODULE\", \"compiler\": \"$(mpicc --version 2>/dev/null | head -1)\", \"configure_flags\": \"$CONFIGURE_FLAGS\", \"key\": \"$key\"}" > "$stage/build-info.json"
+        chmod 755 "$stage"
+        # Another install may have finished the same key first; keep that one
+        if ! mv -T "$stage" "$artifact" 2>/dev/null; then
+            echo "Build $key was completed concurrently, using it"
+            rm -rf "$stage"
+        fi
+    fi
 
-    echo "export EBROOTOSUMINMICROMINBENCHMARKS=EBROOTOSUMINMICROMINBENCHMARKS" >> "$TEMP_ENV_FILE"
+    echo "export EBROOTOSUMINMICROMINBENCHMARKS=$EBROOTOSUMINMICROMINBENCHMARKS" >> "$TEMP_ENV_FILE"
+    echo "export PATH=\"\$EBROOTOSUMINMICROMINBENCHMARKS/libexec/osu-micro-benchmarks/mpi/one-sided:\$PATH\"" >> "$TEMP_ENV_FILE"
+    index_osu "$toolchain"
     [[ "$VERIFY" == "true" || "$VERIFY" == "yes" ]] && verify_osu
-
 }
 
 install_easybuild() {
@@ -89,6 +138,7 @@ install_easybuild() {
     echo "export PATH=\"\$EBROOTOSUMINMICROMINBENCHMARKS/libexec/osu-micro-benchmarks/mpi/one-sided:\$PATH\"" >> "$TEMP_ENV_FILE"
     module use "${EASYBUILD_PREFIX}/modules/all"
     module load perf/OSU-Micro-Benchmarks/${OSU_VERSION}-gompi-2023b 
+    index_osu gompi-2023b
     [[ "$VERIFY" == "true" || "$VERIFY" == "yes" ]] && verify_osu
 }
 
@@ -109,6 +159,7 @@ install_eessi() {
         echo "module load OSU-Micro-Benchmarks/${OSU_VERSION}-gompi-2023b" >> "$TEMP_ENV_FILE"
         echo "export PATH=\"\$EBROOTOSUMINMICROMINBENCHMARKS/libexec/osu-micro-benchmarks/mpi/one-sided:\$PATH\"" >> "$TEMP_ENV_FILE"
         module load OSU-Micro-Benchmarks/${OSU_VERSION}-gompi-2023b
+        index_osu gompi-2023b
         [[ "$VERIFY" == "true" || "$VERIFY" == "yes" ]] && verify_osu
     else
         echo "❌ OSU Benchmarks module not found in EESSI"
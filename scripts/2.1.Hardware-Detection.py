@@ -5,74 +5,47 @@ import json
 from pathlib import Path
 import shutil
 
+from topology import (allowed_cpus_list, cache_entry, parse_cpu_list,
+                      publish_placement_classes, read_topology)
+
 def run_cmd(cmd):
     """Run a shell command and return its output"""
     result = subprocess.run(cmd, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
     return result.stdout.strip()
 
-def detect_hardware_topology(scripts_dir=None):
+def detect_hardware_topology(scripts_dir=None, topology=None):
     """Detect hardware topology within Slurm allocation"""
     if scripts_dir is None:
         scripts_dir = os.getcwd()
         
     print("===== Hardware Topology Detection =====")
     
-    # Basic hardware detection
-    numa_count = run_cmd("lscpu | grep '^NUMA node(s):' | awk '{print $3}'")
-    socket_count = run_cmd("lscpu | grep '^Socket(s):' | awk '{print $2}'")
-    
-    print(f"Detected configuration:")
-    print(f"- {numa_count} NUMA node(s)")
-    print(f"- {socket_count} socket(s)")
-    
     # Get CPUs allocated to this job by Slurm
     slurm_job_id = os.environ.get('SLURM_JOB_ID')
     if slurm_job_id:
         print(f"Running under Slurm job {slurm_job_id}")
-        allocated_cpus = run_cmd("grep Cpus_allowed_list /proc/self/status | awk '{print $2}'")
+        allocated_cpus = allowed_cpus_list()
         print(f"CPUs allocated to this job: {allocated_cpus}")
+        allowed = parse_cpu_list(allocated_cpus)
     else:
         print("Not running under Slurm - using all CPUs")
-        total_cpus = int(run_cmd("nproc"))
-        allocated_cpus = ",".join(str(i) for i in range(total_cpus))
+        allowed = None
+    
+    # Read the whole topology in one pass instead of two lscpu pipelines per CPU
+    if topology is None:
+        topology = read_topology(allowed=allowed)
+    numa_count = str(topology.numa_count)
+    socket_count = str(topology.socket_count)
+    
+    print(f"Detected configuration:")
+    print(f"- {numa_count} NUMA node(s)")
+    print(f"- {socket_count} socket(s)")
     
     # Build socket->NUMA node map using allocated CPUs
-    socket_numa_map = {}  # socket -> list of NUMA nodes
-    numa_cpus_map = {}    # NUMA node -> list of CPUs
-    
-    # Process each CPU and build the hierarchy
-    cpu_ranges = allocated_cpus.split(',')
-    for cpu_range in cpu_ranges:
-        if '-' in cpu_range:
-            # Handle range like 0-127
-            start, end = map(int, cpu_range.split('-'))
-            cpu_list = range(start, end + 1)
-        else:
-            # Handle single CPU
-            cpu_list = [int(cpu_range)]
-        
-        for cpu in cpu_list:
-            # Get NUMA node and socket for this CPU
-            node_cmd = f"lscpu -p=cpu,node | grep '^{cpu},' | cut -d, -f2"
-            socket_cmd = f"lscpu -p=cpu,socket | grep '^{cpu},' | cut -d, -f2"
-            
-            node = run_cmd(node_cmd)
-            socket = run_cmd(socket_cmd)
-            
-            # Skip if we couldn't determine the node or socket
-            if not node or not socket:
-                continue
-                
-            # Build the maps
-            if socket not in socket_numa_map:
-                socket_numa_map[socket] = [node]
-            elif node not in socket_numa_map[socket]:
-                socket_numa_map[socket].append(node)
-            
-            if node not in numa_cpus_map:
-                numa_cpus_map[node] = [cpu]
-            else:
-                numa_cpus_map[node].append(cpu)
+    socket_numa_map = {str(socket): [str(node) for node in nodes]
+                       for socket, nodes in topology.socket_numa_map().items()}
+    numa_cpus_map = {str(node): cpus
+                     for node, cpus in topology.numa_cpus_map().items()}
     
     # Print discovered topology
     print("Socket -> NUMA node mapping:")
@@ -110,6 +83,12 @@ def detect_hardware_topology(scripts_dir=None):
         numa_diff_socket_2 = first_socket_numas[0]
         print("Warning: Only one socket available, using same socket for different-socket test")
     
+    # One representative CPU pair per communication distance class
+    placement_pairs = topology.distance_classes()
+    print("Distance classes (representative CPU pair):")
+    for name, (cpu_a, cpu_b) in placement_pairs.items():
+        print(f"- {name}: CPUs {cpu_a} {cpu_b}")
+    
     # Create JSON file with our mapping for Python
     topology_data = {
         "numa_count": numa_count,
@@ -120,7 +99,8 @@ def detect_hardware_topology(scripts_dir=None):
         "numa_diff_socket_1": numa_diff_socket_1,
         "numa_diff_socket_2": numa_diff_socket_2,
         "socket_numa_map": socket_numa_map,
-        "numa_cpus_map": {node: [str(cpu) for cpu in cpus] for node, cpus in numa_cpus_map.items()}
+        "numa_cpus_map": {node: [str(cpu) for cpu in cpus] for node, cpus in numa_cpus_map.items()},
+        "placement_pairs": {name: [str(cpu) for cpu in pair] for name, pair in placement_pairs.items()}
     }
     
     with open(f"{scripts_dir}/binding_vars.json", "w") as f:
@@ -148,6 +128,12 @@ def detect_hardware_topology(scripts_dir=None):
         f.write("declare -A NUMA_CPUS_MAP\n")
         for node, cpus in numa_cpus_map.items():
             f.write(f"NUMA_CPUS_MAP[{node}]=\"{' '.join(map(str, cpus))}\"\n")
+        
+        # Distance class to representative CPU pair
+        f.write("\n# Distance class to CPU pair mapping\n")
+        f.write(f"export PLACEMENT_CLASSES=\"{' '.join(placement_pairs)}\"\n")
+        for name, pair in placement_pairs.items():
+            f.write(f"export PAIR_{name.upper()}=\"{' '.join(map(str, pair))}\"\n")
     
     os.chmod(f"{scripts_dir}/binding_vars.sh", 0o755)
     print(f"Hardware topology detected and saved to {scripts_dir}/binding_vars.json and {scripts_dir}/binding_vars.sh")
@@ -213,30 +199,85 @@ def generate_placement_scripts(scripts_dir=None, topology_data=None):
             fi
         """)
 
+    with open(f"{scripts_dir}/bind_class.sh", "w") as f:
+        f.write("""#!/bin/bash
+            # Bind task N to CPU N of the representative pair of a distance class
+            # Usage: bind_class.sh <class> <command...>
+            source $(dirname $0)/binding_vars.sh
+
+            CLASS=$1
+            shift
+            PAIR_VAR="PAIR_${CLASS^^}"
+            CPUS=(${!PAIR_VAR})
+            if [ ${#CPUS[@]} -ne 2 ]; then
+                echo "Unknown placement class $CLASS (available: $PLACEMENT_CLASSES)"
+                exit 1
+            fi
+
+            CPU=${CPUS[${SLURM_PROCID:-0}]}
+            echo "Case $CLASS; Task ${SLURM_PROCID:-0}: Binding to CPU $CPU"
+            numactl --physcpubind=$CPU --localalloc "$@"
+        """)
+
     # Make all scripts executable
-    for script in ["bind_same_numa.sh", "bind_diff_numa_same_socket.sh", "bind_diff_socket.sh"]:
+    for script in ["bind_same_numa.sh", "bind_diff_numa_same_socket.sh", "bind_diff_socket.sh", "bind_class.sh"]:
         os.chmod(f"{scripts_dir}/{script}", 0o755)
     
     print(f"Helper scripts generated in {scripts_dir}:")
-    print("- Shell scripts: bind_same_numa.sh, bind_diff_numa_same_socket.sh, bind_diff_socket.sh")
+    print("- Shell scripts: bind_same_numa.sh, bind_diff_numa_same_socket.sh, bind_diff_socket.sh, bind_class.sh")
+
+# Files produced by detection/generation and shared through the topology cache
+CACHED_FILES = ["topology.json", "binding_vars.json", "binding_vars.sh",
+                "bind_same_numa.sh", "bind_diff_numa_same_socket.sh", "bind_diff_socket.sh",
+                "bind_class.sh"]
+
+def _generate_cache_entry(entry_dir):
+    """Run detection once and write every cached file into entry_dir"""
+    allowed = parse_cpu_list(allowed_cpus_list()) if os.environ.get('SLURM_JOB_ID') else None
+    topology = read_topology(allowed=allowed)
+    with open(f"{entry_dir}/topology.json", "w") as f:
+        json.dump(topology.to_dict(), f, indent=2)
+    topology_data = detect_hardware_topology(entry_dir, topology)
+    generate_placement_scripts(entry_dir, topology_data)
+    # Let ReFrame size its placement parameter space from this hardware,
+    # but only from whole-node (exclusive) views so no class is missed
+    if topology.allowed == list(topology.cpus):
+        publish_placement_classes(topology)
+
+def cached_placement_scripts(scripts_dir=None):
+    """Copy binding files for this host/allocation from the shared topology cache
+    
+    Detection only runs when no entry exists for the current hostname, boot id
+    and Cpus_allowed_list; concurrent jobs reuse the first job's result.
+    """
+    if scripts_dir is None:
+        scripts_dir = os.getcwd()
+    
+    entry_dir = cache_entry(_generate_cache_entry)
+    print(f"Using cached topology from {entry_dir}")
+    for name in CACHED_FILES:
+        shutil.copy2(f"{entry_dir}/{name}", f"{scripts_dir}/{name}")
+    
+    with open(f"{scripts_dir}/binding_vars.json") as f:
+        return json.load(f)
 
 def main():
     """Main function"""
     scripts_dir = os.getcwd()
     
     # Parse command-line arguments
-    if len(sys.argv) > 1:
-        cmd = sys.argv[1]
-        
-        if cmd == "--generate-scripts":
-            generate_placement_scripts(scripts_dir)
-        else:
-            # Default behavior: just detect topology
-            detect_hardware_topology(scripts_dir)
+    use_cache = "--no-cache" not in sys.argv[1:]
+    args = [arg for arg in sys.argv[1:] if arg != "--no-cache"]
+    
+    if use_cache:
+        # Both modes are served from the shared topology cache
+        cached_placement_scripts(scripts_dir)
+    elif args and args[0] == "--generate-scripts":
+        generate_placement_scripts(scripts_dir, detect_hardware_topology(scripts_dir))
     else:
         # Default behavior: just detect topology
         detect_hardware_topology(scripts_dir)
 
 if __name__ == "__main__":
     import sys
-    main()
\ No newline at end of file
+    main()
@@ -51,7 +51,7 @@ main() {
     case "$cmd" in
         --generate-scripts)
             module load devel/ReFrame/4.7.4-GCCcore-13.2.0
-            python $SCRIPTS_DIR/2.1.Hardware-Detection.py --generate-scripts
+            python $SCRIPTS_DIR/2.1.Hardware-Detection.py --generate-scripts "$@"
             return 0
             ;;
         --verify)
@@ -61,7 +61,7 @@ main() {
         *)
             # Default behavior: just detect topology
             module load devel/ReFrame/4.7.4-GCCcore-13.2.0
-            python $SCRIPTS_DIR/2.1.Hardware-Detection.py 
+            python $SCRIPTS_DIR/2.1.Hardware-Detection.py "$@"
             return 0
             ;;
     esac
@@ -18,6 +18,8 @@ mkdir -p "$LOG_DIR"
 
 module load tools/numactl/2.0.16-GCCcore-13.2.0 2>/dev/null || echo "Warning: numactl module not found"
 
+# The binding scripts below are generated into and run from the working
+# directory; main.py gives every method its own (~/hpc-project/work/<method>)
 echo "===== Hardware Detection ====="
 echo "Detecting hardware topology..."
 $SCRIPTS_DIR/2.Hardware-Detection.sh
@@ -50,7 +52,7 @@ if [ ! -f "$BANDWIDTH_FILE" ]; then
 fi
 
 # Create log files for placement tests
-PLACEMENT_LOG="$LOG_DIR/placement_tests.log"
+PLACEMENT_LOG="$LOG_DIR/placement_tests_$METHOD.log"
 rm -f "$PLACEMENT_LOG" "$CSV_LOG" 2>/dev/null || true
 
 # Function to run test and log results - matching ReFrame approach
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""Adaptive iteration control for OSU benchmarks
+
+Runs an OSU benchmark at a single message size in short batches (one job
+step each) and stops as soon as the confidence interval of the mean of the
+batch results is narrower than a target relative width, or when the time
+budget is used up.  Quiet runs stop after a few batches; noisy ones get
+more iterations instead of a single fixed -i.
+
+The output ends with one OSU-style "<size> <mean>" line, so the usual
+`^<size>\\s+(\\S+)` extraction keeps working, followed by a summary line:
+    # Adaptive result: batches=.. iterations=.. mean=.. ci_low=.. ci_high=.. rel_width=.. stop=..
+Raw batch output is echoed with a '# batch N |' prefix.  The benchmark
+command after -- is passed whole; its own -m, -x and -i are replaced by
+the runner's per-batch values.
+
+Usage:
+    adaptive_runner.py --size 8192 [--launcher "srun -n2 ..."] -- <osu_binary> [options...]
+
+Any executable that prints an OSU-like table works, which makes it easy to
+try locally with a fake benchmark printing noisy numbers.
+"""
+import argparse
+import math
+import re
+import subprocess
+import sys
+import time
+
+# OSU options the runner sets itself for every batch (each takes a value)
+BATCH_OPTIONS = ('-m', '-x', '-i')
+
+# Two-sided 95% Student t quantiles for 1..30 degrees of freedom
+T_975 = [12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262, 2.228,
+         2.201, 2.179, 2.160, 2.145, 2.131, 2.120, 2.110, 2.101, 2.093, 2.086,
+         2.080, 2.074, 2.069, 2.064, 2.060, 2.056, 2.052, 2.048, 2.045, 2.042]
+
+
+def t_quantile(df):
+    """97.5% quantile of Student's t distribution (normal beyond 30 dof)"""
+    return T_975[df - 1] if df <= len(T_975) else 1.960
+
+
+def confidence_interval(samples):
+    """(mean, low, high) 95% confidence interval of the mean of samples"""
+    n = len(samples)
+    mean = sum(samples) / n
+    if n < 2:
+        return mean, -math.inf, math.inf
+    stddev = math.sqrt(sum((x - mean) ** 2 for x in samples) / (n - 1))
+    half = t_quantile(n - 1) * stddev / math.sqrt(n)
+    return mean, mean - half, mean + half
+
+
+def strip_batch_options(command):
+    """The benchmark command without the BATCH_OPTIONS the runner overrides"""
+    stripped = []
+    args = iter(command)
+    for arg in args:
+        if arg in BATCH_OPTIONS:
+            next(args, None)
+        else:
+            stripped.append(arg)
+    return stripped
+
+
+def run_batch(command, size):
+    """Run one batch and return (value at size, raw output)"""
+    result = subprocess.run(command, shell=True, stdout=subprocess.PIPE,
+                            stderr=subprocess.STDOUT, text=True)
+    match = re.search(rf'^{size}\s+(\S+)', result.stdout, re.MULTILINE)
+    if result.returncode != 0 or not match:
+        raise RuntimeError(f"batch failed (exit code {result.returncode}):\n{result.stdout}")
+    return float(match.group(1)), result.stdout
+
+
+def run_adaptive(command, size, target, budget, min_batches=3, max_batches=1000,
+                 batch_iters=100, out=None):
+    """Run batches until the CI is narrow enough; return the result dict"""
+    out = out or sys.stdout
+    samples = []
+    start = time.monotonic()
+    stop = 'max_batches'
+    while len(samples) < max_batches:
+        value, output = run_batch(command, size)
+        samples.append(value)
+        for line in output.splitlines():
+            print(f"# batch {len(samples)} | {line}", file=out)
+
+        mean, low, high = confidence_interval(samples)
+        rel_width = (high - low) / abs(mean) if mean else math.inf
+        if len(samples) >= min_batches and rel_width <= target:
+            stop = 'converged'
+            break
+        if time.monotonic() - start >= budget:
+            stop = 'budget'
+            break
+
+    mean, low, high = confidence_interval(samples)
+    return {
+        'batches': len(samples),
+        'iterations': len(samples) * batch_iters,
+        'mean': mean,
+        'ci_low': low,
+        'ci_high': high,
+        'rel_width': (high - low) / abs(mean) if mean else math.inf,
+        'stop': stop,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run an OSU benchmark until its mean is stable")
+    parser.add_argument('--size', type=int, required=True, help="message size to measure")
+    parser.add_argument('--launcher', default='', help="command prefix for each batch, e.g. srun options")
+    parser.add_argument('--batch-iters', type=int, default=100, help="OSU -i per batch")
+    parser.add_argument('--warmup', type=int, default=10, help="OSU -x per batch")
+    parser.add_argument('--target', type=float, default=0.02,
+                        help="stop when the 95%% CI width / mean drops below this")
+    parser.add_argument('--budget', type=float, default=120, help="time budget in seconds")
+    parser.add_argument('--min-batches', type=int, default=3)
+    parser.add_argument('--max-batches', type=int, default=1000)
+    parser.add_argument('command', nargs=argparse.REMAINDER, help="benchmark command, after --")
+    args = parser.parse_args(argv)
+
+    command = args.command[1:] if args.command[:1] == ['--'] else args.command
+    if not command:
+        parser.error("no command given")
+    # The full benchmark command may carry its own -m/-x/-i
+    command = strip_batch_options(command)
+    batch_cmd = ' '.join([args.launcher, *command,
+                          '-m', f"{args.size}:{args.size}",
+                          '-x', str(args.warmup), '-i', str(args.batch_iters)]).strip()
+
+    print(f"# Adaptive run: {batch_cmd}")
+    try:
+        result = run_adaptive(batch_cmd, args.size, args.target, args.budget,
+                              args.min_batches, args.max_batches, args.batch_iters)
+    except RuntimeError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+
+    print(f"{args.size:<10}{result['mean']:>18.2f}")
+    print("# Adaptive result: " + ' '.join(
+        f"{key}={value:.6g}" if isinstance(value, float) else f"{key}={value}"
+        for key, value in result.items()))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
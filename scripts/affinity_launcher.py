@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""Per-rank placement launcher for the OSU benchmarks
+
+Replaces the bind_*.sh + numactl chain: each rank reads the cached topology
+and its SLURM_PROCID, pins itself with sched_setaffinity, binds its memory
+to the local NUMA node with set_mempolicy(MPOL_BIND) and then execs the
+benchmark.  Both the CPU mask and the memory policy survive the exec.
+
+Just before the exec each rank records the placement it actually got
+(CPU set, Mems_allowed_list, socket, NUMA node) in placement-rank<N>.json,
+which verify_placement() checks against the requested placement type.
+
+With --pairs K the job runs K concurrent pairs (osu_mbw_mr style: rank i
+talks to rank i + K): ranks 0..K-1 fill one side of the placement's
+boundary (NUMA node, socket or host) and ranks K..2K-1 the other.
+
+Usage: affinity_launcher.py [--topology topology.json] [--pairs K] <placement_type> -- <command...>
+
+Try it locally with a dummy child that reports its own mask:
+    SLURM_PROCID=1 python affinity_launcher.py same_l3 -- \
+        python -c "import os; print(os.sched_getaffinity(0))"
+"""
+import argparse
+import ctypes
+import json
+import os
+import platform
+import socket
+import sys
+
+from topology import Topology, read_topology
+
+# set_mempolicy is not exported by glibc, so it is called as a raw syscall
+SYS_SET_MEMPOLICY = {'x86_64': 238, 'aarch64': 237, 'ppc64le': 261}
+MPOL_BIND = 2
+
+# Rank variables of the launchers we may run under, most specific first
+RANK_VARS = ['SLURM_PROCID', 'OMPI_COMM_WORLD_RANK', 'PMI_RANK']
+
+
+def task_rank():
+    """Rank of this task as seen by srun/mpirun (0 outside a parallel launch)"""
+    for var in RANK_VARS:
+        if var in os.environ:
+            return int(os.environ[var])
+    return 0
+
+
+def load_topology(path):
+    """Topology from a cached topology.json, or a fresh single-pass read"""
+    if path and os.path.exists(path):
+        with open(path) as f:
+            return Topology.from_dict(json.load(f))
+    return read_topology()
+
+
+def placement_topology(path, placement):
+    """Topology a rank picks its CPU from
+
+    topology.json is written on the first node of the job, so 'diff_node'
+    ranks, which run on different hosts, read their own host restricted to
+    their own cpuset instead.
+    """
+    if placement == 'diff_node':
+        return read_topology(allowed=os.sched_getaffinity(0))
+    return load_topology(path)
+
+
+def bind_memory(nodes):
+    """Restrict future allocations of this process to the given NUMA nodes"""
+    nr = SYS_SET_MEMPOLICY.get(platform.machine())
+    if nr is None:
+        return f"set_mempolicy syscall number unknown on {platform.machine()}"
+
+    # nodemask is an array of unsigned longs, one bit per node
+    bits = ctypes.sizeof(ctypes.c_ulong) * 8
+    maxnode = max(nodes) + 1
+    mask = (ctypes.c_ulong * (maxnode // bits + 1))()
+    for node in nodes:
+        mask[node // bits] |= 1 << (node % bits)
+
+    libc = ctypes.CDLL(None, use_errno=True)
+    # maxnode counts bits; the kernel ignores the last one, hence the +1
+    if libc.syscall(nr, MPOL_BIND, mask, ctypes.c_ulong(maxnode + 1)) != 0:
+        return os.strerror(ctypes.get_errno())
+    return None
+
+
+def apply_placement(topology, placement, rank, pairs=None):
+    """Pin the calling process for `placement`
+
+    Returns (cpus, nodes) where nodes is empty if memory binding failed.
+    """
+    if pairs:
+        sides = topology.placement_sides(placement, pairs)
+        cpu = sides[min(rank // pairs, 1)][rank % pairs]
+    else:
+        pair = topology.placement_pair(placement)
+        cpu = pair[min(rank, len(pair) - 1)]
+    cpus = {cpu}
+    nodes = {topology.cpus[cpu]['node']}
+
+    os.sched_setaffinity(0, cpus)
+    error = bind_memory(sorted(nodes))
+    if error:
+        # Typically EPERM in containers or ENOSYS without NUMA support;
+        # the CPU binding alone still gives the requested placement class
+        print(f"Warning: memory binding to NUMA node(s) {sorted(nodes)} failed: {error}",
+              file=sys.stderr)
+        nodes = set()
+    return cpus, nodes
+
+
+def _mems_allowed_list():
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('Mems_allowed_list:'):
+                return line.split(':', 1)[1].strip()
+    return ''
+
+
+def record_placement(topology, placement, rank, membind, record_dir='.'):
+    """Write the placement this process really has to a JSON sidecar"""
+    cpus = sorted(os.sched_getaffinity(0))
+    record = {
+        'rank': rank,
+        'host': socket.gethostname(),
+        'placement': placement,
+        'cpus': cpus,
+        'sockets': sorted({topology.cpus[cpu]['socket'] for cpu in cpus if cpu in topology.cpus}),
+        'numa_nodes': sorted({topology.cpus[cpu]['node'] for cpu in cpus if cpu in topology.cpus}),
+        'mems_allowed_list': _mems_allowed_list(),
+        'membind': sorted(membind),
+    }
+    path = os.path.join(record_dir, f"placement-rank{rank}.json")
+    with open(path, 'w') as f:
+        json.dump(record, f, indent=2)
+    return record
+
+
+def read_placement_records(record_dir='.'):
+    """All placement sidecars in a directory, ordered by rank"""
+    records = []
+    for name in os.listdir(record_dir):
+        if name.startswith('placement-rank') and name.endswith('.json'):
+            with open(os.path.join(record_dir, name)) as f:
+                records.append(json.load(f))
+    return sorted(records, key=lambda record: record['rank'])
+
+
+def verify_placement(records, placement, topology, num_tasks=2):
+    """Compare recorded placements against the requested placement type
+
+    Rank i is checked against its partner i + num_tasks/2, which is the
+    plain rank 0/1 pair for two tasks.  Returns a list of human-readable
+    problems; an empty list means the ranks really ran where `placement`
+    says they should.
+    """
+    if len(records) != num_tasks:
+        return [f"expected {num_tasks} placement records, found {len(records)}"]
+
+    problems = []
+    for record in records:
+        if len(record['cpus']) != 1:
+            problems.append(f"rank {record['rank']} is not pinned to one CPU: {record['cpus']}")
+        elif record['membind'] and record['membind'] != record['numa_nodes']:
+            problems.append(f"rank {record['rank']} memory bound to node(s) {record['membind']} "
+                            f"but runs on node(s) {record['numa_nodes']}")
+    if problems:
+        return problems
+
+    expected = None
+    if placement != 'diff_node':
+        expected = topology.distance_class(*topology.placement_pair(placement))
+
+    half = num_tasks // 2
+    for first, second in zip(records[:half], records[half:]):
+        if placement == 'diff_node':
+            if first['host'] == second['host']:
+                problems.append(f"ranks {first['rank']} and {second['rank']} both ran on {first['host']}")
+            continue
+        if first['host'] != second['host']:
+            problems.append(f"ranks {first['rank']} and {second['rank']} ran on different hosts "
+                            f"({first['host']}, {second['host']})")
+            continue
+        actual = topology.distance_class(first['cpus'][0], second['cpus'][0])
+        if actual != expected:
+            problems.append(f"CPUs {first['cpus'][0]} and {second['cpus'][0]} are {actual}, "
+                            f"expected {expected}")
+    return problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bind this rank and exec a benchmark")
+    parser.add_argument('--topology', default='topology.json',
+                        help="cached topology file (default: ./topology.json)")
+    parser.add_argument('--record-dir', default='.',
+                        help="where to write placement-rank<N>.json (default: .)")
+    parser.add_argument('--pairs', type=int, default=None,
+                        help="number of concurrent pairs across the placement boundary")
+    parser.add_argument('placement', help="placement type, e.g. same_numa or same_l3")
+    parser.add_argument('command', nargs=argparse.REMAINDER,
+                        help="benchmark command, after --")
+    args = parser.parse_args(argv)
+
+    command = args.command[1:] if args.command[:1] == ['--'] else args.command
+    if not command:
+        parser.error("no command given")
+
+    rank = task_rank()
+    topology = placement_topology(args.topology, args.placement)
+    try:
+        cpus, nodes = apply_placement(topology, args.placement, rank, args.pairs)
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    except OSError as e:
+        # sched_setaffinity refuses CPUs outside the job's cpuset, e.g. with
+        # a topology.json from another node
+        print(f"Error: cannot pin rank {rank} for {args.placement} with {args.topology}: {e}",
+              file=sys.stderr)
+        return 1
+
+    record = record_placement(topology, args.placement, rank, nodes, args.record_dir)
+    print(f"Case {args.placement}; Task {rank} on {record['host']}: CPU {record['cpus']}, "
+          f"socket {record['sockets']}, NUMA node {record['numa_nodes']}, "
+          f"Mems_allowed_list {record['mems_allowed_list']}")
+    sys.stdout.flush()
+    os.execvp(command[0], command)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
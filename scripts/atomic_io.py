@@ -0,0 +1,20 @@
+"""Atomic writes of the JSON caches shared between nodes
+
+Topology, module snapshots, the OSU binary index, references, the results
+store state and the render cache manifest live in shared directories that
+concurrent jobs read while another job rewrites them.  Each file is written
+to a temporary file next to it and renamed over the old one, so readers see
+either the old or the new content, never a partial file.
+"""
+import json
+import os
+import tempfile
+
+
+def write_atomic_json(path, data):
+    """Replace `path` with `data` as indented JSON in one rename"""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(data, f, indent=2)
+    os.chmod(tmp_path, 0o644)
+    os.replace(tmp_path, path)
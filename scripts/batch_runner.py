@@ -0,0 +1,329 @@
+#!/usr/bin/env python3
+"""Run the whole OSUPlacementTest matrix inside one allocation
+
+Every placement x binary source x benchmark case of OSUPlacementTest is
+normally its own exclusive Slurm job, so most of the wall time is queue
+wait.  This runner takes a single two-node exclusive allocation (salloc)
+and runs every case as a job step inside it:
+
+  - the topology is read once, by a job step on a compute node, and shared
+    by all cases,
+  - the module environment of each binary source comes from its cached
+    snapshot (module_env.py) and is reused for all of its cases,
+  - each case runs in its own stage directory through affinity_launcher.py
+    with the same srun options as OSUPlacementTest, and its placement
+    sidecars are verified the same way,
+  - one perflog record per case is appended to
+    <perflog-dir>/<system>/<partition>/OSUPlacementTest-batch.log, in
+    ReFrame's pipe-separated format but with a fixed header holding the
+    columns of every metric.  ReFrame's own OSUPlacementTest.log is never
+    written, so neither writer makes the other move its log aside;
+    4.2-Analyze-Result.py and --resume read both logs.
+
+Usage:
+    batch_runner.py [--sources local eessi] [--placements same_numa diff_node] ...
+
+Outside an allocation the runner re-executes itself under salloc.  To try
+it on a workstation, point --srun at the stand-in, which runs the tasks
+directly on the local host:
+    batch_runner.py --srun scripts/srun-standin.sh --stage-dir /tmp/stage
+"""
+import argparse
+import datetime
+import json
+import os
+import shlex
+import subprocess
+import sys
+
+from topology import Topology, cluster_name, load_placement_classes
+from affinity_launcher import read_placement_records, verify_placement
+from osu_index import build_id, resolve_binary
+from module_env import apply_snapshot, load_snapshot
+from resume import case_config, config_hash, is_fresh, perflog_paths
+from references import lookup_reference, placement_references
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+TESTS_DIR = os.path.join(SCRIPTS_DIR, '..', 'tests')
+sys.path.insert(0, TESTS_DIR)
+from config import (MODULE_CONFIGS, OSU_BENCHMARKS, OSU_BUILDS, REFERENCE_VALUES,
+                    REFERENCE_METRIC_ALIASES, PLACEMENT_REFERENCE_ALIASES)
+from ulhpc import site_configuration
+
+TEST_NAME = 'OSUPlacementTest'
+PARTITION = 'batch'
+ENVIRON = 'testing-foss'
+
+# benchmark -> (family, metric), the test_type values of OSUMicroBenchmarkBase
+BENCHMARKS = {benchmark: (family, metric)
+              for family, benchmarks in OSU_BENCHMARKS.items()
+              for benchmark, metric in benchmarks}
+MESSAGE_SIZES = {'latency': 8192, 'bandwidth': 1048576}
+UNITS = {'latency': 'us', 'bandwidth': 'MB/s'}
+NUM_WARMUP_ITERS = 10
+NUM_ITERS = 1000
+
+# Columns of the batch log: the case labels, then value, unit, reference and
+# thresholds of every metric (UNITS order), 'null' where a case lacks one
+LOG_FIELDS = ['result', 'job_completion_time', 'binary_source', 'config_hash', 'display_name',
+              'environ', 'name', 'partition', 'placement_type', 'system', 'test_type']
+PERFVAR_FIELDS = ['value', 'unit', 'ref', 'lower_thres', 'upper_thres']
+
+# Pre-build-cache location of the local build
+LOCAL_OSU_DIR = os.path.expanduser('~/osu-micro-benchmarks-7.2/build')
+
+
+def module_environment(source):
+    """Environment after loading the modules of a binary source, from its snapshot"""
+    try:
+        return apply_snapshot(load_snapshot(MODULE_CONFIGS[source]), dict(os.environ))
+    except RuntimeError as e:
+        print(f"Warning: could not load modules for {source}: {e}")
+        return dict(os.environ)
+
+
+def osu_executable(source, env, benchmark, system):
+    """Benchmark path for a binary source from the OSU binary index, or None"""
+    root = env.get('EBROOTOSUMINMICROMINBENCHMARKS') or (LOCAL_OSU_DIR if source == 'local' else None)
+    version, toolchain = OSU_BUILDS[source]
+    return resolve_binary(benchmark, source, version, toolchain, root, cluster=system)
+
+
+def reference_for(system, benchmark, metric, source, placement, version=None):
+    """(value, lower, upper, unit) as OSUMicroBenchmarkBase.set_reference_values picks it"""
+    calibrated = lookup_reference(system, benchmark, source, placement, version)
+    if calibrated:
+        return calibrated
+    tables = REFERENCE_VALUES.get(system, {})
+    table = benchmark if benchmark in tables else REFERENCE_METRIC_ALIASES.get(benchmark)
+    refs = tables.get(table, {}).get(source)
+    if not refs:
+        return None
+    return placement_references(refs, placement, PLACEMENT_REFERENCE_ALIASES)
+
+
+def srun_options(placement):
+    """Step options matching OSUPlacementTest.set_job_options_for_placement"""
+    if placement == 'diff_node':
+        return ['-N2', '-n2', '--ntasks-per-node=1', '--distribution=cyclic', '--whole', '--cpu-bind=none']
+    return ['-N1', '-n2', '--whole', '--cpu-bind=none']
+
+
+def run_case(args, case, env, topology):
+    """Run one case as a job step and return its perflog fields"""
+    stagedir = os.path.join(args.stage_dir, case['name'])
+    os.makedirs(stagedir, exist_ok=True)
+    for name in os.listdir(stagedir):
+        if name.startswith('placement-rank'):
+            os.remove(os.path.join(stagedir, name))
+    with open(os.path.join(stagedir, 'topology.json'), 'w') as f:
+        json.dump(topology.to_dict(), f)
+
+    metric = case['metric']
+    size = MESSAGE_SIZES[metric]
+    problems = []
+    value = None
+    executable = osu_executable(case['binary_source'], env, case['benchmark'], args.system)
+    if executable is None:
+        problems.append(f"benchmark executable not found for {case['binary_source']}")
+    else:
+        command = [
+            *args.srun, *srun_options(case['placement_type']),
+            'python3', os.path.join(SCRIPTS_DIR, 'affinity_launcher.py'),
+            '--topology', './topology.json', case['placement_type'], '--',
+            executable, '-m', str(size), '-x', str(NUM_WARMUP_ITERS), '-i', str(NUM_ITERS)
+        ]
+        with open(os.path.join(stagedir, 'rfm_job.out'), 'w') as out, \
+                open(os.path.join(stagedir, 'rfm_job.err'), 'w') as err:
+            out.write(f"# {shlex.join(command)}\n")
+            out.flush()
+            returncode = subprocess.run(command, cwd=stagedir, env=env,
+                                        stdout=out, stderr=err).returncode
+        with open(os.path.join(stagedir, 'rfm_job.out')) as f:
+            stdout = f.read()
+
+        if returncode != 0:
+            problems.append(f"job step exited with {returncode}")
+        if '# OSU MPI' not in stdout:
+            problems.append("no OSU output")
+        for line in stdout.splitlines():
+            fields = line.split()
+            if len(fields) >= 2 and fields[0] == str(size):
+                value = float(fields[1])
+        if value is None:
+            problems.append(f"no result for message size {size}")
+        problems += verify_placement(read_placement_records(stagedir),
+                                     case['placement_type'], topology)
+
+    ref = reference_for(args.system, case['benchmark'], metric,
+                        case['binary_source'], case['placement_type'], args.reference_version)
+    result = 'pass' if not problems else 'fail'
+    if ref and value is not None and not problems:
+        target, lower, upper, _ = ref
+        if not target * (1 + lower) <= value <= target * (1 + upper):
+            result = 'fail'
+            problems.append(f"{metric} {value} outside reference {target} ({lower}, {upper})")
+    for problem in problems:
+        print(f"  {case['display_name']}: {problem}")
+
+    return {
+        'result': result,
+        'job_completion_time': datetime.datetime.now().astimezone().isoformat(timespec='seconds'),
+        'binary_source': case['binary_source'],
+        'config_hash': case['config_hash'],
+        'display_name': case['display_name'],
+        'environ': ENVIRON,
+        'name': case['name'],
+        'partition': PARTITION,
+        'placement_type': case['placement_type'],
+        'system': args.system,
+        'test_type': case['benchmark'],
+        'perfvars': [(metric, value, UNITS[metric], *(ref[:3] if ref else (0, 'null', 'null')))],
+    }
+
+
+def perflog_header():
+    return LOG_FIELDS + [f'{metric}_{field}' for metric in UNITS for field in PERFVAR_FIELDS]
+
+
+def perflog_line(fields):
+    """One record of the batch log, in perflog_header() order"""
+    values = [fields.get(name, 'null') for name in LOG_FIELDS]
+    perfvars = {name: rest for name, *rest in fields['perfvars']}
+    for metric in UNITS:
+        value, unit, ref, lower, upper = perfvars.get(metric, [None] + ['null'] * 4)
+        values += ['null' if value is None else value, unit, ref, lower, upper]
+    return '|'.join(str(v) for v in values)
+
+
+def append_perflog(path, fields):
+    """Append a record; like ReFrame, move aside a log written with another header"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    header = '|'.join(perflog_header())
+    if os.path.exists(path) and os.path.getsize(path) > 0:
+        with open(path) as f:
+            if f.readline().rstrip('\n') != header:
+                suffix = 0
+                while os.path.exists(f'{path}.h{suffix}'):
+                    suffix += 1
+                os.rename(path, f'{path}.h{suffix}')
+    new = not os.path.exists(path)
+    with open(path, 'a') as f:
+        if new:
+            f.write(header + '\n')
+        f.write(perflog_line(fields) + '\n')
+
+
+def build_matrix(placements, sources, benchmarks):
+    """Cases in OSUPlacementTest parameter order (test_type, binary_source, placement_type)"""
+    cases = []
+    for benchmark in benchmarks:
+        kind, metric = BENCHMARKS[benchmark]
+        for source in sources:
+            for placement in placements:
+                cases.append({
+                    'kind': kind, 'benchmark': benchmark, 'metric': metric,
+                    'binary_source': source, 'placement_type': placement,
+                    'name': f"{TEST_NAME}_{benchmark}_{source}_{placement}",
+                    'display_name': (f"{TEST_NAME} %test_type={benchmark} "
+                                     f"%binary_source={source} %placement_type={placement}"),
+                })
+    return cases
+
+
+def compute_node_topology(args):
+    """Topology of a compute node of the allocation, read by a job step there"""
+    command = [*args.srun, '-N1', '-n1', 'python3', os.path.join(SCRIPTS_DIR, 'topology.py'), '--json']
+    step = subprocess.run(command, stdout=subprocess.PIPE, text=True)
+    if step.returncode != 0:
+        raise RuntimeError(f"topology step exited with {step.returncode}: {shlex.join(command)}")
+    return Topology.from_dict(json.loads(step.stdout))
+
+
+def allocation_command(args, argv):
+    """salloc command re-running this script inside a two-node exclusive allocation"""
+    access = []
+    for system in site_configuration['systems']:
+        if system['name'] == args.system:
+            for partition in system['partitions']:
+                if partition['name'] == PARTITION:
+                    access = partition['access']
+    return ['salloc', '-N2', '--exclusive', f'--time={args.time_limit}', *access,
+            sys.executable, os.path.abspath(__file__), *argv]
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    parser = argparse.ArgumentParser(description="Run the OSUPlacementTest matrix in one allocation")
+    parser.add_argument('--system', default=cluster_name())
+    parser.add_argument('--placements', nargs='+', default=None,
+                        help="default: published placement classes plus diff_node")
+    parser.add_argument('--sources', nargs='+', default=list(MODULE_CONFIGS))
+    parser.add_argument('--benchmarks', nargs='+', default=list(BENCHMARKS), choices=list(BENCHMARKS))
+    parser.add_argument('--srun', default='srun', help="step launcher (e.g. scripts/srun-standin.sh)")
+    parser.add_argument('--time-limit', default='02:00:00', help="allocation time limit")
+    parser.add_argument('--stage-dir', default=os.path.join(TESTS_DIR, 'stage-batch'))
+    parser.add_argument('--perflog-dir', default=os.path.join(TESTS_DIR, 'perflogs'))
+    parser.add_argument('--resume', action='store_true',
+                        help="skip cases with a passing perflog record within --resume-window")
+    parser.add_argument('--resume-window', type=float, default=24.0, help="hours")
+    parser.add_argument('--reference-version', type=int, default=None,
+                        help="calibrated references to use (default: latest; 0: static tables only)")
+    args = parser.parse_args(argv)
+
+    if args.srun == 'srun' and 'SLURM_JOB_ID' not in os.environ:
+        command = allocation_command(args, argv)
+        print(f"Requesting allocation: {shlex.join(command)}")
+        return subprocess.run(command).returncode
+
+    # Steps run from their stage directories, so resolve a relative stand-in
+    args.srun = shlex.split(args.srun)
+    if os.path.exists(args.srun[0]):
+        args.srun[0] = os.path.abspath(args.srun[0])
+    placements = args.placements or load_placement_classes(args.system) + ['diff_node']
+    cases = build_matrix(placements, args.sources, args.benchmarks)
+    args.stage_dir = os.path.join(os.path.abspath(args.stage_dir), args.system, PARTITION)
+    perflogs = perflog_paths(args.perflog_dir, args.system, PARTITION, TEST_NAME)
+    perflog = perflogs[-1]
+
+    # One topology read for the whole allocation, on a compute node: this
+    # script itself may run on the login node that salloc was called from
+    try:
+        topology = compute_node_topology(args)
+    except (RuntimeError, ValueError) as e:
+        print(f"Error: cannot read the compute node topology: {e}")
+        return 1
+    print(f"Running {len(cases)} cases on {args.system} "
+          f"({topology.socket_count} socket(s), {topology.numa_count} NUMA node(s))")
+
+    failures = 0
+    skipped = 0
+    environments = {}
+    for case in cases:
+        source = case['binary_source']
+        version, toolchain = OSU_BUILDS[source]
+        # Same configuration hash as the ReFrame test, so either can resume the other
+        case['config_hash'] = config_hash(case_config(
+            case['display_name'], args.system, PARTITION, ENVIRON,
+            build_id(source, version, toolchain, cluster=args.system),
+            sizes=MESSAGE_SIZES[case['metric']], warmup=NUM_WARMUP_ITERS, iterations=NUM_ITERS))
+        if args.resume and is_fresh(perflogs, case['config_hash'], args.resume_window):
+            skipped += 1
+            print(f"[SKIP] {case['display_name']} (passed within {args.resume_window:g} h)")
+            continue
+
+        if source not in environments:
+            print(f"Loading modules for {source}")
+            environments[source] = module_environment(source)
+        fields = run_case(args, case, environments[source], topology)
+        append_perflog(perflog, fields)
+        failures += fields['result'] != 'pass'
+        print(f"[{fields['result'].upper():>4}] {case['display_name']}")
+
+    print(f"{len(cases) - failures - skipped}/{len(cases) - skipped} cases passed, "
+          f"{skipped} skipped; perflog: {perflog}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
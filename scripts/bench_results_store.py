@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""Micro-benchmark: full perflog re-parse vs incremental results store ingestion
+
+Writes a synthetic OSUPlacementTest perflog with --records records (same
+header as the batch runner writes) and times
+  - legacy: pd.read_csv of the whole perflog plus the column selection of
+    parse_osu_logs in 4.2-Analyze-Result.py, as every analysis run did,
+  - initial: results_store ingestion of the whole perflog (first run),
+  - nightly: ingestion after --append more records were appended (every
+    later run), and the legacy re-parse of the grown file for comparison,
+  - read: loading the whole store back as one DataFrame.
+
+Usage: python bench_results_store.py [--records 1000000] [--append 240]
+"""
+import argparse
+import os
+import random
+import shutil
+import tempfile
+import time
+
+import pandas as pd
+
+import results_store
+from results_store import ResultsStore
+
+HEADER = ['result', 'job_completion_time', 'binary_source', 'config_hash', 'placement_type',
+          'system', 'test_type', 'bandwidth_value', 'bandwidth_unit', 'bandwidth_ref',
+          'bandwidth_lower_thres', 'bandwidth_upper_thres']
+PLACEMENTS = ['same_numa', 'diff_numa_same_socket', 'diff_socket_same_node', 'diff_node']
+SOURCES = ['local', 'easybuild', 'eessi']
+
+
+def write_records(path, count, seed, header=False):
+    rng = random.Random(seed)
+    lines = ['|'.join(HEADER)] if header else []
+    for i in range(count):
+        latency = rng.random() < 0.5
+        value = rng.uniform(0.5, 5.0) if latency else rng.uniform(5000, 25000)
+        lines.append('|'.join([
+            'pass' if rng.random() < 0.97 else 'fail',
+            f'2026-{1 + i % 12:02d}-{1 + i % 28:02d}T02:{i % 60:02d}:00+02:00',
+            rng.choice(SOURCES), f'{rng.getrandbits(64):016x}', rng.choice(PLACEMENTS),
+            'aion:batch', 'osu_get_latency' if latency else 'osu_get_bw', f'{value:.2f}',
+            'us' if latency else 'MB/s', '2.0' if latency else '12000', '-0.1', 'null']))
+    with open(path, 'a') as f:
+        f.write('\n'.join(lines) + '\n')
+
+
+def legacy_parse(path):
+    """What parse_osu_logs did on every run"""
+    df = pd.read_csv(path, sep='|')
+    df.columns = df.columns.str.strip()
+    result_df = df.copy()
+    result_df['metric'] = 'bandwidth'
+    result_df['value'] = pd.to_numeric(result_df['bandwidth_value'], errors='coerce')
+    result_df['unit'] = result_df['bandwidth_unit']
+    result_df = result_df[['result', 'system', 'binary_source', 'placement_type', 'metric', 'value', 'unit']]
+    result_df['cluster'] = 'aion'
+    result_df.loc[result_df['unit'] == 'us', 'metric'] = 'latency'
+    return result_df
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--records', type=int, default=1000000)
+    parser.add_argument('--append', type=int, default=240, help="records of one nightly run")
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix='bench-results-store-')
+    try:
+        log = os.path.join(root, 'perflogs', 'aion', 'batch', 'OSUPlacementTest.log')
+        os.makedirs(os.path.dirname(log))
+        write_records(log, args.records, seed=1, header=True)
+        size_mb = os.path.getsize(log) / 1e6
+        engine = 'pyarrow/parquet' if results_store.pyarrow is not None else 'pandas/pickle'
+        print(f"Synthetic perflog: {args.records} records, {size_mb:.0f} MB; store engine: {engine}")
+
+        store = ResultsStore(os.path.join(root, 'store'))
+        legacy, expected = timed(legacy_parse, log)
+        initial, added = timed(store.ingest, log)
+        assert added == args.records
+
+        write_records(log, args.append, seed=2)
+        legacy_nightly, _ = timed(legacy_parse, log)
+        nightly, added = timed(ResultsStore(store.store_dir).ingest, log)
+        assert added == args.append
+        read, df = timed(store.read)
+        assert len(df) == len(expected) + args.append
+
+        print(f"{'step':<34} | {'time (s)':>9}")
+        print("-" * 46)
+        print(f"{'legacy full parse':<34} | {legacy:>9.3f}")
+        print(f"{'store: initial ingest':<34} | {initial:>9.3f}")
+        print(f"{'legacy full parse, +1 night':<34} | {legacy_nightly:>9.3f}")
+        print(f"{'store: ingest +1 night':<34} | {nightly:>9.4f}")
+        print(f"{'store: read all records':<34} | {read:>9.3f}")
+        print(f"Nightly ingest speedup over a full parse: {legacy_nightly / nightly:.0f}x")
+        print(f"Nightly ingest + read vs full parse: {legacy_nightly / (nightly + read):.1f}x")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
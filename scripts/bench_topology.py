@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""Micro-benchmark: single-pass topology discovery vs per-CPU lscpu pipelines
+
+Builds fake sysfs trees shaped like an Aion node (2 sockets, 4 NUMA nodes
+per socket, one L3 per 4 cores) with 32, 128 and 512 CPUs and times
+  - legacy: two `lscpu -p=... | grep '^cpu,' | cut` pipelines per CPU, as
+    detect_hardware_topology used to do.  lscpu cannot be pointed at a fake
+    tree, so `cat` of a pre-rendered `lscpu -p` table stands in for it; the
+    real command is slower, so the legacy numbers are a lower bound.
+  - sysfs: topology.read_sysfs_topology on the same tree.
+
+Usage: python bench_topology.py [--cpus 32 128 512] [--repeat 3]
+"""
+import argparse
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+
+from topology import read_sysfs_topology, CPU_DIR, NODE_DIR
+
+SOCKETS = 2
+NUMA_PER_SOCKET = 4
+CORES_PER_L3 = 4
+
+
+def _write(path, text):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        f.write(f"{text}\n")
+
+
+def build_fake_sysfs(root, num_cpus):
+    """Create a fake /sys/devices/system tree with `num_cpus` CPUs under root"""
+    cpu_dir = os.path.join(root, CPU_DIR)
+    node_dir = os.path.join(root, NODE_DIR)
+    per_socket = num_cpus // SOCKETS
+    per_node = max(per_socket // NUMA_PER_SOCKET, 1)
+
+    _write(os.path.join(cpu_dir, 'online'), f"0-{num_cpus - 1}")
+    node_cpus = {}
+    lscpu_rows = []
+    for cpu in range(num_cpus):
+        socket = cpu // per_socket
+        node = cpu // per_node
+        l3 = cpu - cpu % CORES_PER_L3
+        node_cpus.setdefault(node, []).append(cpu)
+        lscpu_rows.append((cpu, node, socket))
+
+        base = os.path.join(cpu_dir, f"cpu{cpu}")
+        _write(os.path.join(base, 'topology', 'physical_package_id'), socket)
+        _write(os.path.join(base, 'topology', 'core_id'), cpu % per_socket)
+        _write(os.path.join(base, 'topology', 'die_id'), 0)
+        for index, (level, ctype, shared) in enumerate([
+                (1, 'Data', str(cpu)),
+                (1, 'Instruction', str(cpu)),
+                (2, 'Unified', str(cpu)),
+                (3, 'Unified', f"{l3}-{l3 + CORES_PER_L3 - 1}")]):
+            index_dir = os.path.join(base, 'cache', f"index{index}")
+            _write(os.path.join(index_dir, 'level'), level)
+            _write(os.path.join(index_dir, 'type'), ctype)
+            _write(os.path.join(index_dir, 'shared_cpu_list'), shared)
+
+    for node, cpus in node_cpus.items():
+        _write(os.path.join(node_dir, f"node{node}", 'cpulist'), f"{cpus[0]}-{cpus[-1]}")
+
+    # Stand-ins for `lscpu -p=cpu,node` and `lscpu -p=cpu,socket`
+    _write(os.path.join(root, 'lscpu-cpu-node'),
+           '\n'.join(f"{cpu},{node}" for cpu, node, _ in lscpu_rows))
+    _write(os.path.join(root, 'lscpu-cpu-socket'),
+           '\n'.join(f"{cpu},{socket}" for cpu, _, socket in lscpu_rows))
+
+
+def legacy_detection(root, num_cpus):
+    """Per-CPU subprocess pipelines, as in the original detect_hardware_topology"""
+    numa_cpus_map = {}
+    for cpu in range(num_cpus):
+        node = subprocess.run(f"cat {root}/lscpu-cpu-node | grep '^{cpu},' | cut -d, -f2",
+                              shell=True, stdout=subprocess.PIPE, text=True).stdout.strip()
+        subprocess.run(f"cat {root}/lscpu-cpu-socket | grep '^{cpu},' | cut -d, -f2",
+                       shell=True, stdout=subprocess.PIPE, text=True)
+        numa_cpus_map.setdefault(node, []).append(cpu)
+    return numa_cpus_map
+
+
+def best_of(repeat, func, *args):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--cpus', type=int, nargs='+', default=[32, 128, 512])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'CPUs':>6} | {'legacy (s)':>11} | {'sysfs (s)':>10} | {'speedup':>8}")
+    print("-" * 46)
+    for num_cpus in args.cpus:
+        root = tempfile.mkdtemp(prefix=f"fake-sysfs-{num_cpus}-")
+        try:
+            build_fake_sysfs(root, num_cpus)
+            topology = read_sysfs_topology(root)
+            assert len(topology.cpus) == num_cpus
+            assert topology.numa_count == SOCKETS * NUMA_PER_SOCKET
+
+            legacy = best_of(args.repeat, legacy_detection, root, num_cpus)
+            sysfs = best_of(args.repeat, read_sysfs_topology, root)
+            print(f"{num_cpus:>6} | {legacy:>11.3f} | {sysfs:>10.4f} | {legacy / sysfs:>7.0f}x")
+        finally:
+            shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""JSON-lines run journal with per-phase timing
+
+Every phase of a benchmark run (install, environment setup, module load,
+benchmark, verify) becomes one record with start/end timestamps, duration,
+exit code, host and method.  Records are buffered in memory and appended
+to the journal in one write when the buffer fills or the journal closes,
+so logging costs no file opens in the middle of a run.
+
+    journal = Journal(path)
+    with journal.phase('install', 'eessi') as record:
+        record['exit_code'] = run(...)
+    journal.close()
+
+`journal.py summarize` shows where the time of the last runs went:
+
+    python3 journal.py summarize [--journal path] [--runs 5]
+"""
+import argparse
+import datetime
+import json
+import os
+import socket
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+JOURNAL_PATH = os.path.expanduser('~/hpc-project/log/journal.jsonl')
+PHASES = ['install', 'environment_setup', 'module_load', 'benchmark', 'verify']
+
+
+def _timestamp(epoch):
+    return datetime.datetime.fromtimestamp(epoch).astimezone().isoformat(timespec='milliseconds')
+
+
+class Journal:
+    """Buffered writer of phase records for one run"""
+
+    def __init__(self, path=JOURNAL_PATH, buffer_size=32, run_id=None):
+        self.path = path
+        self.buffer_size = buffer_size
+        self.run_id = run_id or datetime.datetime.now().strftime('%Y%m%dT%H%M%S-') + uuid.uuid4().hex[:6]
+        self.host = socket.gethostname()
+        self._records = []
+        self._lock = threading.Lock()
+
+    def record(self, phase, method, start, end, exit_code, **extra):
+        """Add one finished phase"""
+        record = {
+            'run_id': self.run_id,
+            'phase': phase,
+            'method': method,
+            'host': self.host,
+            'start': _timestamp(start),
+            'end': _timestamp(end),
+            'duration_s': round(end - start, 3),
+            'exit_code': exit_code,
+            **extra,
+        }
+        with self._lock:
+            self._records.append(record)
+            if len(self._records) >= self.buffer_size:
+                self._flush_locked()
+        return record
+
+    @contextmanager
+    def phase(self, phase, method, **extra):
+        """Time a phase; set fields (e.g. 'exit_code') on the yielded dict
+
+        An exception inside the block is recorded with exit code 1 and
+        re-raised.
+        """
+        fields = dict(extra, exit_code=0)
+        start = time.time()
+        try:
+            yield fields
+        except BaseException:
+            fields['exit_code'] = 1
+            raise
+        finally:
+            exit_code = fields.pop('exit_code')
+            self.record(phase, method, start, time.time(), exit_code, **fields)
+
+    def _flush_locked(self):
+        if not self._records:
+            return
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, 'a') as f:
+            f.write(''.join(json.dumps(record) + '\n' for record in self._records))
+        self._records = []
+
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    close = flush
+
+
+def read_journal(path=JOURNAL_PATH):
+    records = []
+    try:
+        with open(path) as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    records.append(json.loads(line))
+    except FileNotFoundError:
+        pass
+    return records
+
+
+def summarize(records, runs=None):
+    """Per run: total wall time and each phase's share, per method"""
+    run_ids = list(dict.fromkeys(record['run_id'] for record in records))
+    if runs:
+        run_ids = run_ids[-runs:]
+
+    lines = []
+    for run_id in run_ids:
+        run = [record for record in records if record['run_id'] == run_id]
+        # Methods run concurrently, so the run's wall time is its time span
+        wall = (max(datetime.datetime.fromisoformat(r['end']) for r in run) -
+                min(datetime.datetime.fromisoformat(r['start']) for r in run)).total_seconds()
+        failed = sum(1 for record in run if record['exit_code'] != 0)
+        lines.append(f"Run {run_id} on {run[0]['host']}: {wall:.1f} s wall, "
+                     f"{len(run)} phases, {failed} failed")
+        lines.append(f"  {'method':<10} " + ' '.join(f"{phase:>17}" for phase in PHASES) + f" {'total':>9}")
+        for method in dict.fromkeys(record['method'] for record in run):
+            durations = {phase: 0.0 for phase in PHASES}
+            for record in run:
+                if record['method'] == method:
+                    durations[record['phase']] = durations.get(record['phase'], 0.0) + record['duration_s']
+            total = sum(durations.values()) or 1.0
+            cells = [f"{durations[phase]:>8.1f}s ({durations[phase] / total:>4.0%})" for phase in PHASES]
+            lines.append(f"  {method:<10} " + ' '.join(f"{cell:>17}" for cell in cells)
+                         + f" {sum(durations.values()):>8.1f}s")
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Summarize the benchmark run journal")
+    parser.add_argument('action', choices=['summarize'])
+    parser.add_argument('--journal', default=JOURNAL_PATH)
+    parser.add_argument('--runs', type=int, default=5, help="number of most recent runs (0: all)")
+    args = parser.parse_args(argv)
+
+    records = read_journal(args.journal)
+    if not records:
+        print(f"No records in {args.journal}")
+        return 1
+    print(summarize(records, args.runs))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
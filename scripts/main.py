@@ -3,18 +3,53 @@ import sys
 import subprocess
 import datetime
 import argparse
+import atexit
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 
+from journal import Journal
+from module_env import apply_snapshot, load_snapshot, snapshot_path
+from osu_index import indexed_root
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tests'))
+from config import MODULE_CONFIGS, OSU_BUILDS
+
+
+# Methods run in parallel threads: the lock keeps lines whole and the
+# thread-local tag prefixes console lines with the method they belong to
+_output_lock = threading.Lock()
+_context = threading.local()
+# Log files stay open for the whole run instead of one open per line; they
+# are line buffered, so a crash or kill loses no finished line
+_log_handles = {}
+
 
 def log(message, log_file):
     """Log message to both console and file"""
-    print(message)
-    with open(log_file, 'a') as f:
-        f.write(message + '\n')
+    tag = getattr(_context, 'tag', None)
+    with _output_lock:
+        print(f"[{tag}] {message}" if tag else message, flush=True)
+        if log_file not in _log_handles:
+            _log_handles[log_file] = open(log_file, 'a', buffering=1)
+        _log_handles[log_file].write(message + '\n')
+
+def close_logs():
+    """Flush and close all log files"""
+    with _output_lock:
+        for handle in _log_handles.values():
+            handle.close()
+        _log_handles.clear()
+
+# Also closed when main() does not get to its end (exception, sys.exit)
+atexit.register(close_logs)
         
 log_dir = os.path.expanduser("~/hpc-project/log")
 os.makedirs(log_dir, exist_ok=True)
 log_file = os.path.join(log_dir, "test_run.log")
+# One timed record per phase and method; see journal.py summarize
+journal = Journal(os.path.join(log_dir, "journal.jsonl"))
+atexit.register(journal.close)
 
 timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 log(f"Starting HPC benchmark test suite at {timestamp}", log_file)
@@ -24,22 +59,42 @@ log("=======================================", log_file)
 script_dir = os.path.expanduser("~/hpc-project/scripts")
 install_script = os.path.join(script_dir, "1.Install-OSU-Micro-Benchmarks.sh")
 test_script = os.path.join(script_dir, "3.Tests.sh")
+# 3.Tests.sh writes its binding scripts into its working directory, so
+# concurrent methods each run in a directory of their own
+work_dir = os.path.expanduser("~/hpc-project/work")
 
-def run_command(cmd, log_file, shell=False):
-    """Run a command and log its output to both console and file"""
-    log(f"Running command: {cmd}", log_file)
-    process = subprocess.run(
-        cmd, shell=True, capture_output=True, text=True)
+def _stream_lines(pipe, log_file, tag, prefix=''):
+    """Log every line of a pipe as soon as it is written"""
+    _context.tag = tag
+    for line in pipe:
+        log(prefix + line.rstrip('\n'), log_file)
+    pipe.close()
+
+def run_command(cmd, log_file, shell=False, env=None, cwd=None):
+    """Run a command and stream its stdout/stderr to both console and file"""
+    log(f"Running command: {cmd}" + (f" (in {cwd})" if cwd else ""), log_file)
+    process = subprocess.Popen(
+        cmd, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+        text=True, bufsize=1, env=env, cwd=cwd)
     
-    # Read and log output line by line
-    log(process.stdout, log_file)
+    # Read and log both pipes line by line while the command runs
+    tag = getattr(_context, 'tag', None)
+    readers = [
+        threading.Thread(target=_stream_lines, args=(process.stdout, log_file, tag)),
+        threading.Thread(target=_stream_lines, args=(process.stderr, log_file, tag, 'stderr: '))
+    ]
+    for reader in readers:
+        reader.start()
+    for reader in readers:
+        reader.join()
     
     # Wait for the process to complete and get exit code
-    exit_code = process.returncode
+    exit_code = process.wait()
     return exit_code
 
 def run_test_for_method(method, log_file, script_dir):
     """Run tests for a specific installation method"""    
+    _context.tag = method
     log("=======================================", log_file)
     log(f"Running tests for method: {method}", log_file)
     log("=======================================", log_file)
@@ -49,45 +104,74 @@ def run_test_for_method(method, log_file, script_dir):
     
     # Step 1: Run the installation script with method
     log(f"Installing OSU benchmarks ({method})...", log_file)
-    exit_code = run_command(f"{install_script} --method {method}", log_file)
+    with journal.phase("install", method) as phase:
+        exit_code = run_command(f"{install_script} --method {method}", log_file)
+        phase["exit_code"] = exit_code
     if exit_code != 0:
         log(f"ERROR: Installation script failed for {method}", log_file)
         return 1
     
-    # Step 2: Prepare environment setup commands
+    # Step 2: Collect the environment of this method: its modules plus the
+    # install script's environment file
+    with journal.phase("environment_setup", method) as phase:
+        commands = list(MODULE_CONFIGS.get(method, []))
+        phase["env_file"] = os.path.isfile(env_file)
+        if os.path.isfile(env_file):
+            log(f"Using environment file: {env_file}", log_file)
+            with open(env_file) as f:
+                commands += [line.strip() for line in f if line.strip()]
+        else:
+            log(f"Warning: Environment file not found at {env_file}", log_file)
+            log("Continuing with existing environment", log_file)
     
-    # Source environment file if it exists
-    if os.path.isfile(env_file):
-        log(f"Sourcing environment file: {env_file}", log_file)
-        run_command(f"source {env_file}", log_file, shell=True)
-    else:
-        log(f"Warning: Environment file not found at {env_file}", log_file)
-        log("Continuing with existing environment", log_file)
-    
-    # Step 3: Load modules if environment variable not set
-    if "EBROOTOSUMINMICROMINBENCHMARKS" not in os.environ:
-        log("Warning: EBROOTOSUMINMICROMINBENCHMARKS not set, attempting to load modules directly", log_file)
-        if method == "easybuild":
-            run_command("module load tools/EasyBuild/5.0.0 2>/dev/null || true", log_file, shell=True)
-            run_command("module load perf/OSU-Micro-Benchmarks/7.2-gompi-2023b 2>/dev/null || true", log_file, shell=True)
-        elif method == "eessi":
-            run_command("module load EESSI 2>/dev/null || true", log_file, shell=True)
-            run_command("module load OSU-Micro-Benchmarks/7.2-gompi-2023b 2>/dev/null || true", log_file, shell=True)
+    # Step 3: Load it once from its cached snapshot and pass it to the test
+    # script; module loads in a throwaway subprocess would not reach later
+    # commands
+    with journal.phase("module_load", method) as phase:
+        phase["cached"] = os.path.exists(snapshot_path(commands))
+        env = dict(os.environ)
+        try:
+            apply_snapshot(load_snapshot(commands), env)
+        except RuntimeError as e:
+            log(f"Warning: could not load the {method} environment: {e}", log_file)
+            phase["exit_code"] = 1
         
-        elif method == "local":            
-            INSTALL_DIR=os.path.expanduser(f"~/osu-micro-benchmarks-7.2/build")
-            run_command(f'export EBROOTOSUMINMICROMINBENCHMARKS={INSTALL_DIR}', log_file, shell=True)
-            log("Using local OSU installation", log_file)
-        # print(f"EBROOTOSUMINMICROMINBENCHMARKS={os.environ['EBROOTOSUMINMICROMINBENCHMARKS']}")
+        # Fall back to the local build if no module provides OSU
+        if "EBROOTOSUMINMICROMINBENCHMARKS" not in env:
+            log("Warning: EBROOTOSUMINMICROMINBENCHMARKS not set after loading modules", log_file)
+            if method == "local":
+                # The build for this toolchain, found through its build cache index
+                env["EBROOTOSUMINMICROMINBENCHMARKS"] = (
+                    indexed_root("local", *OSU_BUILDS["local"])
+                    or os.path.expanduser("~/osu-micro-benchmarks-7.2/build"))
+                log(f"Using local OSU installation at {env['EBROOTOSUMINMICROMINBENCHMARKS']}", log_file)
+    
     # Step 4: Run the test script
     log(f"Running benchmark tests for {method}...", log_file)
     log("---------------------------------------", log_file)
     
-    # Add export of OSU_METHOD and test script command
-    exit_code = run_command(f"export OSU_METHOD={method}", log_file, shell=True)
-    exit_code = run_command(f"{test_script} {method}", log_file, shell=True)
-
-    # Step 5: Report results
+    env["OSU_METHOD"] = method
+    method_dir = os.path.join(work_dir, method)
+    os.makedirs(method_dir, exist_ok=True)
+    with journal.phase("benchmark", method) as phase:
+        exit_code = run_command(f"{test_script} {method}", log_file, shell=True, env=env,
+                                cwd=method_dir)
+        phase["exit_code"] = exit_code
+    
+    # Step 5: Check that the benchmarks actually produced results
+    with journal.phase("verify", method) as phase:
+        placement_log = os.path.join(log_dir, f"placement_tests_{method}.log")
+        results = 0
+        if os.path.isfile(placement_log):
+            with open(placement_log) as f:
+                results = sum(1 for line in f if line.startswith("# OSU MPI"))
+        phase["results"] = results
+        if results == 0:
+            log(f"No OSU results found in {placement_log}", log_file)
+            phase["exit_code"] = 1
+            exit_code = exit_code or 1
+    
+    # Step 6: Report results
     if exit_code == 0:
         log(f"✅ Tests completed successfully for {method}", log_file)
     else:
@@ -101,6 +185,8 @@ def main():
     parser.add_argument("--method", nargs="?", default="local", 
                       choices=["local", "easybuild", "eessi", "all"],
                       help="Installation method (default: local)")
+    parser.add_argument("--jobs", "-j", type=int, default=None,
+                      help="Methods to run concurrently with --method all (default: all of them)")
     args = parser.parse_args()
     
     install_method = args.method
@@ -116,19 +202,26 @@ def main():
     
     # Run tests based on selected method
     if install_method == "all":
-        # Run tests for each method
+        # The methods are independent, so run them concurrently; each one
+        # streams into its own log besides the console
         methods = ["local", "easybuild", "eessi"]
-        for method in methods:
-            method_exit_code = run_test_for_method(method, log_file, script_dir)
-            
-            # Keep track of errors
-            if method_exit_code != 0:
-                overall_exit_code = method_exit_code
-            
-            # Add some separation between test runs
-            log("", log_file)
-            log("---------------------------------------", log_file)
-            log("", log_file)
+        method_logs = {method: os.path.join(log_dir, f"test_run_{method}.log") for method in methods}
+        with ThreadPoolExecutor(max_workers=args.jobs or len(methods)) as pool:
+            futures = {pool.submit(run_test_for_method, method, method_logs[method], script_dir): method
+                       for method in methods}
+            for future in as_completed(futures):
+                method = futures[future]
+                try:
+                    method_exit_code = future.result()
+                except Exception as e:
+                    log(f"❌ {method} failed: {e}", log_file)
+                    method_exit_code = 1
+                
+                # Keep track of errors
+                if method_exit_code != 0:
+                    overall_exit_code = method_exit_code
+                log(f"{method} finished with exit code {method_exit_code} "
+                    f"(log: {method_logs[method]})", log_file)
     else:
         # Run only the specified method
         overall_exit_code = run_test_for_method(install_method, log_file, script_dir)
@@ -143,7 +236,10 @@ def main():
     log(f"Log file: {log_file}", log_file)
     timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     log(f"Completed at: {timestamp}", log_file)
+    log("Phase timings: python3 journal.py summarize", log_file)
     
+    journal.close()
+    close_logs()
     return overall_exit_code
 
 if __name__ == "__main__":
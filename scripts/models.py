@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""Hockney and LogGP models fitted to message-size sweeps
+
+Every run of a sweep (sweep_range; points from the results store's sweep
+table) is reduced to the Hockney model of the time per message
+
+    T(m) = alpha + beta * m          [us, m in bytes]
+
+where alpha is the startup latency and 1/beta the asymptotic bandwidth
+(bytes/us = MB/s).  Latency sweeps give T directly; bandwidth sweeps give
+T = m / bandwidth.  The fit is weighted least squares with weights 1/T^2,
+i.e. it minimises the relative error, so the small messages that carry
+alpha count as much as the large ones that carry beta.  All runs of all
+(cluster, binary source, placement, benchmark) combinations are fitted at
+once from grouped sums, with R^2 (weighted) and the RMS relative error as
+fit quality.
+
+Where a combination has both a latency sweep and a bandwidth sweep
+reaching down to small messages, the latest fits also give LogGP
+parameters: L + 2o from the latency fit's alpha, G from the bandwidth
+fit's beta and the gap g from the time per message of the smallest
+streamed messages.  L and o cannot be told apart without overhead
+measurements, so they are reported together.
+
+The fitted parameters of every run are tracked as series of their own
+('startup_latency', 'asymptotic_bandwidth') and scanned for step changes
+with regressions.py.
+
+Usage:
+    models.py [--store DIR] [--min-size 1] [--max-size 4194304] [--csv history.csv]
+"""
+import argparse
+import sys
+
+import numpy as np
+import pandas as pd
+
+from regressions import change_report, format_report
+
+COMBINATION = ['cluster', 'binary_source', 'placement_type', 'benchmark']
+# Fewest message sizes for a fit
+MIN_POINTS = 3
+# Bandwidth sweep sizes (bytes) whose time per message approximates the gap g
+GAP_MAX_SIZE = 8
+
+
+def message_times(sweeps):
+    """Sweep points with 'time_us', the time per message"""
+    points = sweeps.dropna(subset=['value', 'size']).copy()
+    points = points[points['value'] > 0]
+    points['size'] = points['size'].astype(float)
+    points['time_us'] = np.where(points['metric'] == 'latency', points['value'],
+                                 points['size'] / points['value'])
+    points['time'] = pd.to_datetime(points['job_completion_time'], utc=True, format='ISO8601',
+                                    errors='coerce')
+    return points.dropna(subset=['time'])
+
+
+def fit_hockney(points, by):
+    """Weighted least-squares T = alpha + beta * m for every group of points
+
+    Returns one row per group (indexed by `by`) with alpha_us,
+    beta_us_per_byte, bandwidth_mbs, r2, rms_rel_error and points; groups
+    with fewer than MIN_POINTS sizes or a non-positive slope get NaN.
+    """
+    m, t = points['size'].to_numpy(), points['time_us'].to_numpy()
+    w = 1.0 / t ** 2
+    terms = pd.DataFrame({'w': w, 'wm': w * m, 'wt': w * t, 'wmm': w * m * m, 'wmt': w * m * t},
+                         index=points.index)
+    keys = [points[name] for name in by]
+    sums = terms.groupby(keys, observed=True).sum()
+    sums['points'] = points.groupby(by, observed=True)['size'].nunique()
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        det = sums['w'] * sums['wmm'] - sums['wm'] ** 2
+        beta = (sums['w'] * sums['wmt'] - sums['wm'] * sums['wt']) / det
+        alpha = (sums['wt'] - beta * sums['wm']) / sums['w']
+    fits = pd.DataFrame({'alpha_us': alpha, 'beta_us_per_byte': beta, 'points': sums['points']})
+    fits.loc[(fits['points'] < MIN_POINTS) | ~(fits['beta_us_per_byte'] > 0),
+             ['alpha_us', 'beta_us_per_byte']] = np.nan
+    fits['bandwidth_mbs'] = 1.0 / fits['beta_us_per_byte']
+
+    # Fit quality from the residuals of every point against its group's line
+    params = fits[['alpha_us', 'beta_us_per_byte']].reindex(pd.MultiIndex.from_arrays(keys))
+    predicted = params['alpha_us'].to_numpy() + params['beta_us_per_byte'].to_numpy() * m
+    mean_t = (sums['wt'] / sums['w']).reindex(params.index).to_numpy()
+    quality = pd.DataFrame({'res': w * (t - predicted) ** 2, 'tot': w * (t - mean_t) ** 2,
+                            'rel': ((predicted - t) / t) ** 2}, index=points.index)
+    quality = quality.groupby(keys, observed=True).agg(res=('res', 'sum'), tot=('tot', 'sum'),
+                                                       rel=('rel', 'mean'))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        fits['r2'] = 1.0 - quality['res'] / quality['tot']
+    fits['rms_rel_error'] = np.sqrt(quality['rel'])
+    fits.index.names = by
+    return fits
+
+
+def fit_history(sweeps, min_size=None, max_size=None):
+    """Hockney fit of every run of every combination"""
+    points = message_times(sweeps)
+    if min_size:
+        points = points[points['size'] >= min_size]
+    if max_size:
+        points = points[points['size'] <= max_size]
+    if points.empty:
+        return pd.DataFrame(columns=COMBINATION + ['metric', 'time', 'alpha_us', 'beta_us_per_byte',
+                                                   'points', 'bandwidth_mbs', 'r2', 'rms_rel_error'])
+    return fit_hockney(points, COMBINATION + ['metric', 'time']).reset_index()
+
+
+def latest_models(history):
+    """Latest fit of every combination, with the median of its earlier fits"""
+    history = history.dropna(subset=['alpha_us']).sort_values('time', kind='stable')
+    groups = history.groupby(COMBINATION + ['metric'], observed=True)
+    latest = groups.tail(1).set_index(COMBINATION + ['metric'])
+    earlier = history.drop(groups.tail(1).index).groupby(COMBINATION + ['metric'], observed=True)
+    latest['runs'] = groups.size()
+    latest['alpha_median_us'] = earlier['alpha_us'].median()
+    latest['bandwidth_median_mbs'] = earlier['bandwidth_mbs'].median()
+    return latest.reset_index()
+
+
+def loggp(sweeps, latest):
+    """LogGP parameters per (cluster, source, placement) with both kinds of sweep
+
+    L + 2o is the latency fit's alpha, G the bandwidth fit's beta, g the
+    median time per message of the bandwidth sweep's sizes up to
+    GAP_MAX_SIZE in its latest run.
+    """
+    where = ['cluster', 'binary_source', 'placement_type']
+    latency = latest[latest['metric'] == 'latency']
+    L_2o = latency.groupby(where, observed=True)['alpha_us'].median()
+    bandwidth = latest[latest['metric'] == 'bandwidth']
+    G = bandwidth.groupby(where, observed=True)['beta_us_per_byte'].median()
+
+    points = message_times(sweeps)
+    small = points[(points['metric'] == 'bandwidth') & (points['size'] <= GAP_MAX_SIZE)]
+    small = small.merge(bandwidth[COMBINATION + ['time']], on=COMBINATION + ['time'])
+    g = small.groupby(where, observed=True)['time_us'].median()
+
+    model = pd.DataFrame({'L_2o_us': L_2o, 'g_us': g, 'G_us_per_byte': G}).dropna()
+    model['G_bandwidth_mbs'] = 1.0 / model['G_us_per_byte']
+    return model.reset_index()
+
+
+def parameter_series(history):
+    """Fitted parameters per run as results rows, for regressions.change_report"""
+    history = history.dropna(subset=['alpha_us'])
+    frames = []
+    for name, column in [('startup_latency', 'alpha_us'), ('asymptotic_bandwidth', 'bandwidth_mbs')]:
+        frame = history[COMBINATION + ['time']].copy()
+        frame['metric'] = name
+        frame['size'] = np.nan
+        frame['value'] = history[column].to_numpy()
+        frame['job_completion_time'] = history['time'].map(lambda time: time.isoformat())
+        frames.append(frame)
+    return pd.concat(frames, ignore_index=True)
+
+
+def format_models(latest, model):
+    lines = [f"{'combination':<58} {'alpha (us)':>10} {'BW (MB/s)':>10} {'R^2':>6} "
+             f"{'rel.err':>7} {'runs':>5}"]
+    for fit in latest.itertuples():
+        name = f"{fit.cluster}/{fit.binary_source}/{fit.placement_type}/{fit.benchmark}"
+        lines.append(f"{name:<58} {fit.alpha_us:>10.3f} {fit.bandwidth_mbs:>10.0f} {fit.r2:>6.3f} "
+                     f"{fit.rms_rel_error:>7.1%} {fit.runs:>5}")
+    if not model.empty:
+        lines.append("\nLogGP (L and o together):")
+        for fit in model.itertuples():
+            lines.append(f"  {fit.cluster}/{fit.binary_source}/{fit.placement_type}: "
+                         f"L+2o={fit.L_2o_us:.3f} us, g={fit.g_us:.3f} us, "
+                         f"G={fit.G_us_per_byte:.3g} us/B ({fit.G_bandwidth_mbs:.0f} MB/s)")
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    from results_store import ResultsStore
+
+    parser = argparse.ArgumentParser(description="Fit Hockney and LogGP models to the sweeps")
+    parser.add_argument('--store', default=None, help="results store directory")
+    parser.add_argument('--cluster', action='append', default=None, help="only these clusters")
+    parser.add_argument('--min-size', type=int, default=None, help="smallest message size fitted")
+    parser.add_argument('--max-size', type=int, default=None, help="largest message size fitted")
+    parser.add_argument('--csv', default=None, help="write the per-run fits to this file")
+    args = parser.parse_args(argv)
+
+    sweeps = ResultsStore(args.store).read_sweeps(args.cluster)
+    history = fit_history(sweeps, args.min_size, args.max_size)
+    if history.empty:
+        print("No sweep results to fit; run the tests with -S sweep_range=1:4194304")
+        return 1
+    latest = latest_models(history)
+    print(format_models(latest, loggp(sweeps, latest)))
+    print("\nChanges of the fitted parameters over time:")
+    print(format_report(change_report(parameter_series(history))))
+    if args.csv:
+        history.to_csv(args.csv, index=False)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
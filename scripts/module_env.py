@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+"""Cached environment snapshots of module loads
+
+Loading a binary source's modules (Lmod with the EESSI or EasyBuild
+hierarchies) takes seconds per `module load`, and every test used to repeat
+it in its prerun.  A snapshot loads the modules once in a bash login shell
+(where `module` is defined as in job scripts) and records what the loads
+changed: the entries added to or removed from PATH-like lists (PATH,
+LD_LIBRARY_PATH, MODULEPATH, LOADEDMODULES, ...) and the other variables
+set (EBROOT*, Lmod's own state, ...) or unset.  Later users apply that
+delta to their own environment, so entries of the caller that the login
+shell lacks are kept: python callers with apply_snapshot(), job scripts
+with
+
+    eval "$(python3 module_env.py exports --source eessi)"
+
+Snapshots are cached per cluster, keyed by the module commands, $MODULEPATH
+and the timestamps of the user's and the system's Lmod spider caches, so a
+rebuilt module tree gives a new key instead of a stale environment.
+
+For testing without Lmod, --init sources a file first, e.g. one defining a
+fake `module` shell function:
+    module() { [ "$1" = load ] && export EBROOTFAKE=/opt/fake/$2; }
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import shlex
+import subprocess
+import sys
+
+from atomic_io import write_atomic_json
+from topology import cluster_name
+
+MODULE_SNAPSHOT_DIR = os.environ.get(
+    'MODULE_SNAPSHOT_CACHE', os.path.expanduser('~/hpc-project/cache/module-env'))
+SNAPSHOT_VERSION = 2
+
+# Lmod rewrites these when its spider cache is rebuilt; extra timestamp
+# files can be listed in LMOD_SPIDER_TIMESTAMP (colon separated)
+SPIDER_CACHE_PATHS = [
+    os.path.expanduser('~/.cache/lmod'),
+    os.path.expanduser('~/.lmod.d/.cache'),
+]
+# Lmod configuration files naming the system spider cache directories and
+# their timestamp files (scDescriptT); LMOD_RC and $LMOD_PKG/init/lmodrc.lua
+# are looked at as well
+LMODRC_PATHS = ['/etc/lmodrc.lua', '/etc/lmod/lmodrc.lua']
+_LMODRC_ENTRY = re.compile(r'\b(?:dir|timestamp)\s*=\s*"([^"]+)"')
+
+# Colon-separated lists besides the variables ending in PATH
+LIST_VARS = {'LOADEDMODULES', '_LMFILES_'}
+
+# Shell bookkeeping that differs between any two shells
+VOLATILE_VARS = {'_', 'SHLVL', 'PWD', 'OLDPWD'}
+
+_SPLIT = '__MODULE_ENV_SPLIT__'
+
+# The `|| echo "Warning: ..."` fallbacks of MODULE_CONFIGS keep job scripts
+# going after a failed load; a snapshot must not record that as success
+_FALLBACK = re.compile(r'\s*\|\|\s*echo\b.*$')
+
+
+def system_spider_cache_paths():
+    """Lmod rc files and the system spider cache paths they name"""
+    rc_paths = [path for path in os.environ.get('LMOD_RC', '').split(':') if path]
+    if os.environ.get('LMOD_PKG'):
+        rc_paths.append(os.path.join(os.environ['LMOD_PKG'], 'init', 'lmodrc.lua'))
+    paths = []
+    for rc_path in rc_paths + LMODRC_PATHS:
+        try:
+            with open(rc_path) as f:
+                paths += [rc_path, *_LMODRC_ENTRY.findall(f.read())]
+        except OSError:
+            pass
+    return paths
+
+
+def spider_cache_stamp():
+    """Newest mtime (ns) among the user and system Lmod spider cache files, or 0"""
+    paths = SPIDER_CACHE_PATHS + system_spider_cache_paths() + [
+        path for path in os.environ.get('LMOD_SPIDER_TIMESTAMP', '').split(':') if path]
+    stamps = [0]
+    for path in paths:
+        try:
+            stamps.append(os.stat(path).st_mtime_ns)
+        except OSError:
+            pass
+    return max(stamps)
+
+
+def snapshot_key(commands, init=None):
+    """Key for a module command list under the current module tree"""
+    text = '\n'.join([str(SNAPSHOT_VERSION), os.environ.get('MODULEPATH', ''),
+                      str(spider_cache_stamp()), init or '', *commands])
+    return hashlib.sha1(text.encode()).hexdigest()[:16]
+
+
+def snapshot_path(commands, init=None, cluster=None, snapshot_dir=None):
+    snapshot_dir = snapshot_dir or MODULE_SNAPSHOT_DIR
+    return os.path.join(snapshot_dir,
+                        f"{cluster or cluster_name()}-{snapshot_key(commands, init)}.json")
+
+
+def _parse_env(text):
+    return dict(item.split('=', 1) for item in text.split('\0') if '=' in item)
+
+
+def is_list_var(name):
+    return name.endswith('PATH') or name in LIST_VARS
+
+
+def _split_list(value):
+    return value.split(':') if value else []
+
+
+def path_delta(before, after):
+    """Entries a module load prepended, appended and removed in a list variable"""
+    old, new = _split_list(before), _split_list(after)
+    kept = [i for i, entry in enumerate(new) if entry in old]
+    last_kept = kept[-1] if kept else len(new)
+    added = [(i, entry) for i, entry in enumerate(new) if entry not in old]
+    return {
+        'prepend': [entry for i, entry in added if i < last_kept],
+        'append': [entry for i, entry in added if i > last_kept],
+        'remove': [entry for entry in old if entry not in new],
+    }
+
+
+def apply_path_delta(value, delta):
+    """A list variable's value with a path_delta() applied"""
+    moved = set(delta['prepend'] + delta['append'] + delta['remove'])
+    entries = [entry for entry in _split_list(value) if entry not in moved]
+    return ':'.join(delta['prepend'] + entries + delta['append'])
+
+
+def strict_command(command):
+    """A module command without its `|| echo ...` fallback"""
+    return _FALLBACK.sub('', command)
+
+
+def capture_snapshot(commands, init=None):
+    """Run the commands once and return what they changed in the environment
+
+    {'paths': {name: path_delta()}, 'set': {...}, 'unset': [...]}; list
+    variables are recorded as deltas, every other changed variable whole.
+    The commands run without their `|| echo` fallbacks, and the first one
+    that fails aborts the capture with a RuntimeError.
+    """
+    prologue = f'source {shlex.quote(init)}' if init else ':'
+    checked = [f'{strict_command(command)} || '
+               f'{{ echo {shlex.quote(f"Failed: {command}")}; exit 1; }}'
+               for command in commands]
+    script = '\n'.join([
+        prologue,
+        'env -0',
+        f'printf "\\0{_SPLIT}\\0"',
+        '{', *checked, '} >&2',
+        'env -0',
+    ])
+    # A login shell so that the module command is set up as in job scripts
+    result = subprocess.run(['bash', '-l', '-c', script], stdout=subprocess.PIPE,
+                            stderr=subprocess.PIPE)
+    output = result.stdout.decode(errors='replace')
+    if result.returncode != 0 or f'\0{_SPLIT}\0' not in output:
+        raise RuntimeError(f"module commands failed (exit code {result.returncode}):\n"
+                           f"{result.stderr.decode(errors='replace')}")
+    before_text, after_text = output.split(f'\0{_SPLIT}\0', 1)
+    before, after = _parse_env(before_text), _parse_env(after_text)
+    changed = {name: value for name, value in after.items()
+               if name not in VOLATILE_VARS and before.get(name) != value}
+    return {
+        'version': SNAPSHOT_VERSION,
+        'commands': list(commands),
+        'paths': {name: path_delta(before.get(name), value)
+                  for name, value in changed.items() if is_list_var(name)},
+        'set': {name: value for name, value in changed.items() if not is_list_var(name)},
+        'unset': sorted(name for name in before
+                        if name not in after and name not in VOLATILE_VARS),
+    }
+
+
+def load_snapshot(commands, init=None, cluster=None, snapshot_dir=None):
+    """Cached snapshot for the commands, capturing it on first use
+
+    A failed capture raises and stores nothing, so the next call retries.
+    """
+    path = snapshot_path(commands, init, cluster, snapshot_dir)
+    try:
+        with open(path) as f:
+            snapshot = json.load(f)
+        if snapshot.get('version') == SNAPSHOT_VERSION:
+            return snapshot
+    except (OSError, ValueError):
+        pass
+
+    snapshot = capture_snapshot(commands, init)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    write_atomic_json(path, snapshot)
+    return snapshot
+
+
+def apply_snapshot(snapshot, env=None):
+    """Apply a snapshot to env (default: os.environ) and return it
+
+    List variables keep the caller's own entries; the snapshot's additions
+    and removals are applied to them.
+    """
+    env = os.environ if env is None else env
+    for name in snapshot['unset']:
+        env.pop(name, None)
+    for name, delta in snapshot['paths'].items():
+        env[name] = apply_path_delta(env.get(name), delta)
+    env.update(snapshot['set'])
+    return env
+
+
+def shell_exports(snapshot, env=None):
+    """Shell lines applying the snapshot to env (default: os.environ), for eval in job scripts"""
+    applied = apply_snapshot(snapshot, dict(os.environ if env is None else env))
+    lines = [f'unset {name}' for name in snapshot['unset']]
+    lines += [f'export {name}={shlex.quote(applied[name])}'
+              for name in sorted({*snapshot['paths'], *snapshot['set']}) if name.isidentifier()]
+    return lines
+
+
+def source_commands(source):
+    """Module commands of a binary source, from MODULE_CONFIGS in tests/config.py"""
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tests'))
+    from config import MODULE_CONFIGS
+    return MODULE_CONFIGS[source]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Capture or apply module environment snapshots")
+    parser.add_argument('action', choices=['snapshot', 'exports'],
+                        help="snapshot: print the cache file; exports: print shell lines to eval")
+    parser.add_argument('--source', required=True, help="binary source: local, easybuild or eessi")
+    parser.add_argument('--init', default=None, help="file sourced before the module commands")
+    parser.add_argument('--cluster', default=None)
+    args = parser.parse_args(argv)
+
+    commands = source_commands(args.source)
+    try:
+        snapshot = load_snapshot(commands, args.init, args.cluster)
+    except RuntimeError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+
+    if args.action == 'snapshot':
+        print(snapshot_path(commands, args.init, args.cluster))
+    else:
+        print('\n'.join(shell_exports(snapshot)))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""Index of installed OSU benchmark binaries
+
+Maps benchmark name -> absolute path for one binary source, OSU version
+and toolchain, so tests resolve executables without searching the file
+system at job time (a `find /opt` on a CVMFS-backed /opt can take minutes).
+
+The index is built once from the installation root, i.e. the module's
+$EBROOTOSUMINMICROMINBENCHMARKS, by listing the family directories under
+libexec/osu-micro-benchmarks/mpi.  It records the inode and mtime of each
+family directory; if any of them changes (reinstall, new module version
+behind the same name) the index is stale and rebuilt from the root.
+
+Usage:
+    osu_index.py build --source eessi --version 7.2 --toolchain gompi-2023b --root $EBROOT...
+    osu_index.py resolve --source eessi --version 7.2 --toolchain gompi-2023b osu_get_latency
+"""
+import argparse
+import json
+import os
+import sys
+
+from atomic_io import write_atomic_json
+from topology import cluster_name
+
+OSU_INDEX_DIR = os.environ.get(
+    'OSU_INDEX_CACHE', os.path.expanduser('~/hpc-project/cache/osu-index'))
+INDEX_VERSION = 1
+MPI_SUBDIR = 'libexec/osu-micro-benchmarks/mpi'
+
+
+def index_path(source, version, toolchain, cluster=None, index_dir=None):
+    """One index per cluster (EESSI picks a CPU-specific tree), source, version and toolchain"""
+    index_dir = index_dir or OSU_INDEX_DIR
+    return os.path.join(index_dir, f"{cluster or cluster_name()}-{source}-{version}-{toolchain}.json")
+
+
+def _stamp(path):
+    st = os.stat(path)
+    return [st.st_ino, st.st_mtime_ns]
+
+
+def build_index(root):
+    """Scan an installation root once: {'binaries': {name: path}, 'stamps': ...}"""
+    mpi_dir = os.path.join(os.path.realpath(root), MPI_SUBDIR)
+    binaries = {}
+    stamps = {}
+    for family in sorted(os.scandir(mpi_dir), key=lambda entry: entry.name):
+        if not family.is_dir():
+            continue
+        stamps[family.path] = _stamp(family.path)
+        for entry in os.scandir(family.path):
+            if entry.is_file() and os.access(entry.path, os.X_OK):
+                binaries[entry.name] = entry.path
+    return {'version': INDEX_VERSION, 'root': root, 'binaries': binaries, 'stamps': stamps}
+
+
+def is_valid(index):
+    """True if no indexed family directory changed since the index was built"""
+    if index.get('version') != INDEX_VERSION or not index.get('stamps'):
+        return False
+    try:
+        return all(_stamp(path) == stamp for path, stamp in index['stamps'].items())
+    except OSError:
+        return False
+
+
+def load_index(source, version, toolchain, cluster=None, index_dir=None):
+    """The stored index if it is still valid, else None"""
+    try:
+        with open(index_path(source, version, toolchain, cluster, index_dir)) as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return index if is_valid(index) else None
+
+
+def save_index(index, source, version, toolchain, cluster=None, index_dir=None):
+    path = index_path(source, version, toolchain, cluster, index_dir)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    write_atomic_json(path, index)
+    return path
+
+
+def resolve_binary(benchmark, source, version, toolchain, root=None, cluster=None, index_dir=None):
+    """Absolute path of a benchmark, or None
+
+    Uses the stored index; a missing or stale one is rebuilt from `root`
+    when it is known (e.g. from the loaded module), never by searching.
+    """
+    index = load_index(source, version, toolchain, cluster, index_dir)
+    if index is None and root and os.path.isdir(os.path.join(root, MPI_SUBDIR)):
+        index = build_index(root)
+        save_index(index, source, version, toolchain, cluster, index_dir)
+    if index is None:
+        return None
+    return index['binaries'].get(benchmark)
+
+
+def indexed_root(source, version, toolchain, cluster=None, index_dir=None):
+    """Installation root recorded in a valid index, or None"""
+    index = load_index(source, version, toolchain, cluster, index_dir)
+    return index['root'] if index else None
+
+
+def build_id(source, version, toolchain, cluster=None, index_dir=None):
+    """Name of the installation a result comes from
+
+    The indexed root's directory name, which for local builds includes the
+    build cache key; version-toolchain when nothing is indexed.
+    """
+    root = indexed_root(source, version, toolchain, cluster, index_dir)
+    return os.path.basename(os.path.normpath(root)) if root else f"{version}-{toolchain}"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build or query the OSU binary index")
+    parser.add_argument('action', choices=['build', 'resolve'])
+    parser.add_argument('benchmark', nargs='?', help="benchmark to resolve, e.g. osu_get_latency")
+    parser.add_argument('--source', required=True, help="binary source: local, easybuild or eessi")
+    parser.add_argument('--version', required=True, help="OSU version, e.g. 7.2")
+    parser.add_argument('--toolchain', required=True, help="toolchain, e.g. gompi-2023b")
+    parser.add_argument('--root', default=os.environ.get('EBROOTOSUMINMICROMINBENCHMARKS'),
+                        help="installation root (default: $EBROOTOSUMINMICROMINBENCHMARKS)")
+    parser.add_argument('--cluster', default=None)
+    args = parser.parse_intermixed_args(argv)
+
+    if args.action == 'build':
+        if not args.root:
+            parser.error("--root is required to build an index")
+        index = build_index(args.root)
+        path = save_index(index, args.source, args.version, args.toolchain, args.cluster)
+        print(f"Indexed {len(index['binaries'])} OSU binaries from {args.root} in {path}")
+        return 0
+
+    if not args.benchmark:
+        parser.error("resolve needs a benchmark name")
+    path = resolve_binary(args.benchmark, args.source, args.version, args.toolchain,
+                          args.root, args.cluster)
+    if path is None:
+        print(f"{args.benchmark} not indexed for {args.source} {args.version} {args.toolchain}",
+              file=sys.stderr)
+        return 1
+    print(path)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""Reference values calibrated from the result history
+
+`references.py calibrate` derives a reference for every (system,
+benchmark, binary source, placement) from its last --window good runs in
+the results store (results_store.py): the median as the reference value
+and bounds of +-(--mad-scale x 1.4826 x MAD / median), never tighter than
+--min-tolerance.  Only runs of the latest configuration (config_hash of
+resume.py: OSU build, message sizes, iterations, ...) count, so a change
+of build or settings starts a new history instead of blending into the
+old one.  Each calibration is written as a new version,
+
+    <reference dir>/references-v<NNNN>.json
+
+with its parameters, the run count and configuration behind every value
+and a flat index
+"<system>/<benchmark>/<source>/<placement>" -> (value, lower, upper, unit)
+in the format of config.REFERENCE_VALUES.  Tests look references up in
+the latest version (or a pinned one) with lookup_reference(), which loads
+a version once per process into a dict; anything not calibrated falls
+back to the static tables in tests/config.py.
+
+Usage:
+    references.py calibrate [--window 20] [--mad-scale 3] [--min-tolerance 0.02]
+    references.py show [--version N]
+"""
+import argparse
+import datetime
+import glob
+import json
+import os
+import re
+import sys
+
+from atomic_io import write_atomic_json
+
+REFERENCE_DIR = os.environ.get(
+    'REFERENCE_DIR', os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                   '..', 'tests', 'references')))
+KEY = ['cluster', 'benchmark', 'binary_source', 'placement_type']
+
+DEFAULT_WINDOW = 20
+DEFAULT_MAD_SCALE = 3.0
+DEFAULT_MIN_TOLERANCE = 0.02
+DEFAULT_MIN_RUNS = 5
+
+_index_cache = {}
+
+
+def reference_key(system, benchmark, source, placement):
+    return f"{system}/{benchmark}/{source}/{placement}"
+
+
+def reference_path(version, reference_dir=None):
+    return os.path.join(reference_dir or REFERENCE_DIR, f"references-v{version:04d}.json")
+
+
+def versions(reference_dir=None):
+    """Calibrated versions present, oldest first"""
+    pattern = os.path.join(glob.escape(reference_dir or REFERENCE_DIR), 'references-v*.json')
+    found = (re.search(r'references-v(\d+)\.json$', path) for path in glob.glob(pattern))
+    return sorted(int(match.group(1)) for match in found if match)
+
+
+def calibrate(df, window=DEFAULT_WINDOW, mad_scale=DEFAULT_MAD_SCALE,
+              min_tolerance=DEFAULT_MIN_TOLERANCE, min_runs=DEFAULT_MIN_RUNS, include_failed=False):
+    """Reference per KEY from the last `window` runs of its latest configuration:
+    DataFrame with KEY columns, value, lower, upper, unit, runs, last_run and config_hash"""
+    # Only calibration needs pandas; tests just look references up
+    import pandas as pd
+
+    df = df.dropna(subset=['value', 'benchmark']).copy()
+    if not include_failed:
+        df = df[df['result'] == 'pass']
+    df['time'] = pd.to_datetime(df['job_completion_time'], utc=True, format='ISO8601', errors='coerce')
+    df = df.sort_values('time', kind='stable')
+    df['config_hash'] = df['config_hash'].astype(object).fillna('')
+    latest = df.groupby(KEY, observed=True)['config_hash'].transform('last')
+    df = df[df['config_hash'] == latest]
+    recent = df.groupby(KEY, observed=True).tail(window).copy()
+
+    groups = recent.groupby(KEY, observed=True)
+    recent['deviation'] = (recent['value'] - groups['value'].transform('median')).abs()
+    groups = recent.groupby(KEY, observed=True)
+    refs = groups.agg(value=('value', 'median'), mad=('deviation', 'median'),
+                      runs=('value', 'size'), unit=('unit', 'last'), last_run=('time', 'max'),
+                      config_hash=('config_hash', 'last'))
+    refs = refs[refs['runs'] >= min_runs].reset_index()
+
+    tolerance = (mad_scale * 1.4826 * refs['mad'] / refs['value'].abs()).clip(lower=min_tolerance)
+    # ReFrame accepts no lower bound below -100% for a positive reference
+    refs['lower'] = -tolerance.clip(upper=1.0).round(3)
+    refs['upper'] = tolerance.round(3)
+    refs['value'] = refs['value'].map(lambda value: float(f'{value:.4g}'))
+    return refs.drop(columns='mad')
+
+
+def write_version(refs, parameters, reference_dir=None):
+    """Write the references as the next version; returns its path"""
+    reference_dir = reference_dir or REFERENCE_DIR
+    existing = versions(reference_dir)
+    version = existing[-1] + 1 if existing else 1
+    references = {}
+    runs = {}
+    for ref in refs.itertuples():
+        key = reference_key(ref.cluster, ref.benchmark, ref.binary_source, ref.placement_type)
+        references[key] = [ref.value, ref.lower, ref.upper, ref.unit]
+        runs[key] = {'runs': int(ref.runs), 'last_run': ref.last_run.isoformat(),
+                     'config_hash': ref.config_hash}
+    os.makedirs(reference_dir, exist_ok=True)
+    path = reference_path(version, reference_dir)
+    write_atomic_json(path, {
+        'version': version,
+        'created': datetime.datetime.now().astimezone().isoformat(timespec='seconds'),
+        'parameters': parameters,
+        'references': references,
+        'runs': runs,
+    })
+    return path
+
+
+def load_references(version=None, reference_dir=None):
+    """Index of one version (default: the latest): key -> (value, lower, upper, unit)
+
+    Parsed once per file and process, and the latest version is resolved
+    once per process; {} when nothing is calibrated.
+    """
+    if version is None:
+        latest = ('latest', reference_dir or REFERENCE_DIR)
+        if latest not in _index_cache:
+            existing = versions(reference_dir)
+            _index_cache[latest] = load_references(existing[-1], reference_dir) if existing else {}
+        return _index_cache[latest]
+    path = reference_path(version, reference_dir)
+    if path not in _index_cache:
+        try:
+            with open(path) as f:
+                references = json.load(f)['references']
+        except (OSError, ValueError, KeyError):
+            references = {}
+        _index_cache[path] = {key: tuple(ref) for key, ref in references.items()}
+    return _index_cache[path]
+
+
+def placement_references(refs, placement, aliases=None):
+    """Entry of a per-placement reference table for `placement`
+
+    Classes without an entry of their own fall back to their alias in
+    `aliases` (config.PLACEMENT_REFERENCE_ALIASES), then to 'default'.
+    """
+    for key in [placement, (aliases or {}).get(placement), 'default']:
+        if key in refs:
+            return refs[key]
+    return None
+
+
+def lookup_reference(system, benchmark, source, placement, version=None, reference_dir=None):
+    """Calibrated (value, lower, upper, unit) or None; version 0 disables calibration"""
+    if version == 0:
+        return None
+    references = load_references(version, reference_dir)
+    return references.get(reference_key(system, benchmark, source, placement))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Calibrate reference values from the result history")
+    parser.add_argument('action', choices=['calibrate', 'show'])
+    parser.add_argument('--store', default=None, help="results store directory")
+    parser.add_argument('--reference-dir', default=None, help=f"default: {REFERENCE_DIR}")
+    parser.add_argument('--window', type=int, default=DEFAULT_WINDOW,
+                        help="last good runs per reference (default: %(default)s)")
+    parser.add_argument('--mad-scale', type=float, default=DEFAULT_MAD_SCALE,
+                        help="bounds in robust standard deviations (default: %(default)s)")
+    parser.add_argument('--min-tolerance', type=float, default=DEFAULT_MIN_TOLERANCE,
+                        help="narrowest relative bound (default: %(default)s)")
+    parser.add_argument('--min-runs', type=int, default=DEFAULT_MIN_RUNS,
+                        help="fewest runs to calibrate a reference (default: %(default)s)")
+    parser.add_argument('--include-failed', action='store_true',
+                        help="also use runs that failed their current reference")
+    parser.add_argument('--version', type=int, default=None, help="version to show (default: latest)")
+    args = parser.parse_args(argv)
+
+    if args.action == 'show':
+        references = load_references(args.version, args.reference_dir)
+        if not references:
+            print("No calibrated references")
+            return 1
+        for key, ref in sorted(references.items()):
+            print(f"{key}: {ref}")
+        return 0
+
+    from results_store import ResultsStore
+    refs = calibrate(ResultsStore(args.store).read(), args.window, args.mad_scale,
+                     args.min_tolerance, args.min_runs, args.include_failed)
+    if refs.empty:
+        print("Not enough good runs to calibrate any reference")
+        return 1
+
+    previous = load_references(reference_dir=args.reference_dir)
+    parameters = {name: getattr(args, name) for name in
+                  ['window', 'mad_scale', 'min_tolerance', 'min_runs', 'include_failed']}
+    path = write_version(refs, parameters, args.reference_dir)
+    for ref in refs.itertuples():
+        key = reference_key(ref.cluster, ref.benchmark, ref.binary_source, ref.placement_type)
+        old = previous.get(key)
+        change = f"{old[0]} -> {ref.value}" if old else f"new {ref.value}"
+        print(f"{key}: {change} {ref.unit} ({ref.lower:+.3f}/{ref.upper:+.3f}, {ref.runs} runs)")
+    print(f"{len(refs)} references written to {path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
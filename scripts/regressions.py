@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""Change-point detection over the result history
+
+Splits the results store into one series per (cluster, binary source,
+placement, benchmark, message size), each run contributing its median
+value, and looks for the most significant step change in every series.
+For each possible split point k of a series x_1..x_n, the two-sample
+statistic
+
+    t_k = |mean(x_k+1..x_n) - mean(x_1..x_k)| / (sigma * sqrt(1/k + 1/(n-k)))
+
+compares the means before and after, where sigma is a robust estimate of
+the run-to-run noise (MAD of successive differences, which a single step
+barely moves).  The split with the largest t_k is the change point.  All
+series are padded into one matrix and scanned at once with cumulative
+sums, so the cost is a few array passes regardless of the number of
+series.
+
+The largest of n - 2 * min_segment + 1 statistics easily exceeds a fixed
+bar on pure noise, more so in short histories, so --threshold and
+--min-change only pick the candidates.  Each candidate gets a permutation
+p-value: the share of its shuffled histories whose own largest t_k
+reaches the observed one, which accounts for its length and for every
+split scanned.  The p-values are Bonferroni-corrected over all series
+scanned, and only changes with a corrected p-value below --alpha are
+reported.
+
+The report is ranked with regressions (bandwidth drops, latency rises)
+first, by statistic, and gives the onset: the first run after the step.
+
+Usage:
+    regressions.py [--store DIR] [--threshold 5] [--min-change 0.05] [--alpha 0.05] [--top 20]
+"""
+import argparse
+import sys
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from results_store import ResultsStore
+
+SERIES = ['cluster', 'binary_source', 'placement_type', 'benchmark', 'size', 'metric']
+# Direction of a regression: bandwidth going down, latency going up (also
+# for the fitted model parameters of models.py)
+HIGHER_IS_BETTER = {'bandwidth': True, 'latency': False,
+                    'asymptotic_bandwidth': True, 'startup_latency': False}
+
+DEFAULT_THRESHOLD = 5.0
+DEFAULT_MIN_CHANGE = 0.05
+DEFAULT_ALPHA = 0.05
+# Fewest shuffles per candidate; more are drawn when the number of series
+# scanned needs a smaller p-value than 1 / (permutations + 1)
+DEFAULT_PERMUTATIONS = 1000
+DEFAULT_SEED = 0
+# Matrix cells per block of shuffled histories
+PERMUTATION_BLOCK = 2_000_000
+# Fewest runs on either side of a change point
+MIN_SEGMENT = 3
+
+
+def series_matrix(df):
+    """Pad the per-run history of every series into one matrix
+
+    Returns (keys, values, times, lengths): one row of `keys` per series,
+    values/times of shape (series, longest history) padded with NaN/NaT,
+    and the number of runs of each series.
+    """
+    df = df.dropna(subset=['value']).copy()
+    df['time'] = pd.to_datetime(df['job_completion_time'], utc=True, format='ISO8601', errors='coerce')
+    df = df.dropna(subset=['time'])
+    # Repeated records of one run (trials, reruns) count as one point
+    runs = (df.groupby(SERIES + ['time'], observed=True, dropna=False)['value']
+            .median().reset_index().sort_values(SERIES + ['time'], kind='stable'))
+    groups = runs.groupby(SERIES, observed=True, dropna=False, sort=False)
+    row = groups.ngroup().to_numpy()
+    position = groups.cumcount().to_numpy()
+
+    keys = groups.size().reset_index(name='runs')
+    lengths = keys['runs'].to_numpy()
+    shape = (len(keys), int(lengths.max()) if len(keys) else 0)
+    values = np.full(shape, np.nan)
+    values[row, position] = runs['value'].to_numpy()
+    times = np.full(shape, np.datetime64('NaT'), dtype='datetime64[ns]')
+    times[row, position] = runs['time'].dt.tz_localize(None).to_numpy()
+    return keys, values, times, lengths
+
+
+def detect_change_points(values, lengths, min_segment=MIN_SEGMENT):
+    """Most significant mean shift of every row of a NaN-padded matrix
+
+    Returns (split, statistic, before, after) per row: the number of points
+    before the change, t_k at that split, and the means on either side.
+    Rows too short for two segments of min_segment points get -inf.
+    """
+    n_series, width = values.shape
+    rows = np.arange(n_series)
+    k = np.arange(1, width + 1)[None, :]
+    n = lengths[:, None]
+
+    csum = np.cumsum(np.nan_to_num(values), axis=1)
+    total = csum[rows, lengths - 1][:, None]
+    with np.errstate(divide='ignore', invalid='ignore'), warnings.catch_warnings():
+        # All-NaN rows (single-run series) have no noise estimate
+        warnings.simplefilter('ignore', RuntimeWarning)
+        before = csum / k
+        after = (total - csum) / (n - k)
+        diffs = np.diff(values, axis=1)
+        mad = np.nanmedian(np.abs(diffs - np.nanmedian(diffs, axis=1, keepdims=True)), axis=1)
+        sigma = 1.4826 * mad / np.sqrt(2)
+        # Perfectly flat history: measure steps against 0.1% of the level
+        sigma = np.fmax(sigma, 1e-3 * np.abs(np.nanmedian(values, axis=1)))
+        statistic = np.abs(after - before) / (sigma[:, None] * np.sqrt(1 / k + 1 / (n - k)))
+
+    valid = (k >= min_segment) & (n - k >= min_segment) & np.isfinite(statistic)
+    statistic = np.where(valid, statistic, -np.inf)
+    best = np.argmax(statistic, axis=1)
+    return best + 1, statistic[rows, best], before[rows, best], after[rows, best]
+
+
+def permutation_p_values(values, lengths, statistic, min_segment=MIN_SEGMENT,
+                         n_perm=DEFAULT_PERMUTATIONS, seed=DEFAULT_SEED):
+    """Permutation p-value of the largest t_k of every row
+
+    Each row is shuffled n_perm times (its padding stays at the end) and
+    scanned again; the p-value is (1 + shuffles reaching `statistic`) /
+    (n_perm + 1).  Shuffles are processed in blocks of rows.
+    """
+    n_series, width = values.shape
+    if not n_series:
+        return np.empty(0)
+    rng = np.random.default_rng(seed)
+    reached = np.zeros(n_series)
+    block = max(1, PERMUTATION_BLOCK // max(n_series * width, 1))
+    padding = np.arange(width)[None, :] >= lengths[:, None]
+    done = 0
+    while done < n_perm:
+        count = min(block, n_perm - done)
+        # Random keys, padding last: argsort gives a shuffle of every row
+        keys = rng.random((count, n_series, width))
+        keys[:, padding] = 2.0
+        order = np.argsort(keys, axis=2).reshape(count * n_series, width)
+        shuffled = np.take_along_axis(np.tile(values, (count, 1)), order, axis=1)
+        _, null, _, _ = detect_change_points(shuffled, np.tile(lengths, count), min_segment)
+        reached += (null.reshape(count, n_series) >= statistic[None, :]).sum(axis=0)
+        done += count
+    return (1 + reached) / (n_perm + 1)
+
+
+def change_report(df, threshold=DEFAULT_THRESHOLD, min_change=DEFAULT_MIN_CHANGE,
+                  min_segment=MIN_SEGMENT, alpha=DEFAULT_ALPHA,
+                  n_perm=DEFAULT_PERMUTATIONS, seed=DEFAULT_SEED):
+    """Ranked significant step changes of all series of a results DataFrame"""
+    keys, values, times, lengths = series_matrix(df)
+    if keys.empty:
+        return keys.assign(onset=[], before=[], after=[], change=[], statistic=[],
+                           p_value=[], adjusted_p=[], regression=[])
+    split, statistic, before, after = detect_change_points(values, lengths, min_segment)
+
+    report = keys.copy()
+    report['onset'] = times[np.arange(len(keys)), np.minimum(split, values.shape[1] - 1)]
+    report['before'] = before
+    report['after'] = after
+    report['change'] = (after - before) / np.abs(before)
+    report['statistic'] = statistic
+    higher_is_better = report['metric'].astype(str).map(HIGHER_IS_BETTER).fillna(True).astype(bool)
+    report['regression'] = np.where(higher_is_better, after < before, after > before)
+
+    # Bonferroni over every series long enough to be scanned, with enough
+    # shuffles that a clear step gets well below the corrected bar
+    scanned = int(np.isfinite(statistic).sum())
+    n_perm = max(n_perm, int(np.ceil(4 * scanned / alpha)))
+    candidates = np.flatnonzero((statistic >= threshold) & (np.abs(report['change']) >= min_change))
+    report['p_value'] = np.nan
+    report.loc[candidates, 'p_value'] = permutation_p_values(
+        values[candidates], lengths[candidates], statistic[candidates], min_segment, n_perm, seed)
+    report['adjusted_p'] = np.minimum(report['p_value'] * scanned, 1.0)
+
+    report = report[report['adjusted_p'] <= alpha]
+    return report.sort_values(['regression', 'statistic'], ascending=[False, False],
+                              ignore_index=True)
+
+
+def format_report(report, top=None):
+    if report.empty:
+        return "No step changes detected"
+    shown = report.head(top) if top else report
+    lines = [f"{len(report)} step changes ({int(report['regression'].sum())} regressions)"]
+    for change in shown.itertuples():
+        kind = 'REGRESSION' if change.regression else 'improvement'
+        size = f"@{change.size}" if pd.notna(change.size) else ''
+        lines.append(
+            f"  {kind:<11} {change.cluster}/{change.binary_source}/{change.placement_type}/"
+            f"{change.benchmark}{size}: {change.before:.4g} -> {change.after:.4g} "
+            f"{change.metric} ({change.change:+.1%}) "
+            f"since {pd.Timestamp(change.onset):%Y-%m-%d %H:%M} UTC, "
+            f"t={change.statistic:.1f}, adjusted p={change.adjusted_p:.2g}, {change.runs} runs")
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Detect step changes in the result history")
+    parser.add_argument('--store', default=None, help="results store directory")
+    parser.add_argument('--cluster', action='append', default=None, help="only these clusters")
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help="minimum t statistic of a candidate (default: %(default)s)")
+    parser.add_argument('--min-change', type=float, default=DEFAULT_MIN_CHANGE,
+                        help="minimum relative change (default: %(default)s)")
+    parser.add_argument('--alpha', type=float, default=DEFAULT_ALPHA,
+                        help="family-wise error rate over all series (default: %(default)s)")
+    parser.add_argument('--permutations', type=int, default=DEFAULT_PERMUTATIONS,
+                        help="fewest shuffles per candidate (default: %(default)s)")
+    parser.add_argument('--min-segment', type=int, default=MIN_SEGMENT,
+                        help="fewest runs on either side of a change (default: %(default)s)")
+    parser.add_argument('--top', type=int, default=20, help="changes to list (0: all)")
+    parser.add_argument('--csv', default=None, help="also write the full report to this file")
+    args = parser.parse_args(argv)
+
+    df = ResultsStore(args.store).read(args.cluster)
+    report = change_report(df, args.threshold, args.min_change, args.min_segment, args.alpha,
+                           args.permutations)
+    print(format_report(report, args.top))
+    if args.csv:
+        report.to_csv(args.csv, index=False)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,162 @@
+"""Parallel rendering of figures that skips unchanged ones
+
+Each figure is a FigureTask: a plotting function, the slice of the results
+it plots, its keyword parameters and its output file.  A task's key hashes
+the slice's contents, the parameters and the plotting code: the function's
+source, the source of the functions it calls and the module-level data it
+reads (label maps, orderings, colors, ...), so a figure is redrawn only
+when its data, its parameters or its code changed since the last render
+(or its file is gone).  Stale tasks run in a
+process pool on the Agg backend; the keys of successful renders are kept
+in a manifest, by default ~/hpc-project/cache/render/manifest.json.
+
+Plotting functions are called as func(data, output, **params), must save
+the figure to `output` themselves and must be importable by the workers,
+i.e. module-level functions.
+"""
+import hashlib
+import inspect
+import json
+import os
+import time
+import types
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+from atomic_io import write_atomic_json
+
+RENDER_CACHE_DIR = os.environ.get(
+    'RENDER_CACHE', os.path.expanduser('~/hpc-project/cache/render'))
+MANIFEST_VERSION = 1
+
+# Module-level values hashed into a task's key by their repr
+DATA_TYPES = (str, int, float, bool, type(None), tuple, list, dict, set, frozenset)
+
+FigureTask = namedtuple('FigureTask', ['func', 'data', 'output', 'params'])
+
+
+def data_digest(data):
+    """Hash of a DataFrame's columns, dtypes and values, in row order"""
+    h = hashlib.sha1()
+    h.update(json.dumps([[str(name), str(dtype)] for name, dtype in data.dtypes.items()]).encode())
+    h.update(pd.util.hash_pandas_object(data, index=False).values.tobytes())
+    return h.hexdigest()
+
+
+def _global_names(code):
+    """Global names read by a code object and the code nested in it (lambdas, ...)"""
+    names = set(code.co_names)
+    for const in code.co_consts:
+        if isinstance(const, types.CodeType):
+            names |= _global_names(const)
+    return names
+
+
+def code_digest(func, h=None, seen=None):
+    """Hash of a function's source, the functions it calls and the data it reads
+
+    Follows the global names of the function: functions are hashed
+    recursively, plain data (DATA_TYPES) by its repr; modules, classes and
+    other objects are left out.
+    """
+    h = h or hashlib.sha1()
+    seen = set() if seen is None else seen
+    if func in seen:
+        return h
+    seen.add(func)
+    try:
+        h.update(inspect.getsource(func).encode())
+    except (OSError, TypeError):
+        h.update(func.__code__.co_code)
+    for name in sorted(_global_names(func.__code__)):
+        if name not in func.__globals__:
+            continue
+        value = func.__globals__[name]
+        if inspect.isfunction(value):
+            code_digest(value, h, seen)
+        elif isinstance(value, DATA_TYPES):
+            h.update(f'{name}={value!r}'.encode())
+    return h
+
+
+def task_key(task):
+    h = hashlib.sha1()
+    h.update(data_digest(task.data).encode())
+    h.update(json.dumps(task.params, sort_keys=True, default=str).encode())
+    h.update(code_digest(task.func).hexdigest().encode())
+    return h.hexdigest()
+
+
+def _render(task):
+    # Each worker draws off-screen, whatever backend the parent chose
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    start = time.perf_counter()
+    try:
+        task.func(task.data, task.output, **task.params)
+    finally:
+        plt.close('all')
+    return time.perf_counter() - start
+
+
+class RenderCache:
+    """Manifest of the key each output was last rendered from"""
+
+    def __init__(self, cache_dir=None):
+        self.path = os.path.join(cache_dir or RENDER_CACHE_DIR, 'manifest.json')
+        try:
+            with open(self.path) as f:
+                manifest = json.load(f)
+            self.entries = manifest['entries'] if manifest.get('version') == MANIFEST_VERSION else {}
+        except (OSError, ValueError, KeyError):
+            self.entries = {}
+
+    def is_current(self, output, key):
+        entry = self.entries.get(os.path.abspath(output))
+        return bool(entry) and entry['key'] == key and os.path.exists(output)
+
+    def record(self, output, key):
+        self.entries[os.path.abspath(output)] = {
+            'key': key, 'rendered': time.strftime('%Y-%m-%dT%H:%M:%S%z')}
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        write_atomic_json(self.path, {'version': MANIFEST_VERSION, 'entries': self.entries})
+
+
+def render_all(tasks, jobs=None, force=False, cache_dir=None):
+    """Render the tasks whose key changed; returns (rendered, skipped, failed) outputs"""
+    cache = RenderCache(cache_dir)
+    stale = {}
+    skipped = []
+    for task in tasks:
+        key = task_key(task)
+        if not force and cache.is_current(task.output, key):
+            skipped.append(task.output)
+        else:
+            stale[task.output] = (task, key)
+
+    rendered, failed = [], []
+    if stale:
+        jobs = min(jobs or os.cpu_count() or 1, len(stale))
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            futures = {pool.submit(_render, task): output for output, (task, _) in stale.items()}
+            for future in as_completed(futures):
+                output = futures[future]
+                try:
+                    elapsed = future.result()
+                except Exception as e:
+                    print(f"Error rendering {output}: {e}")
+                    failed.append(output)
+                    continue
+                # An empty slice draws nothing and leaves no file to cache
+                if os.path.exists(output):
+                    cache.record(output, stale[output][1])
+                rendered.append(output)
+                print(f"Rendered {output} in {elapsed:.1f} s")
+        cache.save()
+    return rendered, skipped, failed
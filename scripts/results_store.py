@@ -0,0 +1,361 @@
+#!/usr/bin/env python3
+"""Incremental ingestion of perflogs into a columnar results store
+
+Perflogs only ever grow (or get moved aside by ReFrame when their header
+changes), so re-reading them whole on every analysis run gets slower with
+every nightly run.  The store remembers, per perflog, its inode, header and
+the byte offset up to which it was ingested, and parses only the records
+appended since.  New records are normalised to the analysis columns
+(result, system, binary_source, placement_type, metric, value, unit,
+cluster, ...) and written as one part file per ingested byte range:
+
+    <store>/cluster=<cluster>/<perflog-id>-<inode>-<start>-<end>.parquet
+
+Sweep-mode perf variables (`latency_<size>`, `bandwidth_<size>`) are kept
+in the same layout under <store>/sweeps/, one row per record and size.
+
+A part's name is determined by the byte range it holds, so ingesting a
+range again after an interruption rewrites the same part instead of
+duplicating its records.  When the inode of a perflog changes, the
+remainder of the old file is read from its rotated copy (`<log>.h<N>`)
+before the new file is ingested from its start.
+
+When STORE_VERSION changes (a new table or column), the parts of every
+perflog still on disk are rewritten from it on its next ingestion, so
+older stores gain, e.g., the sweep points they never kept.  Parts of
+perflogs that are gone stay as they are.
+
+Parts are Parquet when pyarrow is installed, pickled DataFrames otherwise;
+both keep cluster, binary_source, placement_type and the other label
+columns categorical.
+
+Usage:
+    results_store.py ingest perflogs/iris/batch/OSUPlacementTest.log [...]
+    results_store.py show [--cluster iris]
+"""
+import argparse
+import glob
+import hashlib
+import io
+import json
+import os
+import re
+import sys
+import tempfile
+
+import pandas as pd
+
+try:
+    import pyarrow
+    import pyarrow.csv
+except ImportError:
+    pyarrow = None
+
+from atomic_io import write_atomic_json
+
+STORE_DIR = os.environ.get(
+    'RESULTS_STORE', os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                   '..', 'tests', 'perflogs', 'results-store')))
+STATE_FILE = 'ingest_state.json'
+# Bump when ingestion adds tables or columns: logs ingested by an older
+# version are then ingested again
+STORE_VERSION = 2
+
+COLUMNS = ['result', 'system', 'binary_source', 'placement_type', 'metric', 'value', 'unit',
+           'cluster', 'job_completion_time', 'config_hash', 'benchmark', 'size']
+CATEGORICAL = ['result', 'system', 'binary_source', 'placement_type', 'metric', 'unit', 'cluster',
+               'benchmark']
+# Perf variables holding the headline value, in the order they are looked for
+VALUE_METRICS = ['bandwidth', 'latency']
+# Message size of the headline value (latency_size / bandwidth_size of the tests)
+HEADLINE_SIZES = {'latency': 8192, 'bandwidth': 1048576}
+
+# Sweep-mode perf variables ('<metric>_<size>') go to a table of their own,
+# one row per record and message size
+SWEEP_TABLE = 'sweeps'
+SWEEP_COLUMNS = ['result', 'system', 'binary_source', 'placement_type', 'benchmark', 'metric',
+                 'size', 'value', 'unit', 'cluster', 'job_completion_time', 'config_hash']
+SWEEP_VALUE = re.compile(r'^(latency|bandwidth)_(\d+)_value$')
+
+
+def cluster_from_path(log_path):
+    """Cluster a perflog belongs to, from its perflogs/<cluster>/... path"""
+    parts = os.path.normpath(os.path.abspath(log_path)).split(os.sep)
+    if 'perflogs' in parts[:-1]:
+        return parts[parts.index('perflogs') + 1]
+    return "iris" if "iris" in log_path else "aion"
+
+
+def _part_extension():
+    return '.parquet' if pyarrow is not None else '.pkl'
+
+
+def _labels(records, cluster):
+    """The columns describing each record's test case and run"""
+    result = pd.DataFrame(index=records.index)
+    for name in ['result', 'system', 'binary_source', 'placement_type',
+                 'job_completion_time', 'config_hash']:
+        result[name] = records[name] if name in records else None
+    result['cluster'] = cluster
+    # ReFrame logs the test_type parameter as its tuple, e.g.
+    # "('one-sided', 'osu_get_latency', 'latency')"; the batch runner the name
+    if 'test_type' in records:
+        test_type = records['test_type'].astype(str)
+        benchmark = test_type.str.extract(r"^\(\s*'[^']*',\s*'([^']+)'", expand=False)
+        result['benchmark'] = benchmark.fillna(test_type)
+    else:
+        result['benchmark'] = None
+    return result
+
+
+def _categorise(frame, columns):
+    for name in columns:
+        frame[name] = frame[name].astype('category')
+    return frame
+
+
+def normalise(records, cluster):
+    """Perflog records (raw string columns) -> analysis columns
+
+    The headline value of a record is the first of VALUE_METRICS it logs a
+    unit for (batch_runner.py logs every metric's columns, 'null' for the
+    ones a case lacks); rows whose unit is 'us' are latencies.
+    """
+    result = _labels(records, cluster)
+
+    result['metric'], result['value'], result['unit'] = None, float('nan'), None
+    for name in VALUE_METRICS:
+        if f'{name}_value' not in records:
+            continue
+        unit = records[f'{name}_unit']
+        take = result['metric'].isna() & unit.notna() & (unit != 'null')
+        result.loc[take, 'metric'] = name
+        result.loc[take, 'value'] = pd.to_numeric(records.loc[take, f'{name}_value'], errors='coerce')
+        result.loc[take, 'unit'] = unit[take]
+    result.loc[result['unit'] == 'us', 'metric'] = 'latency'
+    result['size'] = result['metric'].map(HEADLINE_SIZES)
+    return _categorise(result[COLUMNS], CATEGORICAL)
+
+
+def sweep_points(records, cluster):
+    """Sweep-mode perf variables of perflog records, one row per record and size"""
+    sweeps = [(name, match.group(1), int(match.group(2)))
+              for name in records.columns for match in [SWEEP_VALUE.match(name)] if match]
+    if not sweeps:
+        return pd.DataFrame(columns=SWEEP_COLUMNS)
+    labels = _labels(records, cluster)
+    frames = []
+    for name, metric, size in sweeps:
+        frame = labels.copy()
+        frame['metric'] = metric
+        frame['size'] = size
+        frame['value'] = pd.to_numeric(records[name], errors='coerce')
+        frame['unit'] = records[f'{metric}_{size}_unit']
+        frames.append(frame)
+    points = pd.concat(frames, ignore_index=True).dropna(subset=['value'])
+    return _categorise(points[SWEEP_COLUMNS], CATEGORICAL)
+
+
+def parse_records(data, header):
+    """Pipe-delimited perflog lines (bytes, no header) -> DataFrame of strings"""
+    if not data:
+        return pd.DataFrame(columns=header)
+    # pyarrow's parser is the fastest but rejects malformed lines (e.g. from
+    # a crashed writer); the C parser skips them
+    if pyarrow is not None:
+        try:
+            table = pyarrow.csv.read_csv(
+                io.BytesIO(data),
+                read_options=pyarrow.csv.ReadOptions(column_names=header),
+                parse_options=pyarrow.csv.ParseOptions(delimiter='|'),
+                convert_options=pyarrow.csv.ConvertOptions(
+                    column_types={name: pyarrow.string() for name in header}))
+            return table.to_pandas()
+        except pyarrow.ArrowInvalid:
+            pass
+    return pd.read_csv(io.BytesIO(data), sep='|', names=header, header=None, dtype=str,
+                       keep_default_na=False, on_bad_lines='skip', engine='c')
+
+
+class ResultsStore:
+    """Partitioned store of normalised perflog records"""
+
+    def __init__(self, store_dir=None):
+        self.store_dir = store_dir or STORE_DIR
+        self.state_path = os.path.join(self.store_dir, STATE_FILE)
+        self.state = self._load_state()
+
+    def _load_state(self):
+        try:
+            with open(self.state_path) as f:
+                state = json.load(f)
+            if state.get('version') == STORE_VERSION:
+                return state
+            if 'logs' in state:
+                for entry in state['logs'].values():
+                    entry['stale'] = True
+                state['version'] = STORE_VERSION
+                return state
+        except (OSError, ValueError):
+            pass
+        return {'version': STORE_VERSION, 'logs': {}}
+
+    def _save_state(self):
+        os.makedirs(self.store_dir, exist_ok=True)
+        write_atomic_json(self.state_path, self.state)
+
+    def _write_part(self, frame, cluster, log_id, inode, start, end, table=''):
+        part_dir = os.path.join(self.store_dir, table, f'cluster={cluster}')
+        os.makedirs(part_dir, exist_ok=True)
+        path = os.path.join(part_dir, f'{log_id}-{inode}-{start}-{end}{_part_extension()}')
+        fd, tmp_path = tempfile.mkstemp(dir=part_dir, suffix='.tmp')
+        os.close(fd)
+        if pyarrow is not None:
+            frame.to_parquet(tmp_path, index=False)
+        else:
+            frame.to_pickle(tmp_path)
+        os.replace(tmp_path, path)
+        return path
+
+    def _ingest_range(self, path, entry, cluster, log_id):
+        """Ingest complete lines from entry['offset'] on; returns records added"""
+        with open(path, 'rb') as f:
+            if entry['offset'] == 0:
+                header = f.readline()
+                if not header.endswith(b'\n'):
+                    return 0
+                entry['header'] = header.decode().rstrip('\n').split('|')
+                entry['offset'] = f.tell()
+            f.seek(entry['offset'])
+            data = f.read()
+        # A line still being written is left for the next ingestion
+        data = data[:data.rfind(b'\n') + 1]
+        if not data:
+            return 0
+
+        start, end = entry['offset'], entry['offset'] + len(data)
+        records = parse_records(data, entry['header'])
+        # Records of sweep-only runs have no headline value, just sweep points
+        frame = normalise(records, cluster).dropna(subset=['metric'])
+        if not frame.empty:
+            self._write_part(frame, cluster, log_id, entry['inode'], start, end)
+        sweeps = sweep_points(records, cluster)
+        if not sweeps.empty:
+            self._write_part(sweeps, cluster, log_id, entry['inode'], start, end, SWEEP_TABLE)
+        entry['offset'] = end
+        return len(records)
+
+    def _rotated_copy(self, path, inode):
+        """The moved-aside copy (<log>.h<N>) of a perflog with this inode"""
+        for candidate in glob.glob(f'{glob.escape(path)}.h*'):
+            try:
+                if os.stat(candidate).st_ino == inode:
+                    return candidate
+            except OSError:
+                pass
+        return None
+
+    def _reingest(self, path, entry, cluster, log_id, st):
+        """Rewrite the parts of a log ingested by an older store version
+
+        Only when the whole ingested range is still on disk, in the log or
+        its rotated copy; otherwise the old parts are kept.
+        """
+        entry.pop('stale')
+        if entry['inode'] == st.st_ino:
+            source = path if entry['offset'] <= st.st_size else None
+        else:
+            source = self._rotated_copy(path, entry['inode'])
+        if source is None:
+            return 0
+        for table in ['', SWEEP_TABLE]:
+            pattern = os.path.join(glob.escape(os.path.join(self.store_dir, table)),
+                                   f"cluster={entry['cluster']}", f"{log_id}-{entry['inode']}-*")
+            for part in glob.glob(pattern):
+                os.remove(part)
+        entry['offset'] = 0
+        return self._ingest_range(source, entry, cluster, log_id)
+
+    def ingest(self, path, cluster=None):
+        """Ingest the records appended to one perflog since the last call"""
+        path = os.path.abspath(path)
+        cluster = cluster or cluster_from_path(path)
+        log_id = hashlib.sha1(path.encode()).hexdigest()[:8]
+        try:
+            st = os.stat(path)
+        except OSError:
+            return 0
+
+        added = 0
+        entry = self.state['logs'].get(path)
+        if entry and entry.get('stale'):
+            added += self._reingest(path, entry, cluster, log_id, st)
+        if entry and (entry['inode'] != st.st_ino or entry['offset'] > st.st_size):
+            # Replaced or truncated: finish the old file if it was moved aside
+            rotated = self._rotated_copy(path, entry['inode'])
+            if rotated:
+                added += self._ingest_range(rotated, entry, cluster, log_id)
+            entry = None
+        if entry is None:
+            entry = {'inode': st.st_ino, 'offset': 0, 'header': None, 'cluster': cluster}
+        if entry['offset'] < st.st_size:
+            added += self._ingest_range(path, entry, cluster, log_id)
+
+        self.state['logs'][path] = entry
+        self._save_state()
+        return added
+
+    def parts(self, clusters=None, table=''):
+        pattern = os.path.join(glob.escape(os.path.join(self.store_dir, table)), 'cluster=*', '*')
+        paths = sorted(path for path in glob.glob(pattern) if path.endswith(('.parquet', '.pkl')))
+        if clusters:
+            wanted = {f'cluster={cluster}' for cluster in clusters}
+            paths = [path for path in paths if os.path.basename(os.path.dirname(path)) in wanted]
+        return paths
+
+    def _read(self, parts, columns):
+        frames = [pd.read_parquet(path) if path.endswith('.parquet') else pd.read_pickle(path)
+                  for path in parts]
+        if not frames:
+            return pd.DataFrame(columns=columns)
+        # Parts written before a column was added lack it
+        df = pd.concat(frames, ignore_index=True).reindex(columns=columns)
+        # Parts have their own category sets, which concat turns into objects
+        return _categorise(df, CATEGORICAL)
+
+    def read(self, clusters=None):
+        """All stored records (optionally of some clusters) as one DataFrame"""
+        return self._read(self.parts(clusters), COLUMNS)
+
+    def read_sweeps(self, clusters=None):
+        """All stored sweep points (metric value per record and message size)"""
+        return self._read(self.parts(clusters, SWEEP_TABLE), SWEEP_COLUMNS)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Ingest perflogs into the results store")
+    parser.add_argument('action', choices=['ingest', 'show'])
+    parser.add_argument('perflogs', nargs='*', help="perflogs to ingest")
+    parser.add_argument('--store', default=None, help=f"store directory (default: {STORE_DIR})")
+    parser.add_argument('--cluster', action='append', default=None,
+                        help="cluster of the perflogs (ingest) or to show (repeatable)")
+    args = parser.parse_intermixed_args(argv)
+
+    store = ResultsStore(args.store)
+    if args.action == 'ingest':
+        if not args.perflogs:
+            parser.error("ingest needs at least one perflog")
+        cluster = args.cluster[0] if args.cluster else None
+        for path in args.perflogs:
+            print(f"{path}: {store.ingest(path, cluster)} new records")
+        return 0
+
+    df = store.read(args.cluster)
+    print(f"{len(df)} records in {len(store.parts(args.cluster))} parts under {store.store_dir}")
+    if not df.empty:
+        print(df.groupby(['cluster', 'metric'], observed=True)['value'].describe())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,109 @@
+"""Resume support: skip test cases that already passed recently
+
+Every test case gets a configuration hash over everything that affects its
+result (system, partition, binary source, OSU build, placement, benchmark,
+message sizes, iteration counts, ...).  The hash is written to the perflog
+with each record, so a rerun can look up the latest record of a case and
+skip it if it passed within the freshness window.  Missing, failed and
+stale cases run again.  ReFrame and batch_runner.py write separate perflogs
+(see perflog_paths()); the latest record in either counts, including the
+copies (<log>.h<N>) a writer moved aside when the header changed.
+"""
+import datetime
+import glob
+import hashlib
+import json
+import os
+
+DEFAULT_WINDOW_HOURS = 24.0
+
+_perflog_cache = {}
+
+
+def case_config(display_name, system, partition, environ, build, sizes, warmup, iterations,
+                trials=1, full_stats=False, sweep_buckets=None, adaptive=None):
+    """Configuration of one test case, as hashed by ReFrame tests and batch_runner.py alike"""
+    return {
+        'test': display_name,
+        'system': system,
+        'partition': partition,
+        'environ': environ,
+        'build': build,
+        'sizes': sizes,
+        'sweep_buckets': sweep_buckets or {},
+        'warmup': warmup,
+        'iterations': iterations,
+        'trials': trials,
+        'full_stats': full_stats,
+        'adaptive': adaptive,
+    }
+
+
+def config_hash(config):
+    """Stable short hash of a JSON-serialisable configuration dict"""
+    text = json.dumps(config, sort_keys=True, default=str)
+    return hashlib.sha1(text.encode()).hexdigest()[:16]
+
+
+def perflog_paths(perflog_dir, system, partition, test_name):
+    """The ReFrame perflog of a test and the batch runner's log next to it"""
+    base = os.path.join(perflog_dir, system, partition, test_name)
+    return [f'{base}.log', f'{base}-batch.log']
+
+
+def _completion_time(record):
+    try:
+        completed = datetime.datetime.fromisoformat(record['job_completion_time'])
+    except (KeyError, ValueError):
+        return None
+    if completed.tzinfo is None:
+        completed = completed.astimezone()
+    return completed
+
+
+def perflog_versions(perflog_path):
+    """A perflog and the copies of it moved aside after header changes"""
+    return sorted(glob.glob(f'{glob.escape(perflog_path)}.h*')) + [perflog_path]
+
+
+def latest_records(perflog_path):
+    """config_hash -> latest perflog record (as a dict) in a perflog file
+
+    Parsed once per file version; all tests of a class share the file.
+    """
+    try:
+        st = os.stat(perflog_path)
+    except OSError:
+        return {}
+    stamp = (st.st_ino, st.st_mtime_ns, st.st_size)
+    cached = _perflog_cache.get(perflog_path)
+    if cached and cached[0] == stamp:
+        return cached[1]
+
+    records = {}
+    with open(perflog_path) as f:
+        header = f.readline().rstrip('\n').split('|')
+        for line in f:
+            record = dict(zip(header, line.rstrip('\n').split('|')))
+            key = record.get('config_hash')
+            if key:
+                # Records are appended in time order, so the last one wins
+                records[key] = record
+    _perflog_cache[perflog_path] = (stamp, records)
+    return records
+
+
+def is_fresh(perflog_paths, key, window_hours=DEFAULT_WINDOW_HOURS, now=None):
+    """True if the latest record of `key` in the perflog(s) passed within the window"""
+    if isinstance(perflog_paths, str):
+        perflog_paths = [perflog_paths]
+    latest, completed = None, None
+    for path in (version for path in perflog_paths for version in perflog_versions(path)):
+        record = latest_records(path).get(key)
+        time = record and _completion_time(record)
+        if time and (completed is None or time >= completed):
+            latest, completed = record, time
+    if not latest or latest.get('result') != 'pass':
+        return False
+    now = now or datetime.datetime.now().astimezone()
+    return now - completed <= datetime.timedelta(hours=window_hours)
@@ -7,6 +7,7 @@ module load devel/ReFrame/4.7.4-GCCcore-13.2.0
 
 # Default method is local
 METHOD="all"
+JOBS_ARGS=""
 
 # Parse command line arguments
 while [[ $# -gt 0 ]]; do
@@ -15,6 +16,10 @@ while [[ $# -gt 0 ]]; do
             METHOD="$2"
             shift 2
             ;;
+        --jobs|-j)
+            JOBS_ARGS="--jobs $2"
+            shift 2
+            ;;
         *)
             # Unknown option
             shift
@@ -22,4 +27,4 @@ while [[ $# -gt 0 ]]; do
     esac
 done
 
-python main.py --method $METHOD
\ No newline at end of file
+python main.py --method $METHOD $JOBS_ARGS
\ No newline at end of file
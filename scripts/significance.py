@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""Bootstrap confidence intervals and significance tests between binary sources
+
+The analysis compares binary sources cell by cell: one cell per (cluster,
+benchmark, metric, placement, binary source).  Benchmarks are never
+pooled, or a shift in osu_get_bw would be diluted by unchanged osu_bw
+runs.  Each cell is summarised by its median, which a few outlier runs
+barely move, with a percentile bootstrap confidence interval.  All cells
+are padded into one matrix, like the series of regressions.py, and
+resampled --boot times at once.  A resample's median is drawn directly as
+an order statistic of the sorted cell, so the cost does not grow with the
+number of runs in a cell.
+
+Within every (cluster, benchmark, metric, placement) the sources are
+compared pairwise (local, easybuild, eessi) with a two-sided Mann-Whitney
+U test.  The test uses the normal approximation with tie and continuity
+correction, so every side needs at least MIN_SAMPLES runs.  All p-values
+of a report form one family, corrected with Holm (default),
+Benjamini-Hochberg or Bonferroni.  Every comparison also gives the
+relative change of the medians with its bootstrap interval, so "eessi is
+3% faster" comes with both an interval and a significance level.
+
+Usage:
+    significance.py [--store DIR] [--boot 2000] [--confidence 0.95] [--alpha 0.05] [--correction holm]
+"""
+import argparse
+import itertools
+import math
+import sys
+
+import numpy as np
+import pandas as pd
+
+from regressions import HIGHER_IS_BETTER
+
+CELL = ['cluster', 'benchmark', 'metric', 'placement_type', 'binary_source']
+SOURCES = ['local', 'easybuild', 'eessi']
+
+DEFAULT_BOOT = 2000
+DEFAULT_CONFIDENCE = 0.95
+DEFAULT_ALPHA = 0.05
+DEFAULT_CORRECTION = 'holm'
+DEFAULT_SEED = 0
+# Fewest runs per side for a test
+MIN_SAMPLES = 5
+
+
+def cell_matrix(df, by=CELL):
+    """Pad the values of every cell into one matrix
+
+    Returns (keys, values, lengths): one row of `keys` per cell, values of
+    shape (cells, largest cell) padded with NaN, and the size of each cell.
+    """
+    df = df.dropna(subset=['value'])
+    groups = df.groupby(by, observed=True)
+    keys = groups.size().reset_index(name='n')
+    lengths = keys['n'].to_numpy()
+    values = np.full((len(keys), int(lengths.max()) if len(keys) else 0), np.nan)
+    values[groups.ngroup().to_numpy(), groups.cumcount().to_numpy()] = df['value'].to_numpy()
+    return keys, values, lengths
+
+
+def bootstrap_medians(values, lengths, n_boot=DEFAULT_BOOT, seed=DEFAULT_SEED):
+    """Medians of n_boot bootstrap resamples of every row of a NaN-padded matrix
+
+    Returns an array of shape (rows, n_boot).  Resampling n values picks
+    sorted[floor(n * u)] for n uniforms u, and floor is monotone, so a
+    resample's median is the row's sorted value at the index of the k-th
+    smallest u.  That order statistic is Beta(k, n + 1 - k) distributed, and
+    the next one is it plus (1 - it) * Beta(1, n - k).  Two Beta draws per
+    resample thus give exactly the bootstrap distribution, without drawing
+    and sorting n values each time.
+    """
+    rng = np.random.default_rng(seed)
+    ordered = np.sort(values, axis=1)
+    rows = np.arange(len(lengths))[:, None]
+    n = lengths[:, None]
+    # The lower median is the k-th smallest, the upper one the (k+1)-th for even n
+    k = (n + 1) // 2
+    low = rng.beta(k, n + 1 - k, size=(len(lengths), n_boot))
+    high = low + (1 - low) * rng.beta(1, np.maximum(n - k, 1), size=low.shape)
+    high = np.where(n % 2 == 0, high, low)
+    low_index = np.minimum((low * n).astype(np.intp), n - 1)
+    high_index = np.minimum((high * n).astype(np.intp), n - 1)
+    return (ordered[rows, low_index] + ordered[rows, high_index]) / 2
+
+
+def _percentiles(boot, confidence):
+    tail = (1 - confidence) / 2
+    return np.quantile(boot, tail, axis=1), np.quantile(boot, 1 - tail, axis=1)
+
+
+def cell_intervals(df, by=CELL, n_boot=DEFAULT_BOOT, confidence=DEFAULT_CONFIDENCE,
+                   seed=DEFAULT_SEED):
+    """Median and bootstrap interval of every cell: DataFrame with the `by`
+    columns, n, median, mean, ci_low and ci_high (NaN for single runs)"""
+    keys, values, lengths = cell_matrix(df, by)
+    with np.errstate(invalid='ignore'):
+        keys['median'] = np.nanmedian(values, axis=1) if len(keys) else []
+        keys['mean'] = np.nanmean(values, axis=1) if len(keys) else []
+    low, high = _percentiles(bootstrap_medians(values, lengths, n_boot, seed), confidence)
+    keys['ci_low'] = np.where(lengths > 1, low, np.nan)
+    keys['ci_high'] = np.where(lengths > 1, high, np.nan)
+    return keys
+
+
+def mann_whitney(x, y):
+    """Two-sided Mann-Whitney U test: (U of x, p-value)
+
+    Normal approximation with tie and continuity correction.
+    """
+    n1, n2 = len(x), len(y)
+    ranks = pd.Series(np.concatenate([x, y])).rank().to_numpy()
+    u = ranks[:n1].sum() - n1 * (n1 + 1) / 2
+    n = n1 + n2
+    _, ties = np.unique(ranks, return_counts=True)
+    variance = n1 * n2 / 12 * ((n + 1) - (ties ** 3 - ties).sum() / (n * (n - 1)))
+    if variance <= 0:
+        return u, 1.0
+    z = max(abs(u - n1 * n2 / 2) - 0.5, 0) / math.sqrt(variance)
+    return u, min(1.0, math.erfc(z / math.sqrt(2)))
+
+
+def adjust_p_values(p_values, method=DEFAULT_CORRECTION):
+    """Multiple-comparison correction of one family of p-values (NaN ignored)"""
+    p_values = np.asarray(p_values, dtype=float)
+    adjusted = np.full(len(p_values), np.nan)
+    tested = np.flatnonzero(~np.isnan(p_values))
+    m = len(tested)
+    if not m:
+        return adjusted
+    order = tested[np.argsort(p_values[tested], kind='stable')]
+    ranked = p_values[order]
+    if method == 'holm':
+        ranked = np.maximum.accumulate((m - np.arange(m)) * ranked)
+    elif method == 'bh':
+        ranked = np.minimum.accumulate((ranked * m / np.arange(1, m + 1))[::-1])[::-1]
+    elif method == 'bonferroni':
+        ranked = ranked * m
+    else:
+        raise ValueError(f"unknown correction {method!r}")
+    adjusted[order] = np.minimum(ranked, 1.0)
+    return adjusted
+
+
+def pairwise_tests(df, n_boot=DEFAULT_BOOT, confidence=DEFAULT_CONFIDENCE, alpha=DEFAULT_ALPHA,
+                   correction=DEFAULT_CORRECTION, seed=DEFAULT_SEED, sources=SOURCES):
+    """Pairwise comparisons of the sources within every (cluster, benchmark, metric, placement)
+
+    One row per pair (source_a, source_b) with both medians, the relative
+    change of b over a and its bootstrap interval, U, the p-value, the
+    corrected p-value, whether it is significant at `alpha` and which
+    source performs better (None if not significant).
+    """
+    keys, values, lengths = cell_matrix(df)
+    boot = bootstrap_medians(values, lengths, n_boot, seed)
+    row = {tuple(key): i for i, key in enumerate(keys[CELL].itertuples(index=False))}
+
+    tests = []
+    for within in keys[CELL[:-1]].drop_duplicates().itertuples(index=False):
+        present = [source for source in sources if (*within, source) in row]
+        for source_a, source_b in itertools.combinations(present, 2):
+            a, b = row[(*within, source_a)], row[(*within, source_b)]
+            x, y = values[a, :lengths[a]], values[b, :lengths[b]]
+            median_a, median_b = np.median(x), np.median(y)
+            if min(len(x), len(y)) >= MIN_SAMPLES:
+                u, p_value = mann_whitney(x, y)
+            else:
+                u, p_value = np.nan, np.nan
+            with np.errstate(divide='ignore', invalid='ignore'):
+                changes = boot[[b]] / boot[[a]] - 1
+            low, high = _percentiles(changes, confidence)
+            tests.append((*within, source_a, source_b, len(x), len(y), median_a, median_b,
+                          median_b / median_a - 1, low[0], high[0], u, p_value))
+
+    tests = pd.DataFrame(tests, columns=CELL[:-1] + [
+        'source_a', 'source_b', 'n_a', 'n_b', 'median_a', 'median_b',
+        'change', 'change_low', 'change_high', 'u', 'p_value'])
+    tests['p_adjusted'] = adjust_p_values(tests['p_value'], correction)
+    tests['significant'] = tests['p_adjusted'] < alpha
+    higher_is_better = tests['metric'].astype(str).map(HIGHER_IS_BETTER).fillna(True).astype(bool)
+    b_better = np.where(higher_is_better, tests['change'] > 0, tests['change'] < 0)
+    tests['better'] = np.where(~tests['significant'], None,
+                               np.where(b_better, tests['source_b'], tests['source_a']))
+    return tests
+
+
+def format_intervals(intervals, confidence=DEFAULT_CONFIDENCE):
+    lines = [f"{'cell':<68} {'n':>5} {'median':>10} {f'{confidence:.0%} interval':>23}"]
+    for cell in intervals.itertuples():
+        name = (f"{cell.cluster}/{cell.benchmark}/{cell.metric}/{cell.placement_type}/"
+                f"{cell.binary_source}")
+        lines.append(f"{name:<68} {cell.n:>5} {cell.median:>10.4g} "
+                     f"[{cell.ci_low:>9.4g}, {cell.ci_high:>9.4g}]")
+    return '\n'.join(lines)
+
+
+def format_tests(tests, correction=DEFAULT_CORRECTION, alpha=DEFAULT_ALPHA,
+                 confidence=DEFAULT_CONFIDENCE):
+    if tests.empty:
+        return "No pairs of binary sources to compare"
+    tested = tests['p_value'].notna()
+    lines = [f"{int(tested.sum())} comparisons, {int(tests['significant'].sum())} significant at "
+             f"alpha={alpha} ({correction}-corrected); changes are b vs a with "
+             f"{confidence:.0%} bootstrap intervals"]
+    for test in tests.itertuples():
+        if pd.isna(test.p_value):
+            verdict = f"too few runs (< {MIN_SAMPLES})"
+        elif test.significant:
+            verdict = f"{test.better} better"
+        else:
+            verdict = "no significant difference"
+        lines.append(
+            f"  {test.cluster}/{test.benchmark}/{test.metric}/{test.placement_type}: "
+            f"{test.source_b} vs {test.source_a} "
+            f"{test.change:+.1%} [{test.change_low:+.1%}, {test.change_high:+.1%}], "
+            f"p={test.p_value:.3g}, adjusted p={test.p_adjusted:.3g} -> {verdict}")
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    from results_store import ResultsStore
+
+    parser = argparse.ArgumentParser(description="Compare binary sources with bootstrap intervals "
+                                                 "and Mann-Whitney tests")
+    parser.add_argument('--store', default=None, help="results store directory")
+    parser.add_argument('--cluster', action='append', default=None, help="only these clusters")
+    parser.add_argument('--boot', type=int, default=DEFAULT_BOOT,
+                        help="bootstrap resamples per cell (default: %(default)s)")
+    parser.add_argument('--confidence', type=float, default=DEFAULT_CONFIDENCE,
+                        help="confidence level of the intervals (default: %(default)s)")
+    parser.add_argument('--alpha', type=float, default=DEFAULT_ALPHA,
+                        help="significance level after correction (default: %(default)s)")
+    parser.add_argument('--correction', choices=['holm', 'bh', 'bonferroni'], default=DEFAULT_CORRECTION,
+                        help="multiple-comparison correction (default: %(default)s)")
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED, help="bootstrap random seed")
+    parser.add_argument('--csv', default=None, help="also write the tests to this file")
+    args = parser.parse_args(argv)
+
+    df = ResultsStore(args.store).read(args.cluster)
+    if df.empty:
+        print("No results in the store")
+        return 1
+    print(format_intervals(cell_intervals(df, n_boot=args.boot, confidence=args.confidence,
+                                          seed=args.seed), args.confidence))
+    tests = pairwise_tests(df, args.boot, args.confidence, args.alpha, args.correction, args.seed)
+    print()
+    print(format_tests(tests, args.correction, args.alpha, args.confidence))
+    if args.csv:
+        tests.to_csv(args.csv, index=False)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
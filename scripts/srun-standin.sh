@@ -0,0 +1,45 @@
+#!/bin/bash
+# Stand-in for srun when trying batch_runner.py without Slurm: drops the
+# srun options and runs the command once per task on the local host with
+# SLURM_PROCID/SLURM_NTASKS set, as srun would.
+
+NTASKS=1
+while [[ $# -gt 0 && "$1" == -* ]]; do
+    case $1 in
+        -n|--ntasks)
+            NTASKS="$2"
+            shift 2
+            ;;
+        -n*)
+            NTASKS="${1#-n}"
+            shift
+            ;;
+        --ntasks=*)
+            NTASKS="${1#--ntasks=}"
+            shift
+            ;;
+        -N|-c|-p|-t)
+            shift 2
+            ;;
+        *)
+            shift
+            ;;
+    esac
+done
+
+if [ $# -eq 0 ]; then
+    echo "Usage: $0 [srun options] <command...>" >&2
+    exit 1
+fi
+
+PIDS=()
+for ((rank = 0; rank < NTASKS; rank++)); do
+    SLURM_PROCID=$rank SLURM_NTASKS=$NTASKS "$@" &
+    PIDS+=($!)
+done
+
+STATUS=0
+for pid in "${PIDS[@]}"; do
+    wait "$pid" || STATUS=$?
+done
+exit $STATUS
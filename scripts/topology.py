@@ -0,0 +1,462 @@
+"""Hardware topology model shared by the detection and placement scripts.
+
+The whole CPU/NUMA/cache layout is read in a single pass, either straight
+from /sys/devices/system/{cpu,node} or, when sysfs is not usable, from one
+`lscpu -p=cpu,core,socket,node,cache` call.  Nothing here forks a process
+per CPU.
+
+Run as a script it prints the topology of the host it runs on, e.g. from a
+job step on a compute node:
+    srun -N1 -n1 python3 topology.py --json
+"""
+import argparse
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+
+from atomic_io import write_atomic_json
+
+SYSROOT = '/'
+CPU_DIR = 'sys/devices/system/cpu'
+NODE_DIR = 'sys/devices/system/node'
+
+# Shared (home directory) cache of detection results, see cache_entry()
+TOPOLOGY_CACHE_DIR = os.environ.get(
+    'OSU_TOPOLOGY_CACHE', os.path.expanduser('~/hpc-project/cache/topology'))
+# Bump when the cached file layout changes so stale entries are ignored
+CACHE_VERSION = 1
+
+# Cache levels kept in the model (L1 is private to a core and adds nothing)
+CACHE_LEVELS = (2, 3)
+
+# Intra-node communication distance classes, nearest first.  A CPU pair
+# belongs to the class of the smallest domain both CPUs share.
+DISTANCE_CLASSES = [
+    'same_core',              # SMT siblings
+    'same_l2',                # different cores sharing an L2
+    'same_l3',                # different L2, same L3 (CCX on AMD)
+    'same_die',               # different L3, same die (CCD on AMD)
+    'same_numa',              # different die, same NUMA node
+    'diff_numa_same_socket',
+    'diff_socket_same_node',
+]
+
+# Boundary crossed by multi-pair placements and the domain each side fills
+PAIR_BOUNDARIES = {
+    'diff_numa_same_socket': 'node',
+    'diff_socket_same_node': 'socket',
+    'diff_node': 'socket',
+}
+
+# Placement classes used when no hardware information is available
+DEFAULT_PLACEMENT_CLASSES = ['same_numa', 'diff_numa_same_socket', 'diff_socket_same_node']
+
+
+def parse_cpu_list(text):
+    """Expand a kernel CPU list such as '0-3,8,10-11' into a list of ints"""
+    cpus = []
+    for part in text.strip().split(','):
+        part = part.strip()
+        if not part:
+            continue
+        if '-' in part:
+            start, end = map(int, part.split('-'))
+            cpus.extend(range(start, end + 1))
+        else:
+            cpus.append(int(part))
+    return cpus
+
+
+def format_cpu_list(cpus):
+    """Compress a list of CPU ids back into kernel list syntax"""
+    ranges = []
+    for cpu in sorted(set(cpus)):
+        if ranges and cpu == ranges[-1][1] + 1:
+            ranges[-1][1] = cpu
+        else:
+            ranges.append([cpu, cpu])
+    return ','.join(str(a) if a == b else f"{a}-{b}" for a, b in ranges)
+
+
+def _read(path, default=None):
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except OSError:
+        return default
+
+
+def allowed_cpus_list():
+    """Return the Cpus_allowed_list of this process as a kernel list string"""
+    status = _read('/proc/self/status', '')
+    for line in status.splitlines():
+        if line.startswith('Cpus_allowed_list:'):
+            return line.split(':', 1)[1].strip()
+    return format_cpu_list(os.sched_getaffinity(0))
+
+
+class Topology:
+    """In-memory view of the CPUs, cores, caches, sockets and NUMA nodes of a host
+
+    `cpus` maps each online CPU id to a dict with the keys 'core', 'socket',
+    'die', 'node', 'l2' and 'l3'.  Cache domain ids are unique across the
+    whole host (sysfs uses the lowest CPU id sharing the cache).
+    `allowed` is the subset of CPUs this process (or Slurm job) may use.
+    """
+
+    def __init__(self, cpus, allowed=None, numa_count=None):
+        self.cpus = dict(sorted(cpus.items()))
+        if allowed is None:
+            allowed = self.cpus
+        self.allowed = [cpu for cpu in sorted(set(allowed)) if cpu in self.cpus]
+        self._numa_count = numa_count
+        self._dies = None
+
+    @property
+    def numa_count(self):
+        if self._numa_count is not None:
+            return self._numa_count
+        return len({info['node'] for info in self.cpus.values()})
+
+    @property
+    def socket_count(self):
+        return len({info['socket'] for info in self.cpus.values()})
+
+    def socket_numa_map(self):
+        """socket -> list of NUMA nodes, restricted to the allowed CPUs"""
+        mapping = {}
+        for cpu in self.allowed:
+            info = self.cpus[cpu]
+            nodes = mapping.setdefault(info['socket'], [])
+            if info['node'] not in nodes:
+                nodes.append(info['node'])
+        return mapping
+
+    def numa_cpus_map(self):
+        """NUMA node -> list of allowed CPUs"""
+        mapping = {}
+        for cpu in self.allowed:
+            mapping.setdefault(self.cpus[cpu]['node'], []).append(cpu)
+        return mapping
+
+    def distance_class(self, cpu_a, cpu_b):
+        """Return the DISTANCE_CLASSES entry describing a pair of CPUs"""
+        a, b = self.cpus[cpu_a], self.cpus[cpu_b]
+        if a['socket'] != b['socket']:
+            return 'diff_socket_same_node'
+        if a['node'] != b['node']:
+            return 'diff_numa_same_socket'
+        if a['core'] == b['core']:
+            return 'same_core'
+        if a['l2'] is not None and a['l2'] == b['l2']:
+            return 'same_l2'
+        if a['l3'] is not None and a['l3'] == b['l3']:
+            return 'same_l3'
+        if a['die'] == b['die'] and len(self._node_dies().get(a['node'], ())) > 1:
+            return 'same_die'
+        return 'same_numa'
+
+    def _node_dies(self):
+        """NUMA node -> set of dies in it
+
+        'same_die' only means something when a NUMA node spans several dies;
+        otherwise it would just be a synonym for 'same_numa'.
+        """
+        if self._dies is None:
+            self._dies = {}
+            for info in self.cpus.values():
+                self._dies.setdefault(info['node'], set()).add(info['die'])
+        return self._dies
+
+    def distance_classes(self):
+        """Every distance class present among the allowed CPUs
+
+        Returns an ordered dict class -> representative (cpu_a, cpu_b) pair,
+        nearest class first.  The first pair found in CPU order is used.
+        """
+        found = {}
+        for i, cpu_a in enumerate(self.allowed):
+            for cpu_b in self.allowed[i + 1:]:
+                found.setdefault(self.distance_class(cpu_a, cpu_b), (cpu_a, cpu_b))
+            if len(found) == len(DISTANCE_CLASSES):
+                break
+        return {name: found[name] for name in DISTANCE_CLASSES if name in found}
+
+    def placement_pair(self, placement):
+        """Representative (rank 0 CPU, rank 1 CPU) pair for a placement type
+
+        'same_numa' falls back to the farthest class still inside one NUMA
+        node when the node has no finer structure of its own.  'diff_node'
+        runs one rank per host, so both ranks use their first allowed CPU;
+        each rank must ask a Topology of its own host and cpuset.
+        """
+        if placement == 'diff_node':
+            return (self.allowed[0], self.allowed[0])
+        classes = self.distance_classes()
+        if placement in classes:
+            return classes[placement]
+        if placement == 'same_numa':
+            inside_numa = DISTANCE_CLASSES[:DISTANCE_CLASSES.index('same_numa')]
+            for name in reversed(inside_numa):
+                if name in classes:
+                    return classes[name]
+        raise ValueError(f"Placement {placement} not available on this host "
+                         f"(available: {', '.join(classes) or 'none'})")
+
+    def placement_sides(self, placement, count):
+        """CPUs for `count` concurrent pairs across the boundary of `placement`
+
+        Returns (side_a, side_b): pair i runs between side_a[i] and
+        side_b[i].  Each side holds one CPU per physical core of the domain
+        (NUMA node or socket) the placement crosses.  For 'diff_node' both
+        sides are the first socket of their own host.
+        """
+        side_a, side_b = self._pair_sides(placement)
+        if count > min(len(side_a), len(side_b)):
+            raise ValueError(f"{count} pairs do not fit across {placement} "
+                             f"({min(len(side_a), len(side_b))} cores per side)")
+        return side_a[:count], side_b[:count]
+
+    def max_pairs(self, placement):
+        """Largest pair count placement_sides() accepts for `placement`"""
+        side_a, side_b = self._pair_sides(placement)
+        return min(len(side_a), len(side_b))
+
+    def _pair_sides(self, placement):
+        level = PAIR_BOUNDARIES.get(placement)
+        if level is None:
+            raise ValueError(f"Placement {placement} has no boundary to saturate "
+                             f"(use one of {', '.join(PAIR_BOUNDARIES)})")
+        cpu_a, cpu_b = self.placement_pair(placement)
+        return self._domain_cores(level, cpu_a), self._domain_cores(level, cpu_b)
+
+    def _domain_cores(self, level, cpu):
+        """First allowed CPU of every physical core sharing `level` with cpu"""
+        domain = self.cpus[cpu][level]
+        cores = {}
+        for other in self.allowed:
+            info = self.cpus[other]
+            if info[level] == domain:
+                cores.setdefault((info['socket'], info['core']), other)
+        return sorted(cores.values())
+
+    def to_dict(self):
+        return {
+            'numa_count': self._numa_count,
+            'allowed': format_cpu_list(self.allowed),
+            'cpus': {str(cpu): info for cpu, info in self.cpus.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        cpus = {int(cpu): info for cpu, info in data['cpus'].items()}
+        return cls(cpus, parse_cpu_list(data['allowed']), data.get('numa_count'))
+
+
+def read_sysfs_topology(sysroot=SYSROOT, allowed=None):
+    """Build a Topology from sysfs under `sysroot` in one pass"""
+    cpu_dir = os.path.join(sysroot, CPU_DIR)
+    node_dir = os.path.join(sysroot, NODE_DIR)
+
+    online = _read(os.path.join(cpu_dir, 'online'))
+    if online is None:
+        raise FileNotFoundError(f"No CPU information under {cpu_dir}")
+
+    cpus = {cpu: {'core': None, 'socket': 0, 'die': 0, 'node': 0,
+                  'l2': None, 'l3': None}
+            for cpu in parse_cpu_list(online)}
+
+    # NUMA membership comes from one cpulist per node rather than per CPU
+    numa_count = 0
+    if os.path.isdir(node_dir):
+        for entry in os.listdir(node_dir):
+            if not entry.startswith('node') or not entry[4:].isdigit():
+                continue
+            numa_count += 1
+            node = int(entry[4:])
+            for cpu in parse_cpu_list(_read(os.path.join(node_dir, entry, 'cpulist'), '')):
+                if cpu in cpus:
+                    cpus[cpu]['node'] = node
+
+    for cpu, info in cpus.items():
+        base = os.path.join(cpu_dir, f"cpu{cpu}")
+        topo = os.path.join(base, 'topology')
+        info['socket'] = int(_read(os.path.join(topo, 'physical_package_id'), 0))
+        info['core'] = int(_read(os.path.join(topo, 'core_id'), cpu))
+        info['die'] = int(_read(os.path.join(topo, 'die_id'), 0))
+
+        # A shared cache is assigned to every sibling at once, so each
+        # cache domain is only read from its first CPU
+        cache_dir = os.path.join(base, 'cache')
+        if not os.path.isdir(cache_dir):
+            continue
+        for index in os.listdir(cache_dir):
+            if not index.startswith('index'):
+                continue
+            level = _read(os.path.join(cache_dir, index, 'level'))
+            if level is None or int(level) not in CACHE_LEVELS:
+                continue
+            key = f"l{level}"
+            if info[key] is not None:
+                continue
+            shared = parse_cpu_list(_read(os.path.join(cache_dir, index, 'shared_cpu_list'), str(cpu)))
+            domain = min(shared)
+            for sibling in shared:
+                if sibling in cpus and cpus[sibling][key] is None:
+                    cpus[sibling][key] = domain
+
+    return Topology(cpus, allowed, numa_count or None)
+
+
+def read_lscpu_topology(allowed=None):
+    """Build a Topology from a single `lscpu -p=cpu,core,socket,node,cache` call"""
+    result = subprocess.run(['lscpu', '-p=cpu,core,socket,node,cache'],
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                            text=True, check=True)
+    columns = None
+    cpus = {}
+    for line in result.stdout.splitlines():
+        if line.startswith('#'):
+            # The last comment line is the header, e.g. "# CPU,Core,Socket,Node,L1d:L1i:L2:L3"
+            columns = line.lstrip('# ').split(',')
+            continue
+        fields = dict(zip(columns, line.split(',')))
+        caches = dict(zip(columns[-1].split(':'), fields.get(columns[-1], '').split(':')))
+        cpu = int(fields['CPU'])
+        cpus[cpu] = {
+            'core': int(fields['Core'] or cpu),
+            'socket': int(fields['Socket'] or 0),
+            'die': int(fields['Socket'] or 0),  # lscpu -p has no die column
+            'node': int(fields['Node'] or 0),
+            'l2': int(caches['L2']) if caches.get('L2') else None,
+            'l3': int(caches['L3']) if caches.get('L3') else None,
+        }
+    return Topology(cpus, allowed)
+
+
+def read_topology(sysroot=SYSROOT, allowed=None):
+    """Read the host topology, preferring sysfs and falling back to lscpu"""
+    try:
+        return read_sysfs_topology(sysroot, allowed)
+    except FileNotFoundError:
+        return read_lscpu_topology(allowed)
+
+
+def cluster_name(hostname=None):
+    """Cluster name from a node hostname, e.g. 'aion-0001' -> 'aion'"""
+    hostname = hostname or socket.gethostname()
+    return hostname.split('.')[0].split('-')[0]
+
+
+def publish_placement_classes(topology, cache_dir=None, cluster=None):
+    """Record this node's distance classes and topology for the whole cluster
+
+    ReFrame builds its parameter space on the login node, before any compute
+    node is probed, so it reads these per-cluster files instead of sysfs.
+    """
+    cache_dir = cache_dir or TOPOLOGY_CACHE_DIR
+    cluster = cluster or cluster_name()
+    os.makedirs(cache_dir, exist_ok=True)
+    path = os.path.join(cache_dir, f"placement_classes-{cluster}.json")
+    write_atomic_json(path, {name: list(pair) for name, pair in topology.distance_classes().items()})
+    write_atomic_json(os.path.join(cache_dir, f"topology-{cluster}.json"), topology.to_dict())
+    return path
+
+
+def load_cluster_topology(cluster=None, cache_dir=None):
+    """Whole-node Topology last published for a cluster, or None"""
+    cache_dir = cache_dir or TOPOLOGY_CACHE_DIR
+    path = os.path.join(cache_dir, f"topology-{cluster or cluster_name()}.json")
+    try:
+        with open(path) as f:
+            return Topology.from_dict(json.load(f))
+    except (OSError, ValueError):
+        return None
+
+
+def load_placement_classes(cluster=None, cache_dir=None):
+    """Distance classes last published for a cluster, or the fixed defaults"""
+    cache_dir = cache_dir or TOPOLOGY_CACHE_DIR
+    path = os.path.join(cache_dir, f"placement_classes-{cluster or cluster_name()}.json")
+    try:
+        with open(path) as f:
+            classes = list(json.load(f))
+    except (OSError, ValueError):
+        classes = []
+    return classes or list(DEFAULT_PLACEMENT_CLASSES)
+
+
+def topology_cache_key(cpus_allowed=None):
+    """Cache key for this host, boot and CPU allocation
+
+    Any change of node, reboot (kernel boot id) or Slurm cpuset yields a new
+    key, so stale entries are never reused and need no explicit invalidation.
+    """
+    if cpus_allowed is None:
+        cpus_allowed = allowed_cpus_list()
+    boot_id = _read('/proc/sys/kernel/random/boot_id', 'unknown-boot')
+    hostname = socket.gethostname()
+    digest = hashlib.sha1(
+        f"{CACHE_VERSION}|{hostname}|{boot_id}|{cpus_allowed}".encode()).hexdigest()
+    return f"{hostname}-{digest[:16]}"
+
+
+def cache_entry(generate, cache_dir=None, key=None):
+    """Return the cache directory for this host/allocation, generating it once
+
+    `generate(tmp_dir)` writes the entry's files into a private staging
+    directory, which is then renamed into place.  The rename is atomic and
+    generation runs under an exclusive flock, so concurrent jobs on the same
+    node wait for a single detection instead of each repeating it.
+    """
+    cache_dir = cache_dir or TOPOLOGY_CACHE_DIR
+    key = key or topology_cache_key()
+    entry_dir = os.path.join(cache_dir, key)
+    if os.path.isdir(entry_dir):
+        return entry_dir
+
+    os.makedirs(cache_dir, exist_ok=True)
+    with open(os.path.join(cache_dir, f"{key}.lock"), 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            # Another job may have finished generating while we waited
+            if os.path.isdir(entry_dir):
+                return entry_dir
+            tmp_dir = tempfile.mkdtemp(prefix=f".{key}.", dir=cache_dir)
+            try:
+                generate(tmp_dir)
+                os.chmod(tmp_dir, 0o755)
+                os.rename(tmp_dir, entry_dir)
+            except BaseException:
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+                raise
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+    return entry_dir
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Print the topology of this host")
+    parser.add_argument('--json', action='store_true', help="print Topology.to_dict() as JSON")
+    args = parser.parse_args(argv)
+
+    topology = read_topology()
+    if args.json:
+        json.dump(topology.to_dict(), sys.stdout)
+        print()
+    else:
+        print(f"{topology.socket_count} socket(s), {topology.numa_count} NUMA node(s), "
+              f"{len(topology.cpus)} CPU(s)")
+        for name, (cpu_a, cpu_b) in topology.distance_classes().items():
+            print(f"  {name}: CPUs {cpu_a} and {cpu_b}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,10 +1,139 @@
 import os
+import sys
 import reframe as rfm
 import reframe.utility.sanity as sn
+import reframe.utility.udeps as udeps
 from reframe.core.builtins import parameter
+from reframe.core.backends import getlauncher
+from reframe.core.exceptions import SanityError
 import csv
 import datetime
-from config import REFERENCE_VALUES, MODULE_CONFIGS
+import json
+from config import (REFERENCE_VALUES, SWEEP_REFERENCE_VALUES, MODULE_CONFIGS, OSU_BUILDS,
+                    REFERENCE_METRIC_ALIASES, RMA_MODE_REFERENCE_VALUES, PLACEMENT_REFERENCE_ALIASES,
+                    OSU_BENCHMARKS)
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+from topology import Topology, load_cluster_topology, load_placement_classes, PAIR_BOUNDARIES
+from affinity_launcher import read_placement_records, verify_placement
+from osu_index import build_id, resolve_binary
+from resume import case_config, config_hash, is_fresh, perflog_paths
+from references import lookup_reference, placement_references
+
+
+@sn.deferrable
+def assert_placement(stagedir, placement_type, num_tasks):
+    """Check the launcher's placement-rank<N>.json sidecars in stagedir"""
+    with open(os.path.join(stagedir, 'topology.json')) as f:
+        topology = Topology.from_dict(json.load(f))
+    records = read_placement_records(stagedir)
+    problems = verify_placement(records, placement_type, topology, num_tasks)
+    if problems:
+        raise SanityError(f"wrong placement for {placement_type}: {'; '.join(problems)}")
+    return True
+
+
+# Collectives covered by the scaling suite (mpi/collective directory)
+OSU_COLLECTIVES = ['osu_allreduce', 'osu_alltoall', 'osu_bcast', 'osu_barrier']
+# OSU collectives need at least two ranks, so the smallest configuration
+# (the efficiency baseline) is 2 nodes x 1 rank
+COLLECTIVE_NODE_COUNTS = [2, 4, 8, 16, 32, 64]
+COLLECTIVE_TASKS_PER_NODE = [1, 16]
+
+# OSU one-sided window creation (-w) and synchronization (-s) modes
+RMA_WINDOW_MODES = ['create', 'allocate', 'dynamic']
+RMA_SYNC_MODES = ['lock', 'flush', 'flush_local', 'lock_all', 'pscw', 'fence']
+# Benchmarks that only accept a subset of the synchronization modes
+RMA_SYNC_SUPPORT = {
+    'osu_put_bibw': ['pscw', 'fence'],
+}
+
+
+def multi_pair_counts(placement, max_pairs=64):
+    """1, 2, 4, ... pairs up to what fits across the boundary of `placement`
+
+    Uses the whole-node topology published for this cluster; without it
+    counts go up to max_pairs and oversized runs fail in the launcher.
+    """
+    topology = load_cluster_topology()
+    if topology is not None:
+        try:
+            max_pairs = topology.max_pairs(placement)
+        except ValueError:
+            return []
+    counts = []
+    count = 1
+    while count <= max_pairs:
+        counts.append(count)
+        count *= 2
+    return counts
+
+
+def osu_sizes(min_size, max_size):
+    """Message sizes OSU reports for `-m min:max` (0, then powers of two)"""
+    sizes = [0] if min_size == 0 else []
+    size = 1
+    while size <= max_size:
+        if size >= min_size:
+            sizes.append(size)
+        size *= 2
+    return sizes
+
+
+def percentile(values, q):
+    """q-th percentile (0-100) with linear interpolation between samples"""
+    values = sorted(values)
+    pos = (len(values) - 1) * q / 100
+    low = int(pos)
+    high = min(low + 1, len(values) - 1)
+    return values[low] + (values[high] - values[low]) * (pos - low)
+
+
+@sn.deferrable
+def size_series(rows):
+    """Turn extracted (size, value) rows of an OSU table into a size->value dict
+    
+    With repeated trials every size appears once per trial; the median is kept.
+    """
+    values = {}
+    for size, value in rows:
+        values.setdefault(size, []).append(value)
+    return {size: percentile(samples, 50) for size, samples in values.items()}
+
+
+@sn.deferrable
+def trial_stat(values, stat):
+    """Summary statistic over the per-trial values of one message size"""
+    if not values:
+        raise SanityError("no trial results found in output")
+    if stat == 'min':
+        return min(values)
+    if stat == 'max':
+        return max(values)
+    if stat.startswith('p'):
+        return percentile(values, float(stat[1:]))
+    
+    mean = sum(values) / len(values)
+    stddev = (sum((v - mean) ** 2 for v in values) / max(len(values) - 1, 1)) ** 0.5
+    if stat == 'stddev':
+        return stddev
+    if stat == 'cv':
+        return stddev / mean if mean else 0.0
+    raise ValueError(f"unknown statistic {stat}")
+
+
+@sn.deferrable
+def ratio(numerator, denominator):
+    return numerator / denominator
+
+
+@sn.deferrable
+def bucket_mean(series, min_size, max_size):
+    """Mean of the series over the sizes inside [min_size, max_size]"""
+    values = [value for size, value in series.items() if min_size <= size <= max_size]
+    if not values:
+        raise SanityError(f"no message sizes between {min_size} and {max_size} in output")
+    return sum(values) / len(values)
 
 
 class OSUMicroBenchmarkBase(rfm.RunOnlyRegressionTest):
@@ -16,11 +145,13 @@ class OSUMicroBenchmarkBase(rfm.RunOnlyRegressionTest):
     num_warmup_iters = 10
     num_iters = 1000
     device_buffers = 'cpu'
-    kind = 'one-sided'
+    # (family, benchmark, metric); the family selects the executable
+    # directory, e.g. -n '%test_type=osu_bibw' picks a single benchmark
     test_type = parameter([
-        ('osu_get_latency', 'latency'),
-        ('osu_get_bw', 'bandwidth')
-    ])
+        (family, benchmark, metric)
+        for family, benchmarks in OSU_BENCHMARKS.items()
+        for benchmark, metric in benchmarks
+    ], fmt=lambda x: x[1])
     
     # Define message sizes
     latency_size = 8192     # 8K bytes
@@ -32,10 +163,48 @@ class OSUMicroBenchmarkBase(rfm.RunOnlyRegressionTest):
     # Add parameter for binary source
     binary_source = parameter(['local', 'easybuild', 'eessi'])
     
+    # Sweep mode: 'min:max' message-size range passed to OSU's -m, e.g.
+    # -S sweep_range=1:4194304.  Every size in the table becomes its own
+    # perf variable ('<metric>_<size>'), which exposes jumps at the
+    # eager/rendezvous protocol switch that a single size hides.
+    sweep_range = variable(str, type(None), value=None)
+    # Optional buckets for the sweep, name -> (min_size, max_size); when set,
+    # each bucket ('<metric>_<name>') is reported as the mean of its sizes
+    sweep_buckets = variable(dict, value={})
+    
+    # Repetition mode: run the benchmark num_trials times in the same job
+    # (consecutive steps of one allocation) and report median, p5/p95,
+    # stddev and coefficient of variation; references check the median
+    num_trials = variable(int, value=1)
+    # Pass OSU's -f to also capture per-size min/max latency columns
+    full_stats = variable(bool, value=False)
+    
+    # Adaptive mode: instead of a fixed num_iters, run the headline size in
+    # batches of adaptive_batch_iters until the 95% confidence interval of
+    # the mean is narrower than adaptive_ci_target (relative width) or the
+    # adaptive_budget (seconds) is spent; see scripts/adaptive_runner.py
+    adaptive = variable(bool, value=False)
+    adaptive_ci_target = variable(float, value=0.02)
+    adaptive_budget = variable(float, value=120.0)
+    adaptive_batch_iters = variable(int, value=100)
+    
+    # Resume mode: skip cases whose configuration already has a passing
+    # perflog record from the last resume_window hours, so a rerun after a
+    # partial failure only repeats missing or failed cases
+    resume = variable(bool, value=False)
+    resume_window = variable(float, value=24.0)
+    perflog_dir = variable(str, value=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'perflogs'))
+    # Hash of the case configuration, logged with every perflog record
+    config_hash = variable(str, value='')
+    
+    # Version of the calibrated references (scripts/references.py) to check
+    # against: None for the latest, 0 for the static tables in config.py only
+    reference_version = variable(int, type(None), value=None)
+    
     @run_before('setup')
     def setup_per_benchmark(self):
         """Setup benchmark-specific parameters"""
-        self.benchmark, self.metric = self.test_type
+        self.kind, self.benchmark, self.metric = self.test_type
         
         # Determine unit based on metric
         if self.metric == 'latency':
@@ -52,71 +221,232 @@ class OSUMicroBenchmarkBase(rfm.RunOnlyRegressionTest):
             )
         } 
         
+        if self.sweep_range:
+            self.perf_variables.update(self._sweep_perf_variables())
+        
+        if self.num_trials > 1 or self.full_stats:
+            self.perf_variables.update(self._trial_perf_variables())
+        
+        if self.adaptive:
+            self.perf_variables.update(self._adaptive_perf_variables())
+    
+    def _adaptive_perf_variables(self):
+        """Iterations used and the final confidence interval of an adaptive run"""
+        def summary(key):
+            return sn.extractsingle(rf'^# Adaptive result:.*\b{key}=(\S+)', self.stdout, 1, float)
+        
+        return {
+            'iterations': sn.make_performance_function(summary('iterations'), 'iters'),
+            f'{self.metric}_ci_low': sn.make_performance_function(summary('ci_low'), self.unit),
+            f'{self.metric}_ci_high': sn.make_performance_function(summary('ci_high'), self.unit),
+            'ci_rel_width': sn.make_performance_function(summary('rel_width'), ''),
+        }
+    
+    def _trial_perf_variables(self):
+        """Statistics over repeated trials and OSU's full-format columns"""
+        perf_variables = {}
+        if self.num_trials > 1:
+            values = sn.extractall(rf'^{self.test_size}\s+(\S+)', self.stdout, 1, float)
+            # The headline metric (and its reference) becomes the median
+            perf_variables[self.metric] = sn.make_performance_function(
+                trial_stat(values, 'p50'), self.unit)
+            for stat in ['p5', 'p95', 'stddev']:
+                perf_variables[f'{self.metric}_{stat}'] = sn.make_performance_function(
+                    trial_stat(values, stat), self.unit)
+            perf_variables[f'{self.metric}_cv'] = sn.make_performance_function(
+                trial_stat(values, 'cv'), '')
+        
+        if self.full_stats and self.metric == 'latency':
+            # -f adds 'Min Latency' and 'Max Latency' columns after the average
+            for group, stat in [(1, 'min'), (2, 'max')]:
+                values = sn.extractall(rf'^{self.test_size}\s+\S+\s+(\S+)\s+(\S+)',
+                                       self.stdout, group, float)
+                perf_variables[f'{self.metric}_{stat}'] = sn.make_performance_function(
+                    trial_stat(values, stat), self.unit)
+        return perf_variables
+    
+    def _sweep_perf_variables(self):
+        """One perf variable per swept message size, or per size bucket"""
+        min_size, max_size = map(int, self.sweep_range.split(':'))
+        if not min_size <= self.test_size <= max_size:
+            # The headline size is not in the swept table
+            del self.perf_variables[self.metric]
+        series = self._extract_series()
+        
+        if self.sweep_buckets:
+            return {
+                f'{self.metric}_{name}': sn.make_performance_function(
+                    bucket_mean(series, lo, hi), self.unit)
+                for name, (lo, hi) in self.sweep_buckets.items()
+            }
+        
+        return {
+            f'{self.metric}_{size}': sn.make_performance_function(
+                sn.getitem(series, size), self.unit)
+            for size in osu_sizes(min_size, max_size)
+        }
+        
     @run_before('run')
     def load_modules(self):
         """Load necessary modules based on binary source"""
         self.modules = []  
         
-        self.prerun_cmds.extend(MODULE_CONFIGS[self.binary_source])
+        # Apply the cached environment snapshot of this source's modules;
+        # only the first job after a module tree change runs the loads
+        module_env = os.path.expanduser('~/hpc-project/scripts/module_env.py')
+        self.prerun_cmds.extend([
+            f'if OSU_MODULE_ENV=$(python3 {module_env} exports --source {self.binary_source}); then',
+            '  eval "$OSU_MODULE_ENV"',
+            'else',
+            *(f'  {command}' for command in MODULE_CONFIGS[self.binary_source]),
+            'fi'
+        ])
                 
     @run_before('run')    
     def set_executable(self):
         """Set executable path and options"""
         if self.binary_source == 'local':
-            # Local path can be set directly
+            # Local builds live in the build cache under their build key; the
+            # index points at the one built for this version and toolchain
+            version, toolchain = OSU_BUILDS['local']
+            indexed = resolve_binary(self.benchmark, 'local', version, toolchain,
+                                     cluster=self.current_system.name)
             osu_dir = os.path.expanduser('~/osu-micro-benchmarks-7.2/build')
-            self.executable = os.path.join(
+            self.executable = indexed or os.path.join(
                 osu_dir, 'libexec/osu-micro-benchmarks/mpi', 
                 self.kind, self.benchmark)
         elif self.binary_source in ['easybuild', 'eessi']:
-            # For module-loaded paths, use shell variables instead
-            # This will be expanded at runtime after modules are loaded
-            self.executable = "${EBROOTOSUMINMICROMINBENCHMARKS}/libexec/osu-micro-benchmarks/mpi/${KIND}/${BENCHMARK}"
-            
-            # Export variables needed in the shell
-            self.prerun_cmds.extend([
-                'export KIND="' + self.kind + '"',
-                'export BENCHMARK="' + self.benchmark + '"',
-                # Add a fallback path finder if the module variable isn't set
-                'if [ -z "$EBROOTOSUMINMICROMINBENCHMARKS" ]; then',
-                '  echo "Warning: EBROOTOSUMINMICROMINBENCHMARKS not set, trying to find it..."',
-                '  OSU_PATH=$(find /opt -name "osu_get_latency" -type f -executable 2>/dev/null | head -1)',
-                '  if [ -n "$OSU_PATH" ]; then',
-                '    export EBROOTOSUMINMICROMINBENCHMARKS=$(dirname $(dirname $(dirname $(dirname $OSU_PATH))))',
-                '    echo "Found at: $EBROOTOSUMINMICROMINBENCHMARKS"',
-                '  else',
-                '    echo "Could not find OSU Micro-Benchmarks"',
-                '    exit 1',
-                '  fi',
-                'fi',
-                'echo "Using OSU benchmarks from: $EBROOTOSUMINMICROMINBENCHMARKS"'
-            ])
+            version, toolchain = OSU_BUILDS[self.binary_source]
+            indexed = resolve_binary(self.benchmark, self.binary_source, version, toolchain,
+                                     cluster=self.current_system.name)
+            if indexed:
+                # Resolved from the OSU binary index, nothing to look up at job time
+                self.executable = indexed
+            else:
+                # For module-loaded paths, use shell variables instead
+                # This will be expanded at runtime after modules are loaded
+                self.executable = "${EBROOTOSUMINMICROMINBENCHMARKS}/libexec/osu-micro-benchmarks/mpi/${KIND}/${BENCHMARK}"
+                index_script = os.path.expanduser('~/hpc-project/scripts/osu_index.py')
+                
+                # Export variables needed in the shell
+                self.prerun_cmds.extend([
+                    'export KIND="' + self.kind + '"',
+                    'export BENCHMARK="' + self.benchmark + '"',
+                    'if [ -z "$EBROOTOSUMINMICROMINBENCHMARKS" ]; then',
+                    f'  echo "EBROOTOSUMINMICROMINBENCHMARKS not set and no OSU index for {self.binary_source}"',
+                    f'  echo "Build one with: {index_script} build --source {self.binary_source} '
+                    f'--version {version} --toolchain {toolchain} --root <OSU install root>"',
+                    '  exit 1',
+                    'fi',
+                    '# Index this installation so later runs skip the module lookup',
+                    f'python3 {index_script} build --source {self.binary_source} --version {version} '
+                    f'--toolchain {toolchain} --cluster {self.current_system.name} || true',
+                ])
+            self.prerun_cmds.append(f'echo "Using OSU benchmark: {self.executable}"')
         else:
             self.skip_if(True, 'Unknown binary source')
             return
         
         # Set basic executable options
         self.executable_opts = [
-            '-m', str(self.test_size),
+            '-m', self.sweep_range or str(self.test_size),
             '-x', str(self.num_warmup_iters),
             '-i', str(self.num_iters)
         ]
         
+        if self.full_stats and self.metric == 'latency':
+            self.executable_opts.append('-f')
+        
         # Verify executable exists
         self.prerun_cmds.append(
             f'if [ ! -x "{self.executable}" ]; then '
             f'echo "Benchmark executable not found: {self.executable}"; exit 1; fi'
         )
     
+    @run_before('run', always_last=True)
+    def add_repeated_trials(self):
+        """Run trials 2..num_trials as further steps of the same job
+        
+        MPI cannot be initialised twice within one srun step, so the extra
+        trials reuse the allocation and launcher options instead.  Each one
+        appends its table to the job's stdout after a '# Trial N' marker.
+        """
+        if self.num_trials <= 1 or self.adaptive:
+            return
+        
+        run_cmd = ' '.join([self.job.launcher.run_command(self.job),
+                            self.executable, *self.executable_opts])
+        self.postrun_cmds[:0] = [
+            f'for trial in $(seq 2 {self.num_trials}); do',
+            '  echo "# Trial $trial"',
+            f'  {run_cmd}',
+            'done'
+        ]
+    
+    @run_before('run', always_last=True)
+    def wrap_adaptive_runner(self):
+        """Let adaptive_runner.py drive the batches, each as its own srun step"""
+        if not self.adaptive:
+            return
+        
+        run_cmd = self.job.launcher.run_command(self.job)
+        runner = os.path.expanduser('~/hpc-project/scripts/adaptive_runner.py')
+        # The whole OSU command goes after '--'; the runner replaces its
+        # -m/-x/-i with the per-batch values and keeps every other option
+        self.executable_opts = [
+            runner,
+            '--size', str(self.test_size),
+            '--launcher', f"'{run_cmd}'",
+            '--batch-iters', str(self.adaptive_batch_iters),
+            '--warmup', str(self.num_warmup_iters),
+            '--target', str(self.adaptive_ci_target),
+            '--budget', str(self.adaptive_budget),
+            '--', self.executable, *self.executable_opts
+        ]
+        self.executable = 'python3'
+        # The runner itself runs in the batch script, not under srun
+        self.job.launcher = getlauncher('local')()
+    
     def _extract_metric(self, size):
         """Extract benchmark metric from stdout with specific size"""
         return sn.extractsingle(rf'^{size}\s+(\S+)',
                                self.stdout, 1, float)
     
+    def _extract_series(self, stdout=None):
+        """Parse the whole OSU output table into a size -> value series"""
+        return size_series(sn.extractall(r'^(\d+)\s+(\S+)', stdout or self.stdout,
+                                         (1, 2), (int, float)))
+    
     @sanity_function
     def assert_output(self):
         return sn.assert_found(r'# OSU MPI', self.stdout)
     
+    @run_after('setup')
+    def skip_fresh_results(self):
+        """Hash the case configuration and, in resume mode, skip fresh passes"""
+        system = self.current_system.name
+        partition = self.current_partition.name
+        version, toolchain = OSU_BUILDS[self.binary_source]
+        self.config_hash = config_hash(case_config(
+            self.display_name, system, partition, self.current_environ.name,
+            build_id(self.binary_source, version, toolchain, cluster=system),
+            sizes=self.sweep_range or self.test_size,
+            warmup=self.num_warmup_iters,
+            iterations=self.num_iters,
+            trials=self.num_trials,
+            full_stats=self.full_stats,
+            sweep_buckets=self.sweep_buckets,
+            adaptive=[self.adaptive_ci_target, self.adaptive_budget,
+                      self.adaptive_batch_iters] if self.adaptive else None
+        ))
+        if not self.resume:
+            return
+        
+        # batch_runner.py runs of the same case count as well
+        perflogs = perflog_paths(self.perflog_dir, system, partition, type(self).__name__)
+        self.skip_if(is_fresh(perflogs, self.config_hash, self.resume_window),
+                     f'passed within the last {self.resume_window:g} h (config {self.config_hash})')
+    
     def set_reference_values(self, is_multi_node=False):
         """Common method to set reference values based on configuration"""
         system = self.current_system.name
@@ -126,27 +456,44 @@ class OSUMicroBenchmarkBase(rfm.RunOnlyRegressionTest):
         key = f"{system}:{partition}"
         self.reference = dict()
         
-        if system in REFERENCE_VALUES:
-            # Set metric-specific reference values
-            if self.metric in REFERENCE_VALUES[system]:
-                ref_key = self.placement_type if self.placement_type  in REFERENCE_VALUES[system][self.metric][self.binary_source] else 'default'
-                self.reference = {
-                    key: {
-                        self.metric: REFERENCE_VALUES[system][self.metric][self.binary_source][ref_key]
-                    }
-                }
+        # References are stored per benchmark; the original one-sided get
+        # tables are still keyed by metric name
+        table = self.benchmark
+        if table not in REFERENCE_VALUES.get(system, {}):
+            table = REFERENCE_METRIC_ALIASES.get(self.benchmark)
+        
+        # References calibrated from the result history come first; the
+        # static tables cover whatever has not been calibrated
+        calibrated = lookup_reference(system, self.benchmark, self.binary_source,
+                                      self.placement_type, self.reference_version)
+        if calibrated:
+            self.reference = {key: {self.metric: calibrated}}
+        elif system in REFERENCE_VALUES:
+            # Set benchmark-specific reference values
+            if table in REFERENCE_VALUES[system]:
+                ref = placement_references(REFERENCE_VALUES[system][table][self.binary_source],
+                                           self.placement_type, PLACEMENT_REFERENCE_ALIASES)
+                if ref:
+                    self.reference = {key: {self.metric: ref}}
+        
+        # Sweep perf variables have their own references, where recorded
+        if self.sweep_range:
+            sweep_refs = placement_references(SWEEP_REFERENCE_VALUES.get(system, {})
+                                              .get(table, {})
+                                              .get(self.binary_source, {}),
+                                              self.placement_type, PLACEMENT_REFERENCE_ALIASES) or {}
+            self.reference.setdefault(key, {}).update({
+                name: ref for name, ref in sweep_refs.items() if name in self.perf_variables
+            })
         # print(f"Reference {self.reference}")   
 
 @rfm.simple_test
 class OSUPlacementTest(OSUMicroBenchmarkBase):
-    """Tests process placement using numactl mechanism"""
+    """Tests process placement using the in-process affinity launcher"""
     
-    placement_type = parameter([
-        'same_numa',
-        'diff_numa_same_socket', 
-        'diff_socket_same_node', 
-        'diff_node'
-    ])
+    # Intra-node distance classes published by the last whole-node hardware
+    # detection on this cluster (falls back to the NUMA/socket cases)
+    placement_type = parameter(load_placement_classes() + ['diff_node'])
 
     @run_after('setup')
     def set_placement_references(self):
@@ -162,74 +509,237 @@ class OSUPlacementTest(OSUMicroBenchmarkBase):
         source_script = os.path.expanduser('~/hpc-project/scripts/2.Hardware-Detection.sh')    
 
         self.prerun_cmds.extend([
-            '# Create private copies of hardware detection script in stage directory',
-            f'cp {source_script} ./hw-detect.sh',
-            'chmod 755 ./hw-detect.sh',
             'echo "====== Available NUMA nodes on this host ======"',
             'numactl -H | grep "^node" || echo "No NUMA information available"',
-            'echo "Generating binding scripts in stage directory..."',
-            './hw-detect.sh --generate-scripts',
-            'echo "Verifying binding scripts were generated:"',
-            'ls -la ./bind_*.sh || echo "Failed to generate binding scripts"',
-            'chmod 755 ./bind_*.sh 2>/dev/null || echo "No binding scripts to chmod"'
+            '# Topology comes from the shared topology cache keyed by',
+            '# host, boot id and cpuset; only the first job on a node probes it',
+            'echo "Fetching topology from topology cache..."',
+            f'{source_script} --generate-scripts',
+            'ls -la ./topology.json || echo "Failed to fetch topology"'
         ])
         
-        tmp_str = ''
-        if self.placement_type == 'same_numa':            
-            self.num_nodes           = 1               
-            self.num_tasks_per_socket= 2          
-            self.num_tasks_per_node  = 2      
+        # Every rank pins itself in-process (sched_setaffinity + set_mempolicy)
+        # using the cached topology, then execs the benchmark
+        launcher_script = os.path.expanduser('~/hpc-project/scripts/affinity_launcher.py')
+        LAUNCHER = f'python3 {launcher_script} --topology ./topology.json {self.placement_type} --'
+        
+        if self.placement_type == 'diff_node':
+            self.num_nodes           = 2
+            self.num_tasks_per_node  = 1     
             self.num_tasks           = 2
             self.num_cpus_per_task   = 1
-            
-            SRUN_OPTIONS = '-N 1 -c 1 -n 2 --ntasks-per-socket 2 \
-                --distribution=block:block:block'
-                
-            self.job.launcher.options = [    
-                SRUN_OPTIONS,           
-                './bind_same_numa.sh'
+            # Each rank picks its CPU from its own host, so the step must
+            # see the whole second node rather than one arbitrary CPU
+            self.job.options = ['--exclusive']
+                        
+            self.job.launcher.options = [
+                '--distribution=cyclic --whole --cpu-bind=none',
+                LAUNCHER
             ]
             
-        elif self.placement_type == 'diff_numa_same_socket':                       
-            
+        else:
+            # Intra-node placements: the step gets the whole node and the
+            # launcher picks the representative CPU pair for the class
+            self.num_nodes           = 1
+            self.num_tasks_per_node  = 2
+            self.num_tasks           = 2
             self.job.options = ['-N 1 -n 2 --exclusive']
             
-            SRUN_OPTIONS = '-N1 -n2 -c1 --distribution=cyclic'
-            
-            self.job.launcher.options = [    
-                SRUN_OPTIONS,           
-                './bind_diff_numa_same_socket.sh'
-            ]        
+            SRUN_OPTIONS = '-N1 -n2 --whole --cpu-bind=none'
             
-            tmp_str = '--cpu-bind=verbose,map_cpu:0,16'
-    
-        elif self.placement_type == 'diff_socket_same_node':          
-            
-            self.job.options = ['-N 1 -n 2 --exclusive']
-                            
-            SRUN_OPTIONS = '-N1 -n2 --ntasks-per-socket 1'
-                                
-            self.job.launcher.options = [    
+            self.job.launcher.options = [
                 SRUN_OPTIONS,
-                './bind_diff_socket.sh'
+                LAUNCHER
             ]
 
-            tmp_str = f'--cpu-bind=verbose,map_cpu:0,{64 if self.current_system.name == "aion" else 1}'
-            
-        elif self.placement_type == 'diff_node':
-            self.num_nodes           = 2
-            self.num_tasks_per_node  = 1     
-            self.num_tasks           = 2
-            self.num_cpus_per_task   = 1
-                        
-            self.job.launcher.options = [
-                '--distribution=cyclic',
-            ]
-             
-        # Add detailed verification AFTER running benchmark
-        self.postrun_cmds = [
-            'echo "==== Detailed Process Placement Verification (after benchmark) ===="',
-            f'srun -n2 {tmp_str} bash -c \'echo "TASK $SLURM_PROCID on $(hostname): CPU $(taskset -cp $$), NUMA node $(cat /proc/self/status | grep Mems_allowed_list | cut -f2), Socket $(lscpu -p=cpu,socket | grep "^$(taskset -cp $$ | grep -o "[0-9]*$")," | cut -d, -f2)"\'',
-            'echo "==== Verifying process placement ===="',
-            f'srun -n2 {tmp_str} ./hw-detect.sh --verify'
-        ]
\ No newline at end of file
+    @sanity_function
+    def assert_output(self):
+        """Benchmark output plus the placement each rank recorded at exec time"""
+        return sn.all([
+            sn.assert_found(r'# OSU MPI', self.stdout),
+            assert_placement(self.stagedir, self.placement_type, self.num_tasks)
+        ])
+
+
+@rfm.simple_test
+class OSURMAModeTest(OSUPlacementTest):
+    """One-sided benchmarks across OSU window creation and synchronization modes
+    
+    Perf variables are suffixed with '<window>_<sync>' so every combination
+    is tracked and referenced on its own in the perflog.
+    """
+    
+    test_type = parameter(inherit_params=True,
+                          filter_params=lambda params: [p for p in params if p[0] == 'one-sided'])
+    window_mode = parameter(RMA_WINDOW_MODES)
+    sync_mode = parameter(RMA_SYNC_MODES)
+    
+    @run_before('setup')
+    def set_rma_perf_variables(self):
+        """Skip unsupported combinations and tag perf variables with the modes"""
+        supported = RMA_SYNC_SUPPORT.get(self.benchmark, RMA_SYNC_MODES)
+        self.skip_if(self.sync_mode not in supported,
+                     f'{self.benchmark} does not support -s {self.sync_mode}')
+        
+        self.mode_suffix = f'{self.window_mode}_{self.sync_mode}'
+        self.perf_variables = {
+            f'{name}_{self.mode_suffix}': func for name, func in self.perf_variables.items()
+        }
+    
+    @run_before('run')
+    def set_rma_options(self):
+        """Pass the window and synchronization modes to OSU"""
+        self.executable_opts += ['-w', self.window_mode, '-s', self.sync_mode]
+    
+    def set_reference_values(self, is_multi_node=False):
+        """References per window/sync combination from RMA_MODE_REFERENCE_VALUES"""
+        system = self.current_system.name
+        key = f"{system}:{self.current_partition.name}"
+        
+        table = self.benchmark
+        if table not in RMA_MODE_REFERENCE_VALUES.get(system, {}):
+            table = REFERENCE_METRIC_ALIASES.get(self.benchmark)
+        refs = (placement_references(RMA_MODE_REFERENCE_VALUES.get(system, {})
+                                     .get(table, {})
+                                     .get(self.binary_source, {}),
+                                     self.placement_type, PLACEMENT_REFERENCE_ALIASES) or {})
+        refs = refs.get(self.mode_suffix)
+        
+        self.reference = dict()
+        if refs:
+            self.reference = {key: {f'{self.metric}_{self.mode_suffix}': refs}}
+
+
+@rfm.simple_test
+class OSUCollectiveTest(OSUMicroBenchmarkBase):
+    """Collective latency scaling across node counts and ranks per node
+    
+    Every size of the swept table is reported as 'latency_<size>'.  Each
+    configuration larger than the smallest one also depends on the smallest
+    configuration of the same benchmark and binary source and reports
+    'efficiency_<size>' = t_smallest / t_this: 1.0 means the collective
+    got no slower as the job grew, lower values show how much it degrades.
+    """
+    
+    test_type = parameter([('collective', benchmark, 'latency') for benchmark in OSU_COLLECTIVES],
+                          fmt=lambda x: x[1])
+    node_count = parameter(COLLECTIVE_NODE_COUNTS)
+    tasks_per_node = parameter(COLLECTIVE_TASKS_PER_NODE)
+    
+    sweep_range = '1:1048576'
+    time_limit = '30m'
+    
+    @run_after('init')
+    def set_scaling_dependency(self):
+        """Depend on the smallest configuration to derive scaling efficiency"""
+        self.num_tasks_per_node = self.tasks_per_node
+        self.num_tasks = self.node_count * self.tasks_per_node
+        self.tags.add(f"nodes_{self.node_count}")
+        
+        smallest = (min(COLLECTIVE_NODE_COUNTS), min(COLLECTIVE_TASKS_PER_NODE))
+        self.baseline = None
+        if (self.node_count, self.tasks_per_node) == smallest:
+            return
+        
+        variants = OSUCollectiveTest.get_variant_nums(
+            test_type=lambda x: x == self.test_type,
+            binary_source=lambda x: x == self.binary_source,
+            node_count=lambda x: x == smallest[0],
+            tasks_per_node=lambda x: x == smallest[1])
+        self.baseline = OSUCollectiveTest.variant_name(variants[0])
+        self.depends_on(self.baseline, udeps.by_env)
+    
+    @run_before('setup')
+    def set_collective_perf_variables(self):
+        """osu_barrier has no size column, just one average latency"""
+        if self.benchmark == 'osu_barrier':
+            self.perf_variables = {
+                'latency': sn.make_performance_function(self._extract_barrier(), self.unit)
+            }
+    
+    @run_before('run')
+    def set_collective_options(self):
+        if self.benchmark == 'osu_barrier':
+            # The size range does not apply to barriers, and without a size
+            # column there is nothing for the adaptive runner to follow
+            self.executable_opts = ['-x', str(self.num_warmup_iters), '-i', str(self.num_iters)]
+            self.adaptive = False
+    
+    @run_before('performance')
+    def set_scaling_efficiency(self):
+        """Add efficiency_<size> perf variables against the smallest configuration"""
+        if self.baseline is None:
+            return
+        
+        base = self.getdep(self.baseline)
+        base_stdout = os.path.join(base.stagedir, sn.evaluate(base.stdout))
+        if self.benchmark == 'osu_barrier':
+            self.perf_variables['efficiency'] = sn.make_performance_function(
+                ratio(self._extract_barrier(base_stdout), self._extract_barrier()), '')
+            return
+        
+        base_series = self._extract_series(base_stdout)
+        series = self._extract_series()
+        min_size, max_size = map(int, self.sweep_range.split(':'))
+        for size in osu_sizes(min_size, max_size):
+            self.perf_variables[f'efficiency_{size}'] = sn.make_performance_function(
+                ratio(sn.getitem(base_series, size), sn.getitem(series, size)), '')
+    
+    def _extract_barrier(self, stdout=None):
+        return sn.extractsingle(r'^\s*([\d.]+)\s*$', stdout or self.stdout, 1, float)
+
+
+@rfm.simple_test
+class OSUMultiPairTest(OSUPlacementTest):
+    """Aggregate bandwidth and message rate of concurrent pairs with osu_mbw_mr
+    
+    Runs 1, 2, 4, ... pairs, up to a full socket, across the boundary of
+    the placement (NUMA node, socket or node).  One test per pair count, so
+    the perflog holds bandwidth and message-rate curves over 'pairs' that
+    show where the link saturates.
+    """
+    
+    test_type = parameter([('pt2pt', 'osu_mbw_mr', 'bandwidth')], fmt=lambda x: x[1])
+    placement_type = parameter([p for p in load_placement_classes() if p in PAIR_BOUNDARIES]
+                               + ['diff_node'])
+    pairs = parameter(multi_pair_counts('diff_node'))
+    
+    @run_after('init')
+    def skip_oversized_pairs(self):
+        self.skip_if(self.pairs not in multi_pair_counts(self.placement_type),
+                     f'{self.pairs} pairs do not fit across {self.placement_type}')
+        self.tags.add(f"pairs_{self.pairs}")
+    
+    @run_before('setup')
+    def set_message_rate(self):
+        """osu_mbw_mr reports 'size MB/s Messages/s'; keep both columns"""
+        self.perf_variables['message_rate'] = sn.make_performance_function(
+            sn.extractsingle(rf'^{self.test_size}\s+\S+\s+(\S+)', self.stdout, 1, float),
+            'msg/s')
+    
+    @run_before('run')
+    def set_job_options_for_placement(self):
+        """One rank per CPU on each side of the boundary, ranks i and i+pairs paired"""
+        source_script = os.path.expanduser('~/hpc-project/scripts/2.Hardware-Detection.sh')
+        self.prerun_cmds.extend([
+            'echo "Fetching topology from topology cache..."',
+            f'{source_script} --generate-scripts',
+            'ls -la ./topology.json || echo "Failed to fetch topology"'
+        ])
+        
+        launcher_script = os.path.expanduser('~/hpc-project/scripts/affinity_launcher.py')
+        LAUNCHER = (f'python3 {launcher_script} --topology ./topology.json '
+                    f'--pairs {self.pairs} {self.placement_type} --')
+        
+        self.num_tasks = 2 * self.pairs
+        if self.placement_type == 'diff_node':
+            # Block distribution puts ranks 0..pairs-1 on the first node
+            self.num_nodes          = 2
+            self.num_tasks_per_node = self.pairs
+            self.job.options = ['--exclusive']
+            self.job.launcher.options = ['--distribution=block --whole --cpu-bind=none', LAUNCHER]
+        else:
+            self.num_nodes          = 1
+            self.num_tasks_per_node = self.num_tasks
+            self.job.options = [f'-N 1 -n {self.num_tasks} --exclusive']
+            self.job.launcher.options = [f'-N1 -n{self.num_tasks} --whole --cpu-bind=none', LAUNCHER]
@@ -1,207 +1,214 @@
 #!/usr/bin/env python3
 
+import argparse
+import matplotlib
+# Figures are rendered off-screen, in worker processes
+matplotlib.use('Agg')
 import pandas as pd
 import matplotlib.pyplot as plt
 import os
+import sys
 import numpy as np
 import seaborn as sns
+from matplotlib.container import BarContainer
 from matplotlib.gridspec import GridSpec
 
-# Ensure output directory exists
-os.makedirs('../docs/imgs', exist_ok=True)
+# Perflogs are ingested incrementally into a columnar store: only records
+# appended since the last run are parsed (see scripts/results_store.py)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+from results_store import ResultsStore
+from render_cache import FigureTask, render_all
+from regressions import change_report, format_report
+from models import fit_history, format_models, latest_models, loggp
+from significance import cell_intervals, format_tests, pairwise_tests
+from topology import DISTANCE_CLASSES
 
-# Function to parse pipe-delimited OSU benchmark logs
-def parse_osu_logs(log_path):
-    try:
-        # Read the pipe-delimited file
-        df = pd.read_csv(log_path, sep='|')
-        
-        # Clean column names by stripping whitespace
-        df.columns = df.columns.str.strip()
-        
-        # Create a copy for modification
-        result_df = df.copy()
-        
-        # Determine metric type based on unit and create metric column
-        if 'bandwidth_unit' in df.columns:
-            # For rows with bandwidth unit (MB/s)
-            result_df['metric'] = 'bandwidth'
-            result_df['value'] = pd.to_numeric(result_df['bandwidth_value'], errors='coerce')
-            result_df['unit'] = result_df['bandwidth_unit']
-        
-        # Select only the columns we need
-        result_df = result_df[['result', 'system', 'binary_source', 'placement_type', 'metric', 'value', 'unit']]
-        
-        # Add cluster label based on filename
-        cluster = "iris" if "iris" in log_path else "aion"
-        result_df['cluster'] = cluster
-        
-        # To handle test types based on unit (for visualization)
-        # Set rows with "us" unit to be latency measurements 
-        mask_latency = result_df['unit'] == 'us'
-        result_df.loc[mask_latency, 'metric'] = 'latency'       
-        
-        return result_df
-        
-    except Exception as e:
-        print(f"Error parsing {log_path}: {str(e)}")
-        return pd.DataFrame() 
-
-# Paths to log files
+# Paths to log files: ReFrame's and scripts/batch_runner.py's
 iris_log = "perflogs/iris/batch/OSUPlacementTest.log"
 aion_log = "perflogs/aion/batch/OSUPlacementTest.log"
-
-# Parse data from both clusters
-iris_results = parse_osu_logs(iris_log)
-aion_results = parse_osu_logs(aion_log)
-
-# Combine results
-df = pd.concat([iris_results, aion_results])
-df.to_csv('./perflogs/osu_results_combined.csv', index=False)
-# Check if we have data
-if df.empty:
-    print("No data found in log files. Please check paths and log content.")
-    exit(1)
-
-# Print basic statistics to verify data
-print(f"Total results: {len(df)}")
-print("\nResults by cluster:")
-print(df['cluster'].value_counts())
-
-print("\nResults by placement type:")
-print(df['placement_type'].value_counts())
-
-print("\nResults by binary source:")
-print(df['binary_source'].value_counts())
-
-print("\nResults by metric:")
-print(df['metric'].value_counts())
+iris_batch_log = "perflogs/iris/batch/OSUPlacementTest-batch.log"
+aion_batch_log = "perflogs/aion/batch/OSUPlacementTest-batch.log"
+figure_dir = '../docs/imgs'
 
 # Set up plotting style
 plt.style.use('ggplot')
 sns.set_palette("Set2")
 plt.rcParams.update({'font.size': 12})
-# Define consistent order for placement types and binary sources
-placement_order = ['same_numa', 'diff_numa_same_socket', 'diff_socket_same_node', 'diff_node']
+# Define consistent order for placement types and binary sources: every
+# distance class the topology detection can publish (nearest first), then
+# across nodes; each figure keeps the ones present in its data
+placement_order = DISTANCE_CLASSES + ['diff_node']
 binary_order = ['local', 'easybuild', 'eessi']
 placement_labels = {
+    'same_core': 'Same Core',
+    'same_l2': 'Same L2',
+    'same_l3': 'Same L3',
+    'same_die': 'Same Die',
     'same_numa': 'Same NUMA',
     'diff_numa_same_socket': 'Diff NUMA',
     'diff_socket_same_node': 'Diff Socket',
     'diff_node': 'Diff Node'
 }
+# The columns the figures are drawn from; a figure's cache key hashes only these
+plot_columns = ['cluster', 'benchmark', 'metric', 'placement_type', 'binary_source', 'value']
+# Every figure shows a single benchmark.  Those of the headline benchmarks
+# (the ones the reference tables were measured with) keep their plain file
+# names; the others are prefixed with the benchmark name
+headline_benchmarks = {'bandwidth': 'osu_get_bw', 'latency': 'osu_get_latency'}
+
+
+def figure_path(name, benchmark):
+    """Output file of a figure of one benchmark"""
+    if benchmark in headline_benchmarks.values():
+        return f'{figure_dir}/{name}.png'
+    return f'{figure_dir}/{benchmark}_{name}.png'
+
+
+def placements_in(data):
+    """The placement types present in data, in placement_order"""
+    present = set(data['placement_type'].astype(str))
+    return [placement for placement in placement_order if placement in present]
+
+
+def interval_pivot(data, index, columns, index_order=None, column_order=None):
+    """Median of every cell with its bootstrap interval: (median, low, high) pivots
 
-# Create 2x2 grid of plots - bandwidth and latency, for each cluster
-fig, axs = plt.subplots(2, 2, figsize=(16, 12))
-fig.suptitle('OSU Micro-Benchmark Performance by Placement and Binary Source', fontsize=16)
-
-# Plot bandwidth for iris (top-left)
-bw_iris = df[(df['cluster'] == 'iris') & (df['metric'] == 'bandwidth')].copy()
-if not bw_iris.empty:
-    pivot = pd.pivot_table(bw_iris, values='value', index='placement_type', 
-                          columns='binary_source', aggfunc='mean')
-    # Reorder index based on our desired order
-    pivot = pivot.reindex(placement_order)
-    pivot[binary_order].plot(kind='bar', ax=axs[0, 0], rot=0)
-    axs[0, 0].set_title('Bandwidth on Iris')
-    axs[0, 0].set_ylabel('Bandwidth (MB/s)')
-    axs[0, 0].set_ylim(bottom=0)
-    # Use the shorter labels from placement_labels
-    axs[0, 0].set_xticklabels([placement_labels[p] for p in pivot.index])
+    Cells are summarised by their median rather than their mean, so a few
+    outlier runs do not skew the comparison (see scripts/significance.py).
+    The data must hold a single benchmark: cells pooling, say, osu_get_bw
+    and osu_put_bw would hide a change in either.
+    """
+    benchmarks = data['benchmark'].dropna().unique()
+    if len(benchmarks) > 1:
+        raise ValueError(f"interval_pivot of several benchmarks: {', '.join(sorted(map(str, benchmarks)))}")
+    by = ([index] if isinstance(index, str) else list(index)) + [columns]
+    cells = cell_intervals(data, by=by)
+    cells[by] = cells[by].astype(str)
+    pivots = [cells.pivot(index=index, columns=columns, values=name)
+              for name in ['median', 'ci_low', 'ci_high']]
+    if index_order is not None:
+        pivots = [pivot.reindex(index_order) for pivot in pivots]
+    if column_order is not None:
+        pivots = [pivot.reindex(columns=column_order) for pivot in pivots]
+    return tuple(pivots)
+
+
+def error_bars(median, low, high):
+    """Asymmetric yerr of DataFrame.plot: (columns, 2, rows) distances to the bounds"""
+    return np.stack([(median - low).to_numpy().T, (high - median).to_numpy().T], axis=1)
+
+
+def label_bars(ax, fmt, **kwargs):
+    """Value labels on the bars, not on their error bars"""
+    for container in ax.containers:
+        if isinstance(container, BarContainer):
+            ax.bar_label(container, fmt=fmt, **kwargs)
+
+
+def plot_comparison(df, output, benchmarks):
+    """Bandwidth and latency by placement and binary source on both clusters
+
+    `benchmarks` maps 'bandwidth' and 'latency' to the benchmark shown for each.
+    """
+    # Create 2x2 grid of plots - bandwidth and latency, for each cluster
+    fig, axs = plt.subplots(2, 2, figsize=(16, 12))
+    fig.suptitle('OSU Micro-Benchmark Performance by Placement and Binary Source\n'
+                 f"({benchmarks['bandwidth']} and {benchmarks['latency']}; "
+                 'median, 95% bootstrap interval)', fontsize=16)
+    bandwidth = df[(df['metric'] == 'bandwidth') & (df['benchmark'] == benchmarks['bandwidth'])]
+    latency = df[(df['metric'] == 'latency') & (df['benchmark'] == benchmarks['latency'])]
+
+    # Plot bandwidth for iris (top-left)
+    bw_iris = bandwidth[bandwidth['cluster'] == 'iris'].copy()
+    if not bw_iris.empty:
+        # Medians with their bootstrap intervals, in our desired order
+        pivot, low, high = interval_pivot(bw_iris, 'placement_type', 'binary_source',
+                                          placements_in(bw_iris), binary_order)
+        pivot.plot(kind='bar', ax=axs[0, 0], rot=0, yerr=error_bars(pivot, low, high), capsize=3)
+        axs[0, 0].set_title('Bandwidth on Iris')
+        axs[0, 0].set_ylabel('Bandwidth (MB/s)')
+        axs[0, 0].set_ylim(bottom=0)
+        # Use the shorter labels from placement_labels
+        axs[0, 0].set_xticklabels([placement_labels[p] for p in pivot.index])
     
-# Plot bandwidth for aion (top-right)
-bw_aion = df[(df['cluster'] == 'aion') & (df['metric'] == 'bandwidth')].copy()
-if not bw_aion.empty:
-    pivot = pd.pivot_table(bw_aion, values='value', index='placement_type', 
-                          columns='binary_source', aggfunc='mean')
-    pivot = pivot.reindex(placement_order)
-    pivot[binary_order].plot(kind='bar', ax=axs[0, 1], rot=0)
-    axs[0, 1].set_title('Bandwidth on Aion')
-    axs[0, 1].set_ylabel('Bandwidth (MB/s)')
-    axs[0, 1].set_ylim(bottom=0)
-    # Use the shorter labels from placement_labels
-    axs[0, 1].set_xticklabels([placement_labels[p] for p in pivot.index])
-
-# Plot latency for iris (bottom-left)
-lat_iris = df[(df['cluster'] == 'iris') & (df['metric'] == 'latency')].copy()
-if not lat_iris.empty:
-    pivot = pd.pivot_table(lat_iris, values='value', index='placement_type', 
-                          columns='binary_source', aggfunc='mean')
-    pivot = pivot.reindex(placement_order)
-    pivot[binary_order].plot(kind='bar', ax=axs[1, 0], rot=0)
-    axs[1, 0].set_title('Latency on Iris')
-    axs[1, 0].set_ylabel('Latency (μs)')
-    axs[1, 0].set_ylim(bottom=0)
-    # Use the shorter labels from placement_labels
-    axs[1, 0].set_xticklabels([placement_labels[p] for p in pivot.index])
-
-# Plot latency for aion (bottom-right)
-lat_aion = df[(df['cluster'] == 'aion') & (df['metric'] == 'latency')].copy()
-if not lat_aion.empty:
-    pivot = pd.pivot_table(lat_aion, values='value', index='placement_type', 
-                          columns='binary_source', aggfunc='mean')
-    pivot = pivot.reindex(placement_order)
-    pivot[binary_order].plot(kind='bar', ax=axs[1, 1], rot=0)
-    axs[1, 1].set_title('Latency on Aion')
-    axs[1, 1].set_ylabel('Latency (μs)')
-    axs[1, 1].set_ylim(bottom=0)
-    # Use the shorter labels from placement_labels
-    axs[1, 1].set_xticklabels([placement_labels[p] for p in pivot.index])
-
-# Add legend and adjust layout
-handles, labels = axs[0, 0].get_legend_handles_labels()
-fig.legend(handles, labels, loc='upper center', bbox_to_anchor=(0.5, 0.06), ncol=3)
-
-for ax in axs.flat:
-    if hasattr(ax, 'legend_') and ax.legend_:
-        ax.legend_.remove()  # Remove individual legends
-
-plt.tight_layout(rect=[0, 0.08, 1, 0.95])
-plt.savefig('../docs/imgs/osu_performance_comparison.png', dpi=300)
-
-# Create heatmaps for a more intuitive visualization of placement impact
-for cluster_name in df['cluster'].unique():
-    # Bandwidth heatmap
-    plt.figure(figsize=(10, 8))
-    bw_data = df[(df['cluster'] == cluster_name) & (df['metric'] == 'bandwidth')].copy()
-    if not bw_data.empty:
-        pivot = pd.pivot_table(bw_data, values='value', 
-                             index='placement_type', columns='binary_source',
-                             aggfunc='mean')
-        pivot = pivot.reindex(placement_order)
-        
-        sns.heatmap(pivot, annot=True, fmt='.1f', cmap='YlGnBu')
-        plt.title(f'Bandwidth Performance Heatmap - {cluster_name.capitalize()}')
-        plt.tight_layout()
-        plt.savefig(f'../docs/imgs/bandwidth_heatmap_{cluster_name}.png', dpi=300)
-        
-    # Latency heatmap
+    # Plot bandwidth for aion (top-right)
+    bw_aion = bandwidth[bandwidth['cluster'] == 'aion'].copy()
+    if not bw_aion.empty:
+        pivot, low, high = interval_pivot(bw_aion, 'placement_type', 'binary_source',
+                                          placements_in(bw_aion), binary_order)
+        pivot.plot(kind='bar', ax=axs[0, 1], rot=0, yerr=error_bars(pivot, low, high), capsize=3)
+        axs[0, 1].set_title('Bandwidth on Aion')
+        axs[0, 1].set_ylabel('Bandwidth (MB/s)')
+        axs[0, 1].set_ylim(bottom=0)
+        # Use the shorter labels from placement_labels
+        axs[0, 1].set_xticklabels([placement_labels[p] for p in pivot.index])
+
+    # Plot latency for iris (bottom-left)
+    lat_iris = latency[latency['cluster'] == 'iris'].copy()
+    if not lat_iris.empty:
+        pivot, low, high = interval_pivot(lat_iris, 'placement_type', 'binary_source',
+                                          placements_in(lat_iris), binary_order)
+        pivot.plot(kind='bar', ax=axs[1, 0], rot=0, yerr=error_bars(pivot, low, high), capsize=3)
+        axs[1, 0].set_title('Latency on Iris')
+        axs[1, 0].set_ylabel('Latency (μs)')
+        axs[1, 0].set_ylim(bottom=0)
+        # Use the shorter labels from placement_labels
+        axs[1, 0].set_xticklabels([placement_labels[p] for p in pivot.index])
+
+    # Plot latency for aion (bottom-right)
+    lat_aion = latency[latency['cluster'] == 'aion'].copy()
+    if not lat_aion.empty:
+        pivot, low, high = interval_pivot(lat_aion, 'placement_type', 'binary_source',
+                                          placements_in(lat_aion), binary_order)
+        pivot.plot(kind='bar', ax=axs[1, 1], rot=0, yerr=error_bars(pivot, low, high), capsize=3)
+        axs[1, 1].set_title('Latency on Aion')
+        axs[1, 1].set_ylabel('Latency (μs)')
+        axs[1, 1].set_ylim(bottom=0)
+        # Use the shorter labels from placement_labels
+        axs[1, 1].set_xticklabels([placement_labels[p] for p in pivot.index])
+
+    # Add legend and adjust layout
+    handles, labels = axs[0, 0].get_legend_handles_labels()
+    fig.legend(handles, labels, loc='upper center', bbox_to_anchor=(0.5, 0.06), ncol=3)
+
+    for ax in axs.flat:
+        if hasattr(ax, 'legend_') and ax.legend_:
+            ax.legend_.remove()  # Remove individual legends
+
+    plt.tight_layout(rect=[0, 0.08, 1, 0.95])
+    plt.savefig(output, dpi=300)
+
+
+def plot_heatmap(data, output, cluster_name, metric_name, benchmark, fmt, cmap):
+    """Heatmap of one metric on one cluster, for an intuitive view of placement impact"""
     plt.figure(figsize=(10, 8))
-    lat_data = df[(df['cluster'] == cluster_name) & (df['metric'] == 'latency')].copy()
-    if not lat_data.empty:
-        pivot = pd.pivot_table(lat_data, values='value', 
-                             index='placement_type', columns='binary_source',
-                             aggfunc='mean')
-        pivot = pivot.reindex(placement_order)
-        
-        sns.heatmap(pivot, annot=True, fmt='.2f', cmap='YlOrRd_r')
-        plt.title(f'Latency Performance Heatmap - {cluster_name.capitalize()}')
-        plt.tight_layout()
-        plt.savefig(f'../docs/imgs/latency_heatmap_{cluster_name}.png', dpi=300)
+    pivot, low, high = interval_pivot(data, 'placement_type', 'binary_source', placements_in(data))
+    
+    # Annotate every median with its bootstrap interval
+    labels = pivot.map(lambda value: format(value, fmt))
+    has_interval = low.notna() & high.notna()
+    labels[has_interval] = (labels + '\n[' + low.map(lambda value: format(value, fmt)) + ', '
+                            + high.map(lambda value: format(value, fmt)) + ']')[has_interval]
+    sns.heatmap(pivot, annot=labels, fmt='', cmap=cmap)
+    plt.title(f'{metric_name.capitalize()} Performance Heatmap - {cluster_name.capitalize()}\n'
+              f'({benchmark}; median, 95% bootstrap interval)')
+    plt.tight_layout()
+    plt.savefig(output, dpi=300)
+
 
 # IMPROVED PLOTS: Installation method comparison across clusters and placement types
 
-# 1. Grouped bar chart for binary source comparison
-for metric_name in ['bandwidth', 'latency']:
-    fig, axes = plt.subplots(2, 2, figsize=(16, 12))
-    fig.suptitle(f'{metric_name.capitalize()} Performance by Installation Method', fontsize=16)
-    
-    metric_data = df[df['metric'] == metric_name].copy()
-    if metric_data.empty:
-        continue
+
+def plot_by_installation(metric_data, output, metric_name, benchmark):
+    """1. Grouped bar chart for binary source comparison"""
+    placements = placements_in(metric_data)
+    rows = (len(placements) + 1) // 2
+    fig, axes = plt.subplots(rows, 2, figsize=(16, 6 * rows), squeeze=False)
+    fig.suptitle(f'{metric_name.capitalize()} Performance by Installation Method ({benchmark})',
+                 fontsize=16)
     
     # Use a subplot for each placement type
-    for i, placement in enumerate(placement_order):
+    for i, placement in enumerate(placements):
         row, col = divmod(i, 2)
         ax = axes[row, col]
         
@@ -210,13 +217,12 @@ for metric_name in ['bandwidth', 'latency']:
         if place_data.empty:
             continue
             
-        # Create grouped bar chart
-        pivot = pd.pivot_table(place_data, values='value', 
-                             columns='cluster', index='binary_source',
-                             aggfunc='mean')
+        # Create grouped bar chart of the medians with their bootstrap intervals
+        pivot, low, high = interval_pivot(place_data, 'binary_source', 'cluster')
         
         colors = ['#1f77b4', '#ff7f0e']  # Blue for iris, orange for aion
-        pivot.plot(kind='bar', ax=ax, rot=0, color=colors)
+        pivot.plot(kind='bar', ax=ax, rot=0, color=colors, yerr=error_bars(pivot, low, high),
+                   capsize=3)
         
         ax.set_title(f'{placement_labels[placement]}')
         if metric_name == 'bandwidth':
@@ -226,21 +232,22 @@ for metric_name in ['bandwidth', 'latency']:
         ax.set_ylim(bottom=0)
         
         # Add value labels on top of bars
-        for container in ax.containers:
-            ax.bar_label(container, fmt='%.1f', fontsize=9)
+        label_bars(ax, '%.1f', fontsize=9)
+    
+    # An odd number of placements leaves the last panel empty
+    for ax in axes.flat[len(placements):]:
+        ax.axis('off')
     
     plt.tight_layout(rect=[0, 0.03, 1, 0.95])
-    plt.savefig(f'../docs/imgs/{metric_name}_by_installation.png', dpi=300)
+    plt.savefig(output, dpi=300)
 
-# 2. Radar chart to visualize placement impact
-for metric_name in ['bandwidth', 'latency']:
-    metric_data = df[df['metric'] == metric_name].copy()
-    if metric_data.empty:
-        continue
-        
+
+def plot_radar(metric_data, output, metric_name, benchmark):
+    """2. Radar chart to visualize placement impact"""
     # Create a figure with multiple radar plots - one for each binary source
     fig = plt.figure(figsize=(15, 10))
-    fig.suptitle(f'{metric_name.capitalize()} by Process Placement', fontsize=16)
+    fig.suptitle(f'{metric_name.capitalize()} by Process Placement ({benchmark})', fontsize=16)
+    placements = placements_in(metric_data)
     
     for i, binary in enumerate(binary_order):
         # Create radar chart in a grid
@@ -251,21 +258,11 @@ for metric_name in ['bandwidth', 'latency']:
         if bin_data.empty:
             continue
             
-        # Create pivot table with all placement types
-        pivot = pd.pivot_table(bin_data, values='value', 
-                             columns='cluster', index='placement_type',
-                             aggfunc='mean')
-        
-        # Ensure all placement types are included
-        for placement in placement_order:
-            if placement not in pivot.index:
-                pivot.loc[placement] = np.nan
-                
-        # Reindex to ensure consistent order
-        pivot = pivot.reindex(placement_order)
+        # Medians and bootstrap intervals of all placement types, in a consistent order
+        pivot, low, high = interval_pivot(bin_data, 'placement_type', 'cluster', placements)
         
         # Number of categories
-        N = len(placement_order)
+        N = len(placements)
         
         # Create radar angles
         angles = [n / float(N) * 2 * np.pi for n in range(N)]
@@ -276,27 +273,25 @@ for metric_name in ['bandwidth', 'latency']:
             values = pivot[col].tolist()
             values += values[:1]  # Close the loop
             
-            # Plot values
+            # Plot values, shading their bootstrap interval
             ax.plot(angles, values, color=color, linewidth=2, label=col)
-            ax.fill(angles, values, color=color, alpha=0.25)
+            ax.fill_between(angles, low[col].tolist() + low[col].tolist()[:1],
+                            high[col].tolist() + high[col].tolist()[:1], color=color, alpha=0.25)
         
         # Set radar chart labels
         ax.set_xticks(angles[:-1])
-        ax.set_xticklabels([placement_labels[p] for p in placement_order])
+        ax.set_xticklabels([placement_labels[p] for p in placements])
         ax.set_title(f'{binary.capitalize()}')
         
         # Add legend
         ax.legend(loc='upper right', bbox_to_anchor=(0.1, 0.1))
     
     plt.tight_layout()
-    plt.savefig(f'../docs/imgs/{metric_name}_radar_chart.png', dpi=300)
+    plt.savefig(output, dpi=300)
 
-# 3. Comprehensive comparison across all dimensions
-for metric_name in ['bandwidth', 'latency']:
-    metric_data = df[df['metric'] == metric_name].copy()
-    if metric_data.empty:
-        continue
-    
+
+def plot_comprehensive(metric_data, output, metric_name, benchmark):
+    """3. Comprehensive comparison across all dimensions"""
     # Create a figure with GridSpec for flexible layout
     fig = plt.figure(figsize=(16, 12))
     gs = GridSpec(2, 2, figure=fig)
@@ -304,22 +299,16 @@ for metric_name in ['bandwidth', 'latency']:
     # Main plot - all combinations
     ax_main = fig.add_subplot(gs[0, :])
     
-    # Create a grouped bar chart with hierarchical indexing
-    pivot = pd.pivot_table(metric_data, values='value', 
-                         columns=['cluster'], 
-                         index=['placement_type', 'binary_source'],
-                         aggfunc='mean')
-    
-    # Reindex to ensure consistent order
-    idx = pd.MultiIndex.from_product([placement_order, binary_order], 
+    # Create a grouped bar chart with hierarchical indexing, in a consistent order
+    idx = pd.MultiIndex.from_product([placements_in(metric_data), binary_order], 
                                    names=['placement_type', 'binary_source'])
-    pivot = pivot.reindex(idx)
+    pivot, low, high = interval_pivot(metric_data, ['placement_type', 'binary_source'], 'cluster', idx)
     
-    # Plot
-    pivot.plot(kind='bar', ax=ax_main)
+    # Plot the medians with their bootstrap intervals
+    pivot.plot(kind='bar', ax=ax_main, yerr=error_bars(pivot, low, high), capsize=2)
     
     # Format main plot
-    ax_main.set_title(f'Complete {metric_name.capitalize()} Comparison')
+    ax_main.set_title(f'Complete {metric_name.capitalize()} Comparison ({benchmark})')
     ax_main.set_ylabel(f'{metric_name.capitalize()} {"(MB/s)" if metric_name=="bandwidth" else "(μs)"}')
     ax_main.set_xticklabels([f"{placement_labels[p]}\n{b}" for p, b in pivot.index])
     
@@ -335,20 +324,153 @@ for metric_name in ['bandwidth', 'latency']:
         ax_ratio.axhline(y=1, linestyle='--', color='black', alpha=0.5)
         ax_ratio.set_xticklabels([f"{placement_labels[p]}\n{b}" for p, b in ratio.index], rotation=90)
     
-    # Bottom right - mean performance by binary source
+    # Bottom right - median performance by binary source
     ax_binary = fig.add_subplot(gs[1, 1])
-    binary_means = pd.pivot_table(metric_data, values='value', 
-                                columns='cluster', index='binary_source',
-                                aggfunc='mean')
-    binary_means.plot(kind='bar', ax=ax_binary)
-    ax_binary.set_title('Average Performance by Binary Source')
+    binary_medians, low, high = interval_pivot(metric_data, 'binary_source', 'cluster')
+    binary_medians.plot(kind='bar', ax=ax_binary, yerr=error_bars(binary_medians, low, high),
+                        capsize=3)
+    ax_binary.set_title('Median Performance by Binary Source')
     ax_binary.set_ylabel(f'{metric_name.capitalize()} {"(MB/s)" if metric_name=="bandwidth" else "(μs)"}')
     
     # Add value labels
-    for container in ax_binary.containers:
-        ax_binary.bar_label(container, fmt='%.1f')
+    label_bars(ax_binary, '%.1f')
     
     plt.tight_layout()
-    plt.savefig(f'../docs/imgs/{metric_name}_comprehensive.png', dpi=300)
+    plt.savefig(output, dpi=300)
+
+
+def plot_model_history(history, output):
+    """Fitted startup latency and asymptotic bandwidth of every sweep over time"""
+    fig, axes = plt.subplots(2, 1, figsize=(16, 12), sharex=True)
+    fig.suptitle('Hockney Model Parameters over Time', fontsize=16)
+    
+    for name, fits in history.groupby(['cluster', 'binary_source', 'placement_type', 'benchmark'],
+                                      observed=True):
+        label = '/'.join(name)
+        axes[0].plot(fits['time'], fits['alpha_us'], marker='o', label=label)
+        axes[1].plot(fits['time'], fits['bandwidth_mbs'], marker='o', label=label)
+    
+    axes[0].set_ylabel('Startup latency α (μs)')
+    axes[1].set_ylabel('Asymptotic bandwidth (MB/s)')
+    for ax in axes:
+        ax.set_ylim(bottom=0)
+    axes[0].legend(loc='upper left', bbox_to_anchor=(1.01, 1), fontsize=9)
+    
+    plt.tight_layout()
+    plt.savefig(output, dpi=300)
+
+
+def figure_tasks(df, model_history=None):
+    """One task per figure, each with the slice of the results it plots
+
+    Every figure but the model history shows a single benchmark.
+    """
+    data = df[plot_columns]
+    headline = data[data['benchmark'].isin(headline_benchmarks.values())]
+    tasks = [FigureTask(plot_comparison, headline, f'{figure_dir}/osu_performance_comparison.png',
+                        {'benchmarks': headline_benchmarks})]
+    
+    if model_history is not None and not model_history.empty:
+        history = model_history[['cluster', 'binary_source', 'placement_type', 'benchmark',
+                                 'time', 'alpha_us', 'bandwidth_mbs']].dropna()
+        tasks.append(FigureTask(plot_model_history, history, f'{figure_dir}/model_history.png', {}))
+
+    heatmap_styles = {'bandwidth': ('.1f', 'YlGnBu'), 'latency': ('.2f', 'YlOrRd_r')}
+    for (benchmark, metric_name), metric_data in data.groupby(['benchmark', 'metric'], observed=True):
+        if metric_name not in heatmap_styles or metric_data.empty:
+            continue
+        fmt, cmap = heatmap_styles[metric_name]
+        for cluster_name in metric_data['cluster'].unique():
+            cluster_data = metric_data[metric_data['cluster'] == cluster_name]
+            tasks.append(FigureTask(plot_heatmap, cluster_data,
+                                    figure_path(f'{metric_name}_heatmap_{cluster_name}', benchmark),
+                                    {'cluster_name': cluster_name, 'metric_name': metric_name,
+                                     'benchmark': benchmark, 'fmt': fmt, 'cmap': cmap}))
+
+        for func, suffix in [(plot_by_installation, 'by_installation'),
+                             (plot_radar, 'radar_chart'),
+                             (plot_comprehensive, 'comprehensive')]:
+            tasks.append(FigureTask(func, metric_data, figure_path(f'{metric_name}_{suffix}', benchmark),
+                                    {'metric_name': metric_name, 'benchmark': benchmark}))
+    return tasks
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Analyze OSU benchmark results and plot them")
+    parser.add_argument('--jobs', '-j', type=int, default=None,
+                        help="figures rendered in parallel (default: one per CPU)")
+    parser.add_argument('--force', action='store_true',
+                        help="redraw every figure, even if its data did not change")
+    args = parser.parse_args()
+
+    # Ensure output directory exists
+    os.makedirs(figure_dir, exist_ok=True)
+
+    # Ingest new records from both clusters and load all stored results
+    store = ResultsStore()
+    new_records = 0
+    for log_path in [iris_log, aion_log, iris_batch_log, aion_batch_log]:
+        try:
+            new_records += store.ingest(log_path)
+        except Exception as e:
+            print(f"Error parsing {log_path}: {str(e)}")
+    df = store.read(['iris', 'aion'])
+    print(f"{new_records} new records ingested into {store.store_dir}")
+
+    # The combined CSV only changes when new records came in
+    combined_csv = './perflogs/osu_results_combined.csv'
+    if new_records or not os.path.exists(combined_csv):
+        df.to_csv(combined_csv, index=False)
+
+    # Check if we have data
+    if df.empty:
+        print("No data found in log files. Please check paths and log content.")
+        return 1
+
+    # Print basic statistics to verify data
+    print(f"Total results: {len(df)}")
+    print("\nResults by cluster:")
+    print(df['cluster'].value_counts())
+
+    print("\nResults by placement type:")
+    print(df['placement_type'].value_counts())
+
+    print("\nResults by binary source:")
+    print(df['binary_source'].value_counts())
+
+    print("\nResults by metric:")
+    print(df['metric'].value_counts())
+
+    # Step changes in the history of every series (see scripts/regressions.py)
+    print("\nChange points:")
+    print(format_report(change_report(df), top=10))
+
+    # Medians with bootstrap intervals and pairwise tests between the binary
+    # sources of every placement (see scripts/significance.py)
+    cell_intervals(df).to_csv('./perflogs/osu_intervals.csv', index=False)
+    tests = pairwise_tests(df)
+    tests.to_csv('./perflogs/osu_significance.csv', index=False)
+    print("\nBinary sources compared:")
+    print(format_tests(tests))
+
+    # Hockney / LogGP models of the message-size sweeps (see scripts/models.py)
+    sweeps = store.read_sweeps(['iris', 'aion'])
+    model_history = fit_history(sweeps)
+    if not model_history.empty:
+        latest = latest_models(model_history)
+        print("\nModels of the message-size sweeps:")
+        print(format_models(latest, loggp(sweeps, latest)))
+        model_history.to_csv('./perflogs/osu_models.csv', index=False)
+
+    # Every figure is an independent task; only those whose data, parameters
+    # or plotting code changed since the last run are redrawn
+    rendered, skipped, failed = render_all(figure_tasks(df, model_history),
+                                           jobs=args.jobs, force=args.force)
+    print(f"\n{len(rendered)} figures rendered, {len(skipped)} unchanged, {len(failed)} failed")
+
+    print("\nAnalysis complete. Enhanced plots saved to ../docs/imgs/ directory.")
+    return 1 if failed else 0
+
 
-print("\nAnalysis complete. Enhanced plots saved to ../docs/imgs/ directory.")
\ No newline at end of file
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,4 +1,6 @@
-# Reference values by system, binding type, and binary source
+# Reference values by system, benchmark, binary source and binding type.
+# A benchmark without its own table falls back to REFERENCE_METRIC_ALIASES;
+# benchmarks with neither run without a reference.
 REFERENCE_VALUES = {
     'aion': {
         'latency': {
@@ -99,6 +101,68 @@ REFERENCE_VALUES = {
     }
 }
 
+# OSU benchmarks by family (the libexec/osu-micro-benchmarks/mpi/<family>
+# directory they live in), each with the metric its table reports
+OSU_BENCHMARKS = {
+    'pt2pt': [
+        ('osu_latency', 'latency'),
+        ('osu_bw', 'bandwidth'),
+        ('osu_bibw', 'bandwidth'),
+        ('osu_latency_mt', 'latency'),
+    ],
+    'one-sided': [
+        ('osu_get_latency', 'latency'),
+        ('osu_get_bw', 'bandwidth'),
+        ('osu_put_latency', 'latency'),
+        ('osu_put_bw', 'bandwidth'),
+        ('osu_put_bibw', 'bandwidth'),
+        ('osu_acc_latency', 'latency'),
+    ],
+}
+
+# The 'latency' and 'bandwidth' tables above were measured with the
+# one-sided get benchmarks
+REFERENCE_METRIC_ALIASES = {
+    'osu_get_latency': 'latency',
+    'osu_get_bw': 'bandwidth',
+}
+
+# Distance classes finer than a NUMA node (scripts/topology.py) have no rows
+# of their own in the tables here; they use the references of the NUMA node
+# they sit in
+PLACEMENT_REFERENCE_ALIASES = {
+    'same_core': 'same_numa',
+    'same_l2': 'same_numa',
+    'same_l3': 'same_numa',
+    'same_die': 'same_numa',
+}
+
+# References for sweep-mode perf variables ('<metric>_<size>' or
+# '<metric>_<bucket>'), by system, benchmark (or metric alias as above),
+# binary source and placement type.
+# Example:
+#   'aion': {'latency': {'local': {'same_numa': {
+#       'latency_8192': (1.05, -0.05, 0.05, 'us'),
+#       'latency_16384': (1.90, -0.05, 0.05, 'us')}}}}
+SWEEP_REFERENCE_VALUES = {}
+
+# References for OSURMAModeTest, by system, benchmark (or metric alias),
+# binary source, placement type and '<window>_<sync>' mode combination.
+# Example:
+#   'aion': {'osu_put_latency': {'eessi': {'same_numa': {
+#       'allocate_flush': (0.18, -0.05, 0.05, 'us'),
+#       'dynamic_pscw': (1.40, -0.05, 0.05, 'us')}}}}
+RMA_MODE_REFERENCE_VALUES = {}
+
+# OSU version and toolchain behind each binary source (matching the modules
+# below); together with the cluster they key the OSU binary index
+# (scripts/osu_index.py)
+OSU_BUILDS = {
+    'local': ('7.2', 'foss-2023b'),
+    'easybuild': ('7.5', 'gompi-2023b'),
+    'eessi': ('7.2', 'gompi-2023b'),
+}
+
 MODULE_CONFIGS = {
             'local': [
                 'module load env/testing/2023b || echo "Warning: Could not load env module"',
@@ -4,14 +4,23 @@ module load devel/ReFrame/4.7.4-GCCcore-13.2.0
 
 CLUSTER_NAME=$(hostname -f | cut -d. -f1 | cut -d- -f1)
 
+# --resume keeps the perflogs and only reruns cases without a passing
+# record from the last 24 hours (see scripts/resume.py)
+RESUME_ARGS=""
+if [ "$1" == "--resume" ]; then
+    RESUME_ARGS="-S resume=true"
+fi
+
 # rm -rf ~/hpc-project/scripts/bind_*.sh
 rm -rf ~/hpc-project/reframe-output/*
 rm -rf ~/hpc-project/tests/stage/$CLUSTER_NAME/*
 rm -rf ~/hpc-project/tests/output/$CLUSTER_NAME/*
-rm -rf ~/hpc-project/tests/perflogs/$CLUSTER_NAME/*
+if [ -z "$RESUME_ARGS" ]; then
+    rm -rf ~/hpc-project/tests/perflogs/$CLUSTER_NAME/*
+fi
 rm -f ~/hpc-project/reports/osu-benchmark.json
 
-reframe --config-file ulhpc.py --checkpath 4.1-OSU-BENCHMARK-ONESIDE-TEST.py --name 'OSUPlacementTest' --run --report-file=reports/osu-benchmark-$CLUSTER_NAME.json
+reframe --config-file ulhpc.py --checkpath 4.1-OSU-BENCHMARK-ONESIDE-TEST.py --name 'OSUPlacementTest' --run $RESUME_ARGS --report-file=reports/osu-benchmark-$CLUSTER_NAME.json
 
 
 module load lang/Python/3.11.5-GCCcore-13.2.0
@@ -0,0 +1,5 @@
+"""Unit tests of the helper scripts: run with `python -m pytest tests/unit`"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'scripts'))
@@ -0,0 +1,59 @@
+import re
+import sys
+
+from adaptive_runner import confidence_interval, main, strip_batch_options
+
+# Prints an OSU-like table whose value at every size is 10 us times a random
+# factor of +-NOISE, after echoing its arguments
+FAKE_OSU = """
+import os, random, sys
+print('# OSU MPI Latency Test v7.2')
+print('# args ' + ' '.join(sys.argv[1:]))
+size = int(sys.argv[sys.argv.index('-m') + 1].split(':')[0])
+noise = float(os.environ.get('NOISE', '0'))
+print(f'{size:<10}{10.0 * (1 + random.uniform(-noise, noise)):>18.2f}')
+"""
+
+
+def run(tmp_path, capsys, monkeypatch, noise, max_batches=8):
+    fake = tmp_path / 'fake_osu.py'
+    fake.write_text(FAKE_OSU)
+    monkeypatch.setenv('NOISE', str(noise))
+    status = main(['--size', '8192', '--target', '0.02', '--budget', '60',
+                   '--batch-iters', '50', '--max-batches', str(max_batches),
+                   '--', sys.executable, str(fake), '-m', '8192', '-x', '10', '-i', '1000', '-f'])
+    out = capsys.readouterr().out
+    assert status == 0
+    summary = re.search(r'^# Adaptive result: (.*)$', out, re.MULTILINE).group(1)
+    return out, dict(item.split('=') for item in summary.split())
+
+
+def test_stable_benchmark_stops_after_min_batches(tmp_path, capsys, monkeypatch):
+    out, result = run(tmp_path, capsys, monkeypatch, noise=0)
+    assert result['stop'] == 'converged'
+    assert result['batches'] == '3'
+    assert result['iterations'] == '150'
+    # The final OSU-style line keeps the usual extraction working
+    assert re.search(r'^8192\s+10\.00$', out, re.MULTILINE)
+
+
+def test_noisy_benchmark_runs_to_the_batch_cap(tmp_path, capsys, monkeypatch):
+    _, result = run(tmp_path, capsys, monkeypatch, noise=0.5, max_batches=8)
+    assert result['stop'] == 'max_batches'
+    assert result['batches'] == '8'
+    assert float(result['rel_width']) > 0.02
+
+
+def test_runner_replaces_the_commands_own_batch_options(tmp_path, capsys, monkeypatch):
+    out, _ = run(tmp_path, capsys, monkeypatch, noise=0)
+    assert '# batch 1 | # args -f -m 8192:8192 -x 10 -i 50' in out
+
+
+def test_strip_batch_options_keeps_other_options():
+    assert strip_batch_options(['osu_get_bw', '-m', '8', '-w', 'create', '-i', '5', '-x', '1']) == [
+        'osu_get_bw', '-w', 'create']
+
+
+def test_confidence_interval_of_constant_samples_has_zero_width():
+    mean, low, high = confidence_interval([2.0, 2.0, 2.0])
+    assert (mean, low, high) == (2.0, 2.0, 2.0)
@@ -0,0 +1,103 @@
+import json
+import os
+import socket
+import subprocess
+import sys
+
+from affinity_launcher import read_placement_records, verify_placement
+from topology import Topology
+
+LAUNCHER = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'scripts',
+                        'affinity_launcher.py')
+# A CPU id no cpuset contains
+FOREIGN_CPU = 100000
+
+
+def single_numa_topology(cpus):
+    return Topology({cpu: {'core': cpu, 'socket': 0, 'die': 0, 'node': 0, 'l2': None, 'l3': None}
+                     for cpu in cpus})
+
+
+def launch(tmp_path, topology, rank, placement='same_numa'):
+    path = tmp_path / 'topology.json'
+    path.write_text(json.dumps(topology.to_dict()))
+    env = dict(os.environ, SLURM_PROCID=str(rank))
+    return subprocess.run(
+        [sys.executable, LAUNCHER, '--topology', str(path), '--record-dir', str(tmp_path),
+         placement, '--', sys.executable, '-c',
+         'import os; print("mask", sorted(os.sched_getaffinity(0)))'],
+        env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+
+
+def test_launcher_pins_rank_and_records_placement(tmp_path):
+    allowed = sorted(os.sched_getaffinity(0))
+    # Rank 0 takes the lower CPU of the pair; rank 1 only runs if it is ours too
+    pair = allowed[:2] if len(allowed) > 1 else [allowed[0], FOREIGN_CPU]
+    topology = single_numa_topology(pair)
+
+    ranks = [0, 1] if len(allowed) > 1 else [0]
+    for rank in ranks:
+        result = launch(tmp_path, topology, rank)
+        assert result.returncode == 0, result.stderr
+        assert f"mask [{pair[rank]}]" in result.stdout
+
+    records = read_placement_records(tmp_path)
+    assert [record['rank'] for record in records] == ranks
+    assert records[0]['cpus'] == [pair[0]]
+    assert records[0]['placement'] == 'same_numa'
+    assert records[0]['numa_nodes'] == [0]
+    if len(records) == 1:
+        records.append(dict(records[0], rank=1, cpus=[pair[1]]))
+    assert verify_placement(records, 'same_numa', topology) == []
+
+
+def test_launcher_reports_cpus_outside_the_cpuset(tmp_path):
+    topology = single_numa_topology([FOREIGN_CPU, FOREIGN_CPU + 1])
+    result = launch(tmp_path, topology, 0)
+    assert result.returncode == 1
+    assert 'Error: cannot pin rank 0 for same_numa' in result.stderr
+    assert 'Traceback' not in result.stderr
+    assert read_placement_records(tmp_path) == []
+
+
+def test_diff_node_ranks_pin_within_their_own_cpuset(tmp_path):
+    # topology.json from the first node names CPUs this host does not give us
+    topology = single_numa_topology([FOREIGN_CPU, FOREIGN_CPU + 1])
+    own = min(os.sched_getaffinity(0))
+    for rank in [0, 1]:
+        result = launch(tmp_path, topology, rank, placement='diff_node')
+        assert result.returncode == 0, result.stderr
+        assert f"mask [{own}]" in result.stdout
+    assert [record['cpus'] for record in read_placement_records(tmp_path)] == [[own], [own]]
+
+
+def record(rank, cpu, topology, host=None):
+    info = topology.cpus[cpu]
+    return {'rank': rank, 'host': host or socket.gethostname(), 'cpus': [cpu],
+            'sockets': [info['socket']], 'numa_nodes': [info['node']], 'membind': [info['node']]}
+
+
+def test_verify_placement_rejects_wrong_class_and_unpinned_ranks():
+    cpus = {cpu: {'core': cpu, 'socket': cpu // 2, 'die': cpu // 2, 'node': cpu // 2,
+                  'l2': None, 'l3': None} for cpu in range(4)}
+    topology = Topology(cpus)
+    assert verify_placement([record(0, 0, topology), record(1, 1, topology)],
+                            'same_numa', topology) == []
+
+    problems = verify_placement([record(0, 0, topology), record(1, 2, topology)],
+                                'same_numa', topology)
+    assert problems == ["CPUs 0 and 2 are diff_socket_same_node, expected same_numa"]
+
+    unpinned = dict(record(1, 1, topology), cpus=[1, 2])
+    assert 'not pinned to one CPU' in verify_placement([record(0, 0, topology), unpinned],
+                                                       'same_numa', topology)[0]
+    assert verify_placement([record(0, 0, topology)], 'same_numa', topology) == [
+        "expected 2 placement records, found 1"]
+
+
+def test_verify_placement_diff_node_needs_two_hosts():
+    topology = single_numa_topology([0, 1])
+    same_host = [record(0, 0, topology, 'n1'), record(1, 0, topology, 'n1')]
+    assert verify_placement(same_host, 'diff_node', topology) == ["ranks 0 and 1 both ran on n1"]
+    two_hosts = [record(0, 0, topology, 'n1'), record(1, 0, topology, 'n2')]
+    assert verify_placement(two_hosts, 'diff_node', topology) == []
@@ -0,0 +1,51 @@
+from batch_runner import BENCHMARKS, append_perflog, perflog_header, reference_for
+from config import OSU_BENCHMARKS, REFERENCE_VALUES
+from results_store import ResultsStore
+
+
+def fields(benchmark, metric, value, unit):
+    return {
+        'result': 'pass', 'job_completion_time': '2026-01-01T00:00:00+00:00',
+        'binary_source': 'eessi', 'config_hash': benchmark, 'display_name': benchmark,
+        'environ': 'testing-foss', 'name': benchmark, 'partition': 'batch',
+        'placement_type': 'same_numa', 'system': 'iris', 'test_type': benchmark,
+        'perfvars': [(metric, value, unit, 0, 'null', 'null')],
+    }
+
+
+def test_benchmarks_are_those_of_the_reframe_tests():
+    assert sorted(BENCHMARKS) == sorted(benchmark for benchmarks in OSU_BENCHMARKS.values()
+                                        for benchmark, _ in benchmarks)
+    assert BENCHMARKS['osu_bw'] == ('pt2pt', 'bandwidth')
+
+
+def test_batch_log_keeps_one_header_across_metrics(tmp_path):
+    log = tmp_path / 'perflogs' / 'iris' / 'batch' / 'OSUPlacementTest-batch.log'
+    append_perflog(str(log), fields('osu_get_latency', 'latency', 1.5, 'us'))
+    append_perflog(str(log), fields('osu_bw', 'bandwidth', 12000.0, 'MB/s'))
+    append_perflog(str(log), fields('osu_latency', 'latency', None, 'us'))
+
+    assert list(log.parent.iterdir()) == [log]
+    lines = log.read_text().splitlines()
+    assert lines[0] == '|'.join(perflog_header())
+    assert len(lines) == 4
+
+    store = ResultsStore(str(tmp_path / 'store'))
+    assert store.ingest(str(log)) == 3
+    df = store.read().set_index('benchmark')
+    assert df.loc['osu_get_latency', 'metric'] == 'latency'
+    assert df.loc['osu_get_latency', 'value'] == 1.5
+    assert df.loc['osu_bw', 'metric'] == 'bandwidth'
+    assert df.loc['osu_bw', 'value'] == 12000.0
+    assert df.loc['osu_latency', 'metric'] == 'latency'
+
+
+def test_finer_classes_use_the_references_of_their_numa_node():
+    refs = REFERENCE_VALUES['aion']['bandwidth']['local']
+    assert refs['same_numa'] != refs['default']
+    # version 0 skips calibrated references
+    for placement in ['same_core', 'same_l2', 'same_l3', 'same_die', 'same_numa']:
+        assert reference_for('aion', 'osu_get_bw', 'bandwidth', 'local', placement,
+                             version=0) == refs['same_numa']
+    assert reference_for('aion', 'osu_get_bw', 'bandwidth', 'local', 'diff_numa_same_socket',
+                         version=0) == refs.get('diff_numa_same_socket', refs['default'])
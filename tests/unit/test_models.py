@@ -0,0 +1,67 @@
+import numpy as np
+import pandas as pd
+
+from models import fit_history, latest_models, loggp
+
+ALPHA_US = 1.5
+BANDWIDTH_MBS = 12000.0
+SIZES = [2 ** k for k in range(0, 23, 2)]
+
+
+def sweep(metric, time, noise=0.0, seed=0, alpha=ALPHA_US, bandwidth=BANDWIDTH_MBS):
+    """Sweep points of a link that follows the Hockney model exactly (up to noise)"""
+    sizes = np.array(SIZES, dtype=float)
+    times = (alpha + sizes / bandwidth) * (1 + noise * np.random.default_rng(seed).standard_normal(len(sizes)))
+    return pd.DataFrame({
+        'cluster': 'iris', 'binary_source': 'eessi', 'placement_type': 'same_numa',
+        'benchmark': 'osu_latency' if metric == 'latency' else 'osu_bw', 'metric': metric,
+        'size': sizes, 'value': times if metric == 'latency' else sizes / times,
+        'job_completion_time': time,
+    })
+
+
+def test_exact_hockney_data_is_recovered():
+    history = fit_history(pd.concat([sweep('latency', '2026-01-01T00:00:00+00:00'),
+                                     sweep('bandwidth', '2026-01-01T00:00:00+00:00')]))
+    assert len(history) == 2
+    for fit in history.itertuples():
+        assert np.isclose(fit.alpha_us, ALPHA_US)
+        assert np.isclose(fit.bandwidth_mbs, BANDWIDTH_MBS)
+        assert np.isclose(fit.r2, 1.0)
+        assert fit.rms_rel_error < 1e-9
+        assert fit.points == len(SIZES)
+
+
+def test_noisy_data_fits_within_the_noise():
+    history = fit_history(sweep('latency', '2026-01-01T00:00:00+00:00', noise=0.02, seed=1))
+    fit = history.iloc[0]
+    assert abs(fit['alpha_us'] / ALPHA_US - 1) < 0.05
+    assert abs(fit['bandwidth_mbs'] / BANDWIDTH_MBS - 1) < 0.05
+    assert 0.01 < fit['rms_rel_error'] < 0.04
+
+
+def test_every_run_is_fitted_and_the_latest_kept():
+    history = fit_history(pd.concat([
+        sweep('latency', '2026-01-01T00:00:00+00:00'),
+        sweep('latency', '2026-01-02T00:00:00+00:00', alpha=3.0),
+    ]))
+    assert sorted(history['alpha_us'].round(6)) == [ALPHA_US, 3.0]
+    latest = latest_models(history).iloc[0]
+    assert np.isclose(latest['alpha_us'], 3.0)
+    assert np.isclose(latest['alpha_median_us'], ALPHA_US)
+    assert latest['runs'] == 2
+
+
+def test_too_few_sizes_give_no_fit():
+    points = sweep('latency', '2026-01-01T00:00:00+00:00').head(2)
+    assert fit_history(points)['alpha_us'].isna().all()
+
+
+def test_loggp_combines_latency_and_bandwidth_fits():
+    sweeps = pd.concat([sweep('latency', '2026-01-01T00:00:00+00:00'),
+                        sweep('bandwidth', '2026-01-01T00:00:00+00:00')])
+    model = loggp(sweeps, latest_models(fit_history(sweeps))).iloc[0]
+    assert np.isclose(model['L_2o_us'], ALPHA_US)
+    assert np.isclose(model['G_bandwidth_mbs'], BANDWIDTH_MBS)
+    # Median time per message of the 1 and 4 byte points
+    assert np.isclose(model['g_us'], ALPHA_US + 2.5 / BANDWIDTH_MBS)
@@ -0,0 +1,108 @@
+import os
+
+import pytest
+
+import module_env
+from module_env import (apply_path_delta, apply_snapshot, load_snapshot, path_delta,
+                        shell_exports, snapshot_key)
+
+# Stand-in for Lmod: `module load X` prepends X's bin and lib directories,
+# appends a man directory and sets EBROOTX, as a module file would;
+# `module load missing` fails
+FAKE_MODULE = """
+module() {
+    [ "$1" = load ] && [ "$2" != missing ] || return 1
+    local root=/opt/fake/$2
+    export PATH=$root/bin:$PATH
+    export LD_LIBRARY_PATH=$root/lib${LD_LIBRARY_PATH:+:$LD_LIBRARY_PATH}
+    export MANPATH=${MANPATH:+$MANPATH:}$root/man
+    export EBROOT$(echo "$2" | tr a-z A-Z)=$root
+    unset FAKE_UNLOADED
+}
+"""
+
+
+def fake_init(tmp_path):
+    init = tmp_path / 'fake_module.sh'
+    init.write_text(FAKE_MODULE)
+    return str(init)
+
+
+def test_snapshot_applies_as_a_delta_to_the_callers_environment(tmp_path, monkeypatch):
+    monkeypatch.setenv('FAKE_UNLOADED', '1')
+    monkeypatch.setenv('MANPATH', '/usr/share/man')
+    snapshot = load_snapshot(['module load osu'], fake_init(tmp_path), cluster='test',
+                             snapshot_dir=str(tmp_path / 'cache'))
+    assert snapshot['paths']['PATH'] == {'prepend': ['/opt/fake/osu/bin'], 'append': [],
+                                         'remove': []}
+    assert snapshot['paths']['MANPATH']['append'] == ['/opt/fake/osu/man']
+    assert snapshot['set']['EBROOTOSU'] == '/opt/fake/osu'
+    assert snapshot['unset'] == ['FAKE_UNLOADED']
+
+    # The caller's entries survive, even those the login shell does not have
+    caller = {'PATH': '/home/user/bin:/usr/bin', 'LD_LIBRARY_PATH': '/home/user/lib',
+              'FAKE_UNLOADED': '1'}
+    env = apply_snapshot(snapshot, dict(caller))
+    assert env['PATH'] == '/opt/fake/osu/bin:/home/user/bin:/usr/bin'
+    assert env['LD_LIBRARY_PATH'] == '/opt/fake/osu/lib:/home/user/lib'
+    assert env['MANPATH'] == '/opt/fake/osu/man'
+    assert env['EBROOTOSU'] == '/opt/fake/osu'
+    assert 'FAKE_UNLOADED' not in env
+
+    # Applying it twice does not duplicate entries
+    assert apply_snapshot(snapshot, dict(env))['PATH'] == env['PATH']
+
+    exports = shell_exports(snapshot, caller)
+    assert 'unset FAKE_UNLOADED' in exports
+    assert "export PATH=/opt/fake/osu/bin:/home/user/bin:/usr/bin" in exports
+
+
+def test_snapshot_is_reused_from_the_cache(tmp_path):
+    init = fake_init(tmp_path)
+    cache = str(tmp_path / 'cache')
+    first = load_snapshot(['module load osu'], init, cluster='test', snapshot_dir=cache)
+    (tmp_path / 'fake_module.sh').write_text('module() { return 1; }')
+    assert load_snapshot(['module load osu'], init, cluster='test', snapshot_dir=cache) == first
+
+
+def test_failed_load_is_not_cached(tmp_path):
+    init = fake_init(tmp_path)
+    cache = tmp_path / 'cache'
+    commands = ['module load osu || echo "Warning: Could not load osu"',
+                'module load missing || echo "Warning: Could not load missing"']
+    with pytest.raises(RuntimeError, match='Failed: module load missing'):
+        load_snapshot(commands, init, cluster='test', snapshot_dir=str(cache))
+    assert not cache.exists() or not list(cache.iterdir())
+
+    # Once the module exists the next call captures it
+    (tmp_path / 'fake_module.sh').write_text(FAKE_MODULE.replace('missing', 'absent'))
+    snapshot = load_snapshot(commands, init, cluster='test', snapshot_dir=str(cache))
+    assert snapshot['set']['EBROOTMISSING'] == '/opt/fake/missing'
+
+
+def test_path_delta_round_trip():
+    delta = path_delta('/b:/c:/old', '/a:/b:/c:/z')
+    assert delta == {'prepend': ['/a'], 'append': ['/z'], 'remove': ['/old']}
+    assert apply_path_delta('/x:/old:/c', delta) == '/a:/x:/c:/z'
+    assert apply_path_delta(None, delta) == '/a:/z'
+
+
+def test_system_spider_cache_changes_the_key(tmp_path, monkeypatch):
+    timestamp = tmp_path / 'system-cache' / 'timestamp'
+    timestamp.parent.mkdir()
+    timestamp.write_text('')
+    rc = tmp_path / 'lmodrc.lua'
+    rc.write_text(f'scDescriptT = {{ {{ dir = "{timestamp.parent}", '
+                  f'timestamp = "{timestamp}" }} }}\n')
+    os.utime(rc, ns=(1, 1))
+    os.utime(timestamp.parent, ns=(1, 1))
+    os.utime(timestamp, ns=(1, 1))
+    monkeypatch.setenv('LMOD_RC', str(rc))
+    monkeypatch.setattr(module_env, 'SPIDER_CACHE_PATHS', [])
+    monkeypatch.setattr(module_env, 'LMODRC_PATHS', [])
+    assert module_env.spider_cache_stamp() == 1
+
+    key = snapshot_key(['module load osu'])
+    os.utime(timestamp, ns=(2, 2))
+    assert module_env.spider_cache_stamp() == 2
+    assert snapshot_key(['module load osu']) != key
@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+
+from references import calibrate, load_references, lookup_reference, write_version
+
+
+def runs(values, config_hash, start, benchmark='osu_get_latency', result='pass'):
+    times = pd.date_range(start, periods=len(values), freq='h', tz='UTC')
+    return pd.DataFrame({
+        'cluster': 'iris', 'benchmark': benchmark, 'binary_source': 'eessi',
+        'placement_type': 'same_numa', 'result': result, 'value': values, 'unit': 'us',
+        'config_hash': config_hash, 'job_completion_time': [time.isoformat() for time in times],
+    })
+
+
+def test_calibration_uses_the_latest_configuration_only():
+    df = pd.concat([
+        # Runs of the old build
+        runs(np.full(10, 2.0), 'old', '2026-01-01'),
+        # the new build is twice as fast; its runs must not be averaged with the old ones
+        runs(1.0 + 0.01 * np.arange(6), 'new', '2026-01-02'),
+    ], ignore_index=True)
+    refs = calibrate(df, window=20, min_runs=5)
+    assert len(refs) == 1
+    ref = refs.iloc[0]
+    assert ref['config_hash'] == 'new'
+    assert ref['runs'] == 6
+    assert ref['value'] == 1.025
+
+
+def test_failed_and_short_histories_are_left_out():
+    df = pd.concat([runs(np.full(6, 2.0), 'a', '2026-01-01', result='fail'),
+                    runs(np.full(3, 2.0), 'b', '2026-01-01', benchmark='osu_put_latency')],
+                   ignore_index=True)
+    assert calibrate(df, min_runs=5).empty
+    assert len(calibrate(df, min_runs=5, include_failed=True)) == 1
+
+
+def test_bounds_follow_the_spread_with_a_floor():
+    rng = np.random.default_rng(0)
+    refs = calibrate(pd.concat([runs(np.full(10, 3.0), 'flat', '2026-01-01'),
+                                runs(10 + rng.standard_normal(20), 'noisy', '2026-01-01',
+                                     benchmark='osu_put_latency')], ignore_index=True),
+                     min_tolerance=0.02).set_index('benchmark')
+    assert refs.loc['osu_get_latency', 'upper'] == 0.02
+    assert refs.loc['osu_get_latency', 'lower'] == -0.02
+    assert refs.loc['osu_put_latency', 'upper'] > 0.2
+
+
+def test_written_version_is_looked_up(tmp_path):
+    refs = calibrate(runs(np.full(6, 2.0), 'a', '2026-01-01'))
+    path = write_version(refs, {'window': 20}, str(tmp_path))
+    assert path.endswith('references-v0001.json')
+    assert load_references(1, str(tmp_path))['iris/osu_get_latency/eessi/same_numa'] == (
+        2.0, -0.02, 0.02, 'us')
+    assert lookup_reference('iris', 'osu_get_latency', 'eessi', 'same_numa', 1, str(tmp_path))
+    assert lookup_reference('iris', 'osu_get_latency', 'eessi', 'same_numa', 0, str(tmp_path)) is None
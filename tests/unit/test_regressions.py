@@ -0,0 +1,82 @@
+import numpy as np
+import pandas as pd
+
+from regressions import (DEFAULT_THRESHOLD, change_report, detect_change_points, format_report,
+                         series_matrix)
+
+
+def history(values, metric='bandwidth', source='eessi', start='2026-01-01'):
+    times = pd.date_range(start, periods=len(values), freq='D', tz='UTC')
+    return pd.DataFrame({
+        'cluster': 'iris', 'binary_source': source, 'placement_type': 'same_numa',
+        'benchmark': 'osu_get_bw' if metric == 'bandwidth' else 'osu_get_latency',
+        'size': 1048576 if metric == 'bandwidth' else 8192, 'metric': metric,
+        'value': values, 'job_completion_time': [time.isoformat() for time in times],
+    })
+
+
+def noisy(level, n, seed):
+    return level * (1 + 0.01 * np.random.default_rng(seed).standard_normal(n))
+
+
+def test_step_is_found_at_its_split():
+    values = np.concatenate([noisy(100, 10, 0), noisy(80, 10, 1)])[None, :]
+    split, statistic, before, after = detect_change_points(values, np.array([20]))
+    assert split[0] == 10
+    assert statistic[0] > 5
+    assert abs(before[0] - 100) < 2 and abs(after[0] - 80) < 2
+
+
+def test_short_series_have_no_change_point():
+    values = np.array([[1.0, 2.0, 3.0, 4.0, 5.0, np.nan]])
+    split, statistic, _, _ = detect_change_points(values, np.array([5]), min_segment=3)
+    assert statistic[0] == -np.inf
+
+
+def test_report_ranks_regressions_first_and_dates_the_onset():
+    df = pd.concat([
+        # eessi bandwidth drops 20% on the 11th run: a regression
+        history(np.concatenate([noisy(10000, 10, 2), noisy(8000, 10, 3)])),
+        # local latency falls 30%: an improvement
+        history(np.concatenate([noisy(2.0, 10, 4), noisy(1.4, 10, 5)]), 'latency', 'local'),
+        # easybuild bandwidth only has noise
+        history(noisy(10000, 20, 6), source='easybuild'),
+    ], ignore_index=True)
+    report = change_report(df)
+    assert list(report['binary_source']) == ['eessi', 'local']
+    assert list(report['regression']) == [True, False]
+    assert report.loc[0, 'change'] < -0.15
+    assert pd.Timestamp(report.loc[0, 'onset']) == pd.Timestamp('2026-01-11')
+    assert format_report(report).startswith('2 step changes (1 regressions)')
+
+
+def test_noise_only_series_give_an_empty_report():
+    rng = np.random.default_rng(3)
+    series = []
+    for i in range(100):
+        values = 1000 * (1 + 0.1 * rng.standard_normal(int(rng.integers(6, 30))))
+        series.append(history(values).assign(benchmark=f'osu_{i}'))
+    df = pd.concat(series, ignore_index=True)
+    # The fixed threshold alone flags some of them
+    _, values, _, lengths = series_matrix(df)
+    _, statistic, _, _ = detect_change_points(values, lengths)
+    assert (statistic >= DEFAULT_THRESHOLD).any()
+    assert change_report(df).empty
+
+    # A real step among them is still found
+    step = history(np.concatenate([noisy(1000, 15, 10), noisy(800, 15, 11)]))
+    report = change_report(pd.concat([df, step], ignore_index=True))
+    assert list(report['benchmark']) == ['osu_get_bw']
+    assert report.loc[0, 'adjusted_p'] <= 0.05
+
+
+def test_repeated_records_of_a_run_count_once():
+    runs = history(np.concatenate([noisy(100, 6, 7), noisy(50, 6, 8)]))
+    # Every run logged three times (trials): still 12 points
+    report = change_report(pd.concat([runs] * 3, ignore_index=True))
+    assert report.loc[0, 'runs'] == 12
+
+
+def test_empty_history_gives_an_empty_report():
+    assert change_report(history([])).empty
+    assert format_report(change_report(history([]))) == "No step changes detected"
@@ -0,0 +1,48 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+import render_cache
+from render_cache import FigureTask, render_all, task_key
+
+labels = {'same_numa': 'Same NUMA'}
+colors = ['#1f77b4', '#ff7f0e']
+
+
+def axis_labels(data):
+    return [labels[placement] for placement in data['placement_type']]
+
+
+def plot(data, output):
+    with open(output, 'w') as f:
+        f.write(','.join(axis_labels(data)) + ' ' + colors[0])
+
+
+def task(tmp_path):
+    return FigureTask(plot, pd.DataFrame({'placement_type': ['same_numa'], 'value': [1.0]}),
+                      str(tmp_path / 'figure.txt'), {})
+
+
+def test_key_covers_module_data_read_by_the_plot_and_its_helpers(tmp_path, monkeypatch):
+    key = task_key(task(tmp_path))
+    assert task_key(task(tmp_path)) == key
+    # Read directly by plot()
+    monkeypatch.setitem(globals(), 'colors', ['#000000', '#ff7f0e'])
+    assert task_key(task(tmp_path)) != key
+    monkeypatch.undo()
+    assert task_key(task(tmp_path)) == key
+    # Read by a helper plot() calls
+    monkeypatch.setitem(labels, 'same_numa', 'Same NUMA node')
+    assert task_key(task(tmp_path)) != key
+
+
+def test_unchanged_figures_are_skipped(tmp_path, monkeypatch):
+    # Render in the test process: the pool would need picklable tasks from an importable module
+    monkeypatch.setattr(render_cache, 'ProcessPoolExecutor', ThreadPoolExecutor)
+    cache = str(tmp_path / 'cache')
+    assert render_all([task(tmp_path)], cache_dir=cache)[0] == [str(tmp_path / 'figure.txt')]
+    assert render_all([task(tmp_path)], cache_dir=cache)[1] == [str(tmp_path / 'figure.txt')]
+    monkeypatch.setitem(labels, 'same_numa', 'Same NUMA node')
+    assert render_all([task(tmp_path)], cache_dir=cache)[0] == [str(tmp_path / 'figure.txt')]
+    assert (tmp_path / 'figure.txt').read_text() == 'Same NUMA node #1f77b4'
+
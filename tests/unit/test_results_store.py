@@ -0,0 +1,80 @@
+import json
+import os
+
+import results_store
+from results_store import STATE_FILE, STORE_VERSION, ResultsStore
+
+HEADER = ('result|job_completion_time|binary_source|config_hash|placement_type|system|test_type|'
+          'latency_value|latency_unit|latency_ref|latency_lower_thres|latency_upper_thres|'
+          'latency_8_value|latency_8_unit|latency_1024_value|latency_1024_unit')
+
+
+def record(day, value):
+    return (f'pass|2026-01-{day:02d}T00:00:00+00:00|eessi|abc|same_numa|iris:batch|osu_latency|'
+            f'{value}|us|0|null|null|{value}|us|{value * 3}|us')
+
+
+def write_log(tmp_path, days):
+    log = tmp_path / 'perflogs' / 'iris' / 'batch' / 'OSUPlacementTest.log'
+    log.parent.mkdir(parents=True, exist_ok=True)
+    log.write_text('\n'.join([HEADER] + [record(day, 1.0 + day) for day in days]) + '\n')
+    return str(log)
+
+
+def test_ingestion_is_incremental(tmp_path):
+    store = ResultsStore(str(tmp_path / 'store'))
+    log = write_log(tmp_path, range(1, 4))
+    assert store.ingest(log) == 3
+    assert store.ingest(log) == 0
+    with open(log, 'a') as f:
+        f.write(record(4, 5.0) + '\n')
+    assert ResultsStore(str(tmp_path / 'store')).ingest(log) == 1
+    df = ResultsStore(str(tmp_path / 'store')).read()
+    assert sorted(df['value']) == [2.0, 3.0, 4.0, 5.0]
+    assert len(ResultsStore(str(tmp_path / 'store')).read_sweeps()) == 8
+
+
+def test_store_of_an_older_version_is_reingested_and_gains_sweeps(tmp_path):
+    store_dir = str(tmp_path / 'store')
+    log = write_log(tmp_path, range(1, 3))
+    assert ResultsStore(store_dir).ingest(log) == 2
+    with open(log, 'a') as f:
+        f.write(record(3, 9.0) + '\n')
+    assert ResultsStore(store_dir).ingest(log) == 1
+
+    # What a version 1 store looks like: no sweep table, its own state version
+    for root, _, files in os.walk(os.path.join(store_dir, results_store.SWEEP_TABLE)):
+        for name in files:
+            os.remove(os.path.join(root, name))
+    state_path = os.path.join(store_dir, STATE_FILE)
+    with open(state_path) as f:
+        state = json.load(f)
+    state['version'] = STORE_VERSION - 1
+    with open(state_path, 'w') as f:
+        json.dump(state, f)
+
+    store = ResultsStore(store_dir)
+    assert store.ingest(log) == 3
+    # The two parts of the old ranges are replaced, not duplicated
+    assert sorted(store.read()['value']) == [2.0, 3.0, 9.0]
+    assert sorted(store.read_sweeps()['size']) == [8, 8, 8, 1024, 1024, 1024]
+    assert ResultsStore(store_dir).ingest(log) == 0
+
+
+def test_older_store_keeps_parts_of_logs_that_are_gone(tmp_path):
+    store_dir = str(tmp_path / 'store')
+    log = write_log(tmp_path, range(1, 3))
+    ResultsStore(store_dir).ingest(log)
+    state_path = os.path.join(store_dir, STATE_FILE)
+    with open(state_path) as f:
+        state = json.load(f)
+    state['version'] = STORE_VERSION - 1
+    with open(state_path, 'w') as f:
+        json.dump(state, f)
+
+    # The perflogs were wiped and a new run started
+    os.remove(log)
+    log = write_log(tmp_path, [5])
+    store = ResultsStore(store_dir)
+    assert store.ingest(log) == 1
+    assert sorted(store.read()['value']) == [2.0, 3.0, 6.0]
@@ -0,0 +1,52 @@
+import datetime
+
+from resume import case_config, config_hash, is_fresh, perflog_paths
+
+NOW = datetime.datetime(2026, 3, 1, 12, 0, tzinfo=datetime.timezone.utc)
+HEADER = 'result|job_completion_time|display_name|config_hash'
+
+
+def write_log(path, *records, header=HEADER):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    lines = [header] + ['|'.join(record) for record in records]
+    path.write_text('\n'.join(lines) + '\n')
+
+
+def hours_ago(hours):
+    return (NOW - datetime.timedelta(hours=hours)).isoformat()
+
+
+def test_config_hash_is_stable_and_covers_the_configuration():
+    config = case_config('OSUPlacementTest %binary_source=eessi', 'iris', 'batch', 'foss',
+                         'OSU-7.2', sizes=8192, warmup=10, iterations=1000)
+    assert config_hash(config) == config_hash(dict(config))
+    assert config_hash(config) != config_hash(dict(config, iterations=2000))
+
+
+def test_latest_record_decides(tmp_path):
+    log = tmp_path / 'OSUPlacementTest.log'
+    write_log(log, ('pass', hours_ago(30), 'old', 'a'), ('pass', hours_ago(2), 'new', 'a'),
+              ('pass', hours_ago(2), 'ok', 'b'), ('fail', hours_ago(1), 'broken', 'b'))
+    assert is_fresh(str(log), 'a', 24, now=NOW)
+    assert not is_fresh(str(log), 'a', 1, now=NOW)
+    # A failure after the last pass makes the case run again
+    assert not is_fresh(str(log), 'b', 24, now=NOW)
+    assert not is_fresh(str(log), 'missing', 24, now=NOW)
+    assert not is_fresh(str(tmp_path / 'absent.log'), 'a', 24, now=NOW)
+
+
+def test_rotated_and_batch_logs_count(tmp_path):
+    reframe_log, batch_log = perflog_paths(str(tmp_path), 'iris', 'batch', 'OSUPlacementTest')
+    reframe_log, batch_log = tmp_path / reframe_log, tmp_path / batch_log
+    # The pass was moved aside when ReFrame's header changed
+    write_log(reframe_log.with_name(reframe_log.name + '.h0'), ('pass', hours_ago(3), 'x', 'a'))
+    write_log(reframe_log, ('pass', hours_ago(40), 'x', 'b'),
+              header=HEADER + '|latency_value')
+    assert is_fresh(str(reframe_log), 'a', 24, now=NOW)
+
+    # The batch runner passed 'b' after ReFrame's stale record...
+    write_log(batch_log, ('pass', hours_ago(5), 'x', 'b'))
+    assert is_fresh([str(reframe_log), str(batch_log)], 'b', 24, now=NOW)
+    # ...but a later failure in either log wins
+    write_log(batch_log, ('pass', hours_ago(5), 'x', 'b'), ('fail', hours_ago(2), 'x', 'a'))
+    assert not is_fresh([str(reframe_log), str(batch_log)], 'a', 24, now=NOW)
@@ -0,0 +1,96 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from significance import (adjust_p_values, bootstrap_medians, cell_intervals, format_tests,
+                          mann_whitney, pairwise_tests)
+
+
+def test_mann_whitney_of_separated_samples():
+    u, p = mann_whitney(np.arange(1.0, 6.0), np.arange(6.0, 11.0))
+    assert u == 0
+    # Normal approximation with continuity correction: z = 12 / sqrt(22.9167)
+    assert p == pytest.approx(0.012186, abs=1e-6)
+    u, p_swapped = mann_whitney(np.arange(6.0, 11.0), np.arange(1.0, 6.0))
+    assert u == 25 and p_swapped == p
+
+
+def test_mann_whitney_with_ties():
+    u, p = mann_whitney(np.array([1.0, 2.0, 2.0, 3.0]), np.array([2.0, 3.0, 4.0, 5.0]))
+    assert u == 2.5
+    # Tie-corrected variance 16 / 12 * (9 - 30 / 56), so z = (5.5 - 0.5) / 3.3594
+    assert p == pytest.approx(0.136658, abs=1e-6)
+    assert mann_whitney(np.full(5, 1.0), np.full(5, 1.0)) == (12.5, 1.0)
+
+
+@pytest.mark.parametrize('row, chance', [
+    # The median of a resample of [1, 2, 3] is 1 when at least two of three draws are 1
+    ([1.0, 2.0, 3.0], 7 / 27),
+    # Of [1, 2, 3, 4], when at least three of four draws are 1
+    ([1.0, 2.0, 3.0, 4.0], 13 / 256),
+])
+def test_bootstrap_medians_follow_the_resampling_distribution(row, chance):
+    boot = bootstrap_medians(np.array([row]), np.array([len(row)]), n_boot=200000, seed=1)
+    assert boot.shape == (1, 200000)
+    assert np.mean(boot == 1.0) == pytest.approx(chance, abs=0.005)
+    assert set(np.unique(boot)) <= {(a + b) / 2 for a in row for b in row}
+
+
+def test_bootstrap_medians_of_padded_rows():
+    values = np.array([[5.0, np.nan, np.nan], [2.0, 2.0, 2.0]])
+    boot = bootstrap_medians(values, np.array([1, 3]), n_boot=100)
+    assert (boot[0] == 5.0).all() and (boot[1] == 2.0).all()
+
+
+def test_p_value_corrections():
+    p = [0.01, 0.04, 0.03, 0.005, np.nan]
+    np.testing.assert_allclose(adjust_p_values(p, 'holm'), [0.03, 0.06, 0.06, 0.02, np.nan])
+    np.testing.assert_allclose(adjust_p_values(p, 'bh'), [0.02, 0.04, 0.04, 0.02, np.nan])
+    np.testing.assert_allclose(adjust_p_values(p, 'bonferroni'), [0.04, 0.16, 0.12, 0.02, np.nan])
+    with pytest.raises(ValueError):
+        adjust_p_values(p, 'sidak')
+
+
+def results(benchmark, source, level, n=20, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'cluster': 'iris', 'benchmark': benchmark, 'metric': 'bandwidth',
+        'placement_type': 'same_numa', 'binary_source': source,
+        'value': level * (1 + 0.02 * rng.standard_normal(n)),
+    })
+
+
+def test_known_shift_of_one_benchmark_is_found():
+    # eessi is 20% slower in osu_get_bw only; osu_bw and osu_put_bw are unchanged
+    df = pd.concat([
+        results('osu_get_bw', 'local', 10000, seed=1), results('osu_get_bw', 'eessi', 8000, seed=2),
+        results('osu_bw', 'local', 12000, n=60, seed=3), results('osu_bw', 'eessi', 12000, n=60, seed=4),
+        results('osu_put_bw', 'local', 9000, n=60, seed=5),
+        results('osu_put_bw', 'eessi', 9000, n=60, seed=6),
+    ], ignore_index=True)
+    tests = pairwise_tests(df, n_boot=2000).set_index('benchmark')
+    assert len(tests) == 3
+
+    shifted = tests.loc['osu_get_bw']
+    assert shifted['significant']
+    assert shifted['better'] == 'local'
+    assert shifted['change'] == pytest.approx(-0.2, abs=0.02)
+    assert shifted['change_low'] < -0.2 < shifted['change_high']
+    for benchmark in ['osu_bw', 'osu_put_bw']:
+        assert not tests.loc[benchmark, 'significant']
+        assert pd.isna(tests.loc[benchmark, 'better'])
+    assert 'iris/osu_get_bw/bandwidth/same_numa: eessi vs local -20' in format_tests(
+        tests.reset_index())
+
+    intervals = cell_intervals(df, n_boot=500)
+    assert len(intervals) == 6
+    assert (intervals['ci_low'] <= intervals['median']).all()
+    assert (intervals['median'] <= intervals['ci_high']).all()
+
+
+def test_too_few_runs_are_not_tested():
+    df = pd.concat([results('osu_get_bw', 'local', 10000, n=4),
+                    results('osu_get_bw', 'eessi', 8000, n=4, seed=1)], ignore_index=True)
+    tests = pairwise_tests(df, n_boot=200)
+    assert tests['p_value'].isna().all()
+    assert 'too few runs' in format_tests(tests)
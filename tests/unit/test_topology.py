@@ -0,0 +1,64 @@
+import pytest
+
+from topology import DISTANCE_CLASSES, Topology, format_cpu_list, parse_cpu_list
+
+
+def make_topology(sockets=2, nodes_per_socket=2, l3_per_node=2, cores_per_l3=2, smt=2):
+    """Synthetic host: CPU ids are numbered core by core, SMT siblings last"""
+    cpus = {}
+    cores = sockets * nodes_per_socket * l3_per_node * cores_per_l3
+    for core in range(cores):
+        l3 = core // cores_per_l3
+        node = l3 // l3_per_node
+        for thread in range(smt):
+            cpus[core + thread * cores] = {
+                'core': core, 'socket': node // nodes_per_socket, 'die': node,
+                'node': node, 'l2': core, 'l3': l3 * cores_per_l3}
+    return Topology(cpus)
+
+
+def test_cpu_list_round_trip():
+    assert parse_cpu_list('0-3,8,10-11') == [0, 1, 2, 3, 8, 10, 11]
+    assert format_cpu_list([11, 0, 1, 2, 3, 8, 10]) == '0-3,8,10-11'
+
+
+def test_distance_classes_of_a_two_socket_host():
+    classes = make_topology().distance_classes()
+    assert list(classes) == ['same_core', 'same_l3', 'same_numa',
+                             'diff_numa_same_socket', 'diff_socket_same_node']
+    # Every representative pair really is of its class
+    topology = make_topology()
+    for name, (cpu_a, cpu_b) in classes.items():
+        assert topology.distance_class(cpu_a, cpu_b) == name
+
+
+def test_distance_classes_are_nearest_first():
+    classes = list(make_topology().distance_classes())
+    assert classes == sorted(classes, key=DISTANCE_CLASSES.index)
+
+
+def test_distance_classes_restricted_to_allowed_cpus():
+    topology = make_topology()
+    # Two cores of one L3, without their SMT siblings
+    allowed = Topology(topology.cpus, [0, 1])
+    assert list(allowed.distance_classes()) == ['same_l3']
+
+
+def test_same_numa_placement_falls_back_to_finer_class():
+    # One L3 per NUMA node: no pair is plain 'same_numa'
+    topology = make_topology(l3_per_node=1)
+    assert 'same_numa' not in topology.distance_classes()
+    assert topology.distance_class(*topology.placement_pair('same_numa')) == 'same_l3'
+
+
+def test_unknown_placement_is_rejected():
+    topology = make_topology(sockets=1, nodes_per_socket=1)
+    with pytest.raises(ValueError):
+        topology.placement_pair('diff_socket_same_node')
+
+
+def test_topology_dict_round_trip():
+    topology = make_topology()
+    restored = Topology.from_dict(topology.to_dict())
+    assert restored.cpus == topology.cpus
+    assert restored.distance_classes() == topology.distance_classes()